@@ -0,0 +1,119 @@
+import json
+import math
+
+RANGES = {
+    'Last 30 days': 30,
+    'Last 90 days': 90,
+    'Last year': 365,
+    'All time': None,
+}
+
+# Charts never get more points than this; longer histories are averaged into
+# equal-sized buckets of consecutive logged days.
+MAX_POINTS = 120
+
+# A day is on target when its calories are within this share of the target;
+# the chart shows the share of on-target days over the last ADHERENCE_WINDOW logged days.
+ADHERENCE_BAND = 0.10
+ADHERENCE_WINDOW = 7
+
+LAYOUT = {
+    'height': 320,
+    'margin': {'l': 40, 'r': 20, 't': 50, 'b': 40},
+    'legend': {'orientation': 'h', 'y': -0.2},
+    'plot_bgcolor': 'white',
+    'xaxis': {'gridcolor': '#ecf0f1'},
+    'yaxis': {'gridcolor': '#ecf0f1'},
+}
+
+
+def mark_adherence(rows, target):
+    window = 0.0
+    for position, row in enumerate(rows):
+        row['adherent'] = 1.0 if target and abs(row['calories'] - target) <= target * ADHERENCE_BAND else 0.0
+        window += row['adherent']
+        if position >= ADHERENCE_WINDOW:
+            window -= rows[position - ADHERENCE_WINDOW]['adherent']
+        row['adherence_rate'] = window / min(position + 1, ADHERENCE_WINDOW)
+    return rows
+
+
+def downsample(rows, max_points=MAX_POINTS):
+    if len(rows) <= max_points:
+        return rows
+    size = math.ceil(len(rows) / max_points)
+    buckets = []
+    for start in range(0, len(rows), size):
+        bucket = rows[start:start + size]
+        meals = sum(row['meals'] for row in bucket)
+        scores = [row['avg_health_score'] for row in bucket if row['avg_health_score'] is not None]
+        merged = {'period': bucket[0]['period'], 'meals': meals}
+        for field in ('calories', 'protein', 'carbs', 'fat', 'adherent', 'adherence_rate'):
+            merged[field] = sum(row[field] for row in bucket) / len(bucket)
+        merged['avg_satisfaction'] = sum(row['avg_satisfaction'] * row['meals'] for row in bucket) / meals if meals else 0.0
+        merged['avg_health_score'] = sum(scores) / len(scores) if scores else None
+        buckets.append(merged)
+    return buckets
+
+
+def summarize(rows, target):
+    days = len(rows)
+    meals = sum(row['meals'] for row in rows)
+    return {
+        'days': days,
+        'meals': meals,
+        'avg_calories': round(sum(row['calories'] for row in rows) / days) if days else 0,
+        'adherence': round(100 * sum(row['adherent'] for row in rows) / days) if days else 0,
+        'avg_satisfaction': round(sum(row['avg_satisfaction'] * row['meals'] for row in rows) / meals, 1) if meals else 0.0,
+        'target': target,
+    }
+
+
+def _figure(title, traces, **layout):
+    return {'data': traces, 'layout': {**LAYOUT, 'title': {'text': title}, **layout}}
+
+
+def build_figures(rows, target):
+    # Plain Plotly figure dicts: building go.Figure objects validates every
+    # property and costs more than the rest of the pipeline put together.
+    periods = [row['period'] for row in rows]
+
+    calories = _figure('Daily calories', [
+        {'type': 'bar', 'x': periods, 'y': [round(row['calories']) for row in rows], 'name': 'Calories',
+         'marker': {'color': '#3498db'}},
+    ])
+    if target:
+        calories['layout']['shapes'] = [{'type': 'line', 'xref': 'paper', 'x0': 0, 'x1': 1, 'y0': target, 'y1': target,
+                                         'line': {'color': '#e74c3c', 'dash': 'dash'}}]
+        calories['layout']['annotations'] = [{'xref': 'paper', 'x': 1, 'y': target, 'yanchor': 'bottom',
+                                              'xanchor': 'right', 'showarrow': False, 'text': f'Target {target} kcal'}]
+
+    macros = _figure('Macros per day', [
+        {'type': 'scatter', 'x': periods, 'y': [round(row[field], 1) for row in rows], 'name': f'{field.title()} (g)',
+         'mode': 'lines', 'stackgroup': 'macros', 'line': {'color': color}}
+        for field, color in (('protein', '#27ae60'), ('carbs', '#f39c12'), ('fat', '#8e44ad'))
+    ])
+
+    adherence = _figure(
+        f'Days within {ADHERENCE_BAND:.0%} of calorie target, last {ADHERENCE_WINDOW} logged days (%)',
+        [{'type': 'scatter', 'x': periods, 'y': [round(100 * row['adherence_rate']) for row in rows],
+          'name': 'On target', 'mode': 'lines', 'fill': 'tozeroy', 'line': {'color': '#16a085'}}],
+        yaxis={'range': [0, 105]}
+    )
+
+    satisfaction = _figure('Satisfaction and health score', [
+        {'type': 'scatter', 'x': periods, 'y': [round(row['avg_satisfaction'], 2) for row in rows],
+         'name': 'Satisfaction (1-5)', 'mode': 'lines+markers', 'line': {'color': '#e67e22'}},
+        {'type': 'scatter', 'x': periods,
+         'y': [None if row['avg_health_score'] is None else round(row['avg_health_score'], 2) for row in rows],
+         'name': 'Health score (1-10)', 'mode': 'lines+markers', 'connectgaps': True, 'line': {'color': '#2c3e50'}},
+    ])
+
+    return [calories, macros, adherence, satisfaction]
+
+
+def chart_json(daily_rows, target, max_points=MAX_POINTS):
+    rows = mark_adherence(daily_rows, target)
+    summary = summarize(rows, target)
+    figures = build_figures(downsample(rows, max_points), target)
+    return [json.dumps(figure, separators=(',', ':')) for figure in figures], summary
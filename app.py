@@ -1,40 +1,203 @@
+import anyio
 import gradio as gr
-import google.generativeai as genai
-import plotly.express as px
-import plotly.graph_objects as go
+from gradio.components.plot import PlotData
 import json
-from datetime import datetime
-import pandas as pd
+from datetime import datetime, timedelta
 import os
+import tempfile
+import threading
+import time
+import uuid
+
+import analytics
+import metrics
+from cache import ACTIVITY_BUCKETS, DiskCache, LRUCache, ResponseCache, make_key, normalize_prompt, shared_profile
+from gemini_client import GeminiClient
+from meal_analysis import BATCH_ANALYSIS_SCHEMA, MEAL_ANALYSIS_SCHEMA, MealAnalysis
+from meal_store import MealStore
+import nutrition
+from batch import MAX_MEALS as MAX_BATCH_MEALS, MEAL_TYPES, analyze_batch, normalize_meals, parse_meals
+from calculators import calorie_target
+import intents
+from jobs import ACTIVE as ACTIVE_JOBS, JobQueue, QueueFull
+from fitness_plan import EQUIPMENT, REST, WORKOUT_DAY_SCHEMA, build_week, bucket_key, local_week, personalize, plan_html, profile_bucket
+from prompts import SYSTEM_INSTRUCTION, build_chat_contents, build_meal_prompt, build_structured_meal_prompt, contents_tokens, usage_counts
+from resilience import CircuitBreaker, Guard, ModelUnavailable, RateLimiter, is_unavailable
+from router import ModelRouter
+from single_flight import SingleFlight
+from tracing import Trace
+from rendering import StreamingHTML, escape_text, finished_reply, message_fragment, render_chat_history, render_streaming_reply
+from state_store import ChatArchive, MemoryStateStore, SQLiteStateStore, start_idle_eviction
+from static_assets import ROUTE as STATIC_ROUTE, StaticAssets, minify_css, minify_html
+
+def setup_guard():
+    limiter = RateLimiter(
+        requests_per_minute=int(os.getenv('VITALMINA_RPM', '1000')),
+        tokens_per_minute=int(os.getenv('VITALMINA_TPM', '1000000')),
+        max_wait=float(os.getenv('VITALMINA_RATE_MAX_WAIT', '20'))
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.getenv('VITALMINA_BREAKER_FAILURES', '5')),
+        reset_timeout=float(os.getenv('VITALMINA_BREAKER_RESET', '30'))
+    )
+    return Guard(limiter, breaker, retries=int(os.getenv('VITALMINA_RETRIES', '3')))
 
 def setup_gemini():
-    api_key = os.getenv('GEMINI_API_KEY')
-    
-    if not api_key:
-        print("ERROR: GEMINI_API_KEY not found in environment variables")
-        return None
-    
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        print("Testing Gemini Flash API...")
-        response = model.generate_content("Say 'Flash API Connected'")
-        print(f"API Response: {response.text}")
-        
-        print("SUCCESS: Gemini Flash API configured successfully")
-        return model
-        
-    except Exception as e:
-        print(f"ERROR: Gemini setup failed: {str(e)}")
-        return None
+    # Each tier is its own model with its own quota, so each gets its own guard
+    models = {
+        'lite': os.getenv('VITALMINA_LITE_MODEL', 'gemini-2.5-flash-lite'),
+        'flash': os.getenv('VITALMINA_FLASH_MODEL', 'gemini-2.5-flash'),
+    }
+    if os.getenv('VITALMINA_ROUTING', '1') == '0':
+        models = {'flash': models['flash']}
+    options = {}
+    fake_spec = os.getenv('VITALMINA_FAKE_MODEL')
+    if fake_spec:
+        # Load tests and demos without an API key: every tier answers from fake_gemini
+        import fake_gemini
+        options = {
+            'factory': lambda model_name, system_instruction: fake_gemini.from_spec(
+                fake_spec, model_name=model_name, system_instruction=system_instruction),
+            'health_check': None,
+        }
+    tiers = {
+        name: GeminiClient(
+            model_name=model_name,
+            system_instruction=SYSTEM_INSTRUCTION,
+            probe_interval=float(os.getenv('VITALMINA_HEALTH_INTERVAL', '300')),
+            max_inflight=int(os.getenv('VITALMINA_MAX_INFLIGHT', '256')),
+            coalesce=os.getenv('VITALMINA_COALESCE', '1') != '0',
+            guard=setup_guard(),
+            **options
+        )
+        for name, model_name in models.items()
+    }
+    chat_deadline = float(os.getenv('VITALMINA_CHAT_DEADLINE', '8'))
+    deadlines = {
+        'quick_question': chat_deadline,
+        'chat': chat_deadline,
+        'meal': float(os.getenv('VITALMINA_MEAL_DEADLINE', '20')),
+        'plan_day': float(os.getenv('VITALMINA_PLAN_DEADLINE', '20')),
+    }
+    return ModelRouter(tiers, deadlines)
+
+gemini = setup_gemini()
+
+STREAM_RESPONSES = os.getenv('VITALMINA_STREAM', '1') != '0'
+ASYNC_HANDLERS = os.getenv('VITALMINA_ASYNC', '1') != '0'
+CHAT_CONCURRENCY = int(os.getenv('VITALMINA_CHAT_CONCURRENCY', '64'))
+MEAL_CONCURRENCY = int(os.getenv('VITALMINA_MEAL_CONCURRENCY', '32'))
+QUEUE_MAX_SIZE = int(os.getenv('VITALMINA_QUEUE_MAX_SIZE', '512'))
+STRUCTURED_MEALS = os.getenv('VITALMINA_STRUCTURED_MEALS', '1') != '0'
+METRICS_ENDPOINT = os.getenv('VITALMINA_METRICS', '1') != '0'
+LOCAL_INTENTS = os.getenv('VITALMINA_LOCAL_INTENTS', '1') != '0'
+MEAL_JOBS = os.getenv('VITALMINA_MEAL_JOBS', '1') != '0'
+API_ENABLED = os.getenv('VITALMINA_API', '1') != '0'
+API_PREFIX = '/api/v1'
+# Signs the user id kept in the browser's localStorage; without it Gradio picks a
+# random key per process and stored ids are unreadable after a restart
+BROWSER_SECRET = os.getenv('VITALMINA_BROWSER_SECRET')
+JOB_POLL_SECONDS = float(os.getenv('VITALMINA_JOB_POLL', '2'))
+MEAL_JSON_CONFIG = {"response_mime_type": "application/json", "response_schema": MEAL_ANALYSIS_SCHEMA}
+DEGRADED_CHAT_REPLY = "The AI assistant is very busy right now. Please try again in a minute."
+DEGRADED_MEAL_STATUS = "AI service is busy; showing a partial estimate. Try again shortly to log this meal."
+BATCH_JSON_CONFIG = {"response_mime_type": "application/json", "response_schema": BATCH_ANALYSIS_SCHEMA}
+PLAN_JSON_CONFIG = {"response_mime_type": "application/json", "response_schema": WORKOUT_DAY_SCHEMA}
+
+def setup_cache():
+    memory = LRUCache(
+        maxsize=int(os.getenv('VITALMINA_CACHE_SIZE', '512')),
+        ttl=float(os.getenv('VITALMINA_CACHE_TTL', '3600'))
+    )
+    disk_path = os.getenv('VITALMINA_CACHE_DB')
+    disk = DiskCache(disk_path, ttl=float(os.getenv('VITALMINA_CACHE_DISK_TTL', '86400'))) if disk_path else None
+    return ResponseCache(memory, disk)
+
+response_cache = setup_cache()
+
+# Figure JSON per user, keyed by the meal log's revision so any new or completed meal invalidates it
+chart_cache = LRUCache(
+    maxsize=int(os.getenv('VITALMINA_CHART_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('VITALMINA_CHART_CACHE_TTL', '3600'))
+)
 
-model = setup_gemini()
+# Weekly workout plans per profile bucket (goal, activity, age band, BMI band, equipment)
+plan_cache = LRUCache(
+    maxsize=int(os.getenv('VITALMINA_PLAN_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('VITALMINA_PLAN_CACHE_TTL', str(7 * 86400)))
+)
+plan_flights = SingleFlight('fitness_plan')
+PLAN_WORKERS = int(os.getenv('VITALMINA_PLAN_WORKERS', '7'))
 
-user_profile = {}
-meal_log = []
-fitness_plan = {}
-chat_history = []
+QUICK_QUESTIONS = [
+    "What are the best exercises for weight loss?",
+    "Explain keto diet basics for beginners",
+    "Give me some healthy breakfast ideas",
+    "Suggest a home workout routine without equipment",
+    "What are good meal prep tips for the week?",
+    "How do I calculate my daily calorie needs?",
+    "Why is hydration important for fitness?",
+    "How can I break through a fitness plateau?",
+    "What are some good keto meal ideas?"
+]
+GENDERS = ["Male", "Female", "Other"]
+GOALS = ["Weight Loss", "Muscle Gain", "Maintenance", "Improve Fitness", "General Health"]
+ACTIVITY_LEVELS = ["Sedentary", "Lightly Active", "Moderately Active", "Very Active", "Extremely Active"]
+DIETARY_PREFERENCES = ["Vegetarian", "Vegan", "Gluten-Free", "Dairy-Free", "Low-Carb", "Keto", "No Restrictions"]
+QUICK_QUESTION_KEYS = {normalize_prompt(question) for question in QUICK_QUESTIONS}
+HISTORY_TOKEN_BUDGET = int(os.getenv('VITALMINA_HISTORY_TOKENS', '800'))
+BATCH_GROUP_SIZE = int(os.getenv('VITALMINA_BATCH_GROUP_SIZE', '5'))
+BATCH_WORKERS = int(os.getenv('VITALMINA_BATCH_WORKERS', '4'))
+
+PREFETCH = os.getenv('VITALMINA_PREFETCH', '0') == '1'
+PREFETCH_BUDGET = int(os.getenv('VITALMINA_PREFETCH_BUDGET', '3'))
+# Prefetches only start while every tier has at least this share of its burst free
+PREFETCH_MIN_HEADROOM = float(os.getenv('VITALMINA_PREFETCH_HEADROOM', '0.5'))
+
+# Quick questions a new profile is most likely to click first, by goal
+GOAL_QUESTIONS = {
+    'Weight Loss': [0, 2, 4],
+    'Muscle Gain': [3, 4, 2],
+    'Maintenance': [2, 4, 6],
+    'Improve Fitness': [7, 3, 6],
+    'General Health': [2, 6, 3],
+}
+KETO_QUESTIONS = [1, 8]
+
+# Few workers so speculative calls never crowd out the ones users wait on
+prefetch_jobs = JobQueue(
+    'prefetch',
+    workers=int(os.getenv('VITALMINA_PREFETCH_WORKERS', '4')),
+    max_queued=int(os.getenv('VITALMINA_PREFETCH_QUEUE', '128'))
+)
+# Cache keys filled speculatively and not yet used, and prefetches spent per user
+prefetched_keys = LRUCache(maxsize=20000, ttl=float(os.getenv('VITALMINA_CACHE_TTL', '3600')))
+prefetch_spent = LRUCache(maxsize=20000, ttl=86400)
+
+def setup_state_store():
+    state_db = os.getenv('VITALMINA_STATE_DB')
+    idle_ttl = float(os.getenv('VITALMINA_SESSION_TTL', str(6 * 3600)))
+    max_items = int(os.getenv('VITALMINA_SESSION_MAX_ITEMS', '200'))
+    if state_db:
+        return SQLiteStateStore(state_db, idle_ttl=idle_ttl, max_items=max_items)
+    archive_path = os.getenv('VITALMINA_CHAT_ARCHIVE')
+    return MemoryStateStore(
+        max_sessions=int(os.getenv('VITALMINA_MAX_SESSIONS', '10000')),
+        idle_ttl=idle_ttl,
+        max_items=max_items,
+        window=int(os.getenv('VITALMINA_SESSION_WINDOW', '40')),
+        archive=ChatArchive(archive_path, max_items=max_items) if archive_path else None
+    )
+
+state_store = setup_state_store()
+meal_store = MealStore(os.getenv('VITALMINA_MEAL_DB', 'meals.sqlite'))
+
+# Meal analyses that run after the meal is logged, so the button returns at once
+meal_jobs = JobQueue(
+    'meal',
+    workers=int(os.getenv('VITALMINA_MEAL_JOB_WORKERS', '8')),
+    max_queued=int(os.getenv('VITALMINA_MEAL_JOB_QUEUE', '256'))
+)
 
 css = """
 :root {
@@ -410,12 +573,80 @@ button[data-testid="tab"].selected {
 }
 """
 
-def save_profile(name, age, gender, height, weight, goal, activity_level, dietary_preferences):
-    global user_profile
-    
+NAVBAR_HTML = """
+<div class="navbar">
+    <div class="nav-brand">Vitalmina</div>
+    <div class="nav-links"></div>
+</div>
+"""
+
+HERO_HTML = """
+<div class="hero-section">
+    <div class="hero-content">
+        <h1 class="hero-title">FITNESS JOURNEY,<br>AI-OPTIMIZED</h1>
+        <p class="hero-subtitle">Achieve Weight Loss, Muscle Gain, Or A Healthier Lifestyle<br>Effortlessly With AI-Driven Personalized Training</p>
+    </div>
+</div>
+"""
+
+FEATURES_HTML = """
+<div class="feature-grid">
+    <div class="feature-card">
+        <h3 class="feature-title">Personalized Workouts</h3>
+        <p class="feature-description">AI-generated fitness plans tailored to your goals, fitness level, and available equipment</p>
+    </div>
+    <div class="feature-card">
+        <h3 class="feature-title">Smart Nutrition</h3>
+        <p class="feature-description">Get instant nutritional insights and meal recommendations powered by advanced AI analysis</p>
+    </div>
+    <div class="feature-card">
+        <h3 class="feature-title">AI Assistant</h3>
+        <p class="feature-description">Monitor your fitness journey with detailed analytics and personalized insights</p>
+    </div>
+</div>
+"""
+
+def build_static_assets():
+    # Minified once per process and served under content-hash names by create_server()
+    assets = StaticAssets(os.getenv('VITALMINA_STATIC_DIR') or tempfile.mkdtemp(prefix='vitalmina-static-'))
+    return assets, assets.add('vitalmina.css', minify_css(css))
+
+def session_id_for(request):
+    if request is None or not getattr(request, 'session_hash', None):
+        return 'local'
+    return request.session_hash
+
+def user_id_for(session_id, user_id=None):
+    # Opaque and issued once per browser, so two people with the same name never
+    # share a meal log; the id the browser kept survives reloads and restarts,
+    # and re-saving the profile in the same session keeps the id and the history.
+    if user_id:
+        return user_id
+    existing = state_store.get(session_id)['profile']
+    return (existing or {}).get('user_id') or uuid.uuid4().hex
+
+def save_profile(name, age, gender, height, weight, goal, activity_level, dietary_preferences, request: gr.Request = None, user_id=None):
     if not name.strip():
-        return "Please enter your name", None
+        return "Please enter your name", None, user_id
+    
+    user_profile = store_profile(session_id_for(request), name, age, gender, height, weight, goal, activity_level, dietary_preferences, user_id)
+    
+    profile_html = f"""
+    <div class="success-message">
+        <h4>Profile Saved Successfully</h4>
+        <div style="display: flex; flex-wrap: wrap; margin: 15px 0;">
+            <span class="profile-badge">Name: {escape_text(user_profile['name'])}</span>
+            <span class="profile-badge">Goal: {user_profile['goal']}</span>
+            <span class="profile-badge">BMI: {user_profile['bmi']}</span>
+            <span class="profile-badge">Activity: {user_profile['activity_level']}</span>
+        </div>
+        <p><strong>Dietary Preferences:</strong> {', '.join(user_profile['dietary_preferences']) if user_profile['dietary_preferences'] else 'No restrictions'}</p>
+    </div>
+    """
     
+    return "Profile saved successfully", profile_html, user_profile['user_id']
+
+def store_profile(session_id, name, age, gender, height, weight, goal, activity_level, dietary_preferences, user_id=None):
     bmi = round(weight / ((height/100) ** 2), 1)
     
     user_profile = {
@@ -427,205 +658,926 @@ def save_profile(name, age, gender, height, weight, goal, activity_level, dietar
         'goal': goal,
         'activity_level': activity_level,
         'dietary_preferences': dietary_preferences,
-        'bmi': bmi
+        'bmi': bmi,
+        'user_id': user_id_for(session_id, user_id)
     }
+    state_store.set(session_id, 'profile', user_profile)
+    schedule_prefetch(session_id, user_profile)
+    return user_profile
+
+def analyze_meal(meal_type, meal_description, estimated_calories, satisfaction, ai_advice=False, request: gr.Request = None):
+    reply, user_profile, trace = begin_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, ai_advice, request)
+    if reply:
+        return reply
     
-    profile_html = f"""
-    <div class="success-message">
-        <h4>Profile Saved Successfully</h4>
-        <div style="display: flex; flex-wrap: wrap; margin: 15px 0;">
-            <span class="profile-badge">Name: {user_profile['name']}</span>
-            <span class="profile-badge">Goal: {user_profile['goal']}</span>
-            <span class="profile-badge">BMI: {user_profile['bmi']}</span>
-            <span class="profile-badge">Activity: {user_profile['activity_level']}</span>
-        </div>
-        <p><strong>Dietary Preferences:</strong> {', '.join(user_profile['dietary_preferences']) if user_profile['dietary_preferences'] else 'No restrictions'}</p>
-    </div>
-    """
+    if STRUCTURED_MEALS and not ai_advice:
+        return analyze_meal_structured(meal_type, meal_description, estimated_calories, satisfaction, user_profile, trace)
     
-    return "Profile saved successfully", profile_html
+    meal_entry, prompt = begin_meal_advice(meal_type, meal_description, estimated_calories, satisfaction, user_profile, trace)
+    try:
+        with trace.phase('model'):
+            response = gemini.generate(prompt, task='meal', on_response=usage_recorder('analyze_meal', prompt, trace))
+        analysis = StreamingHTML()
+        analysis.append(response.text)
+        return finish_meal_advice(meal_entry, analysis, user_profile, trace)
+    except Exception as e:
+        return meal_error(e, meal_description, user_profile, trace)
 
-def analyze_meal(meal_type, meal_description, estimated_calories, satisfaction):
-    global meal_log
+def begin_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, ai_advice, request):
+    # The start shared by the meal handlers, up to the model call. Returns the
+    # (status, html) reply when the meal is settled without the model, or None
+    # with the profile and trace the model call needs. Reads the session and may
+    # log a food-table meal, so the async handler runs it off the event loop.
+    session_id = session_id_for(request)
+    user_profile = state_store.get(session_id)['profile']
     
     if not user_profile:
-        return "Please create your profile first", None
+        return ("Please create your profile first", None), None, None
     
     if not meal_description.strip():
-        return "Please describe your meal", None
+        return ("Please describe your meal", None), None, None
     
-    if not model:
-        return "AI service is currently unavailable. Please try again later.", None
+    trace = Trace('analyze_meal', session_id)
+    local_html = analyze_meal_locally(meal_type, meal_description, estimated_calories, satisfaction, user_profile, ai_advice, trace)
+    if local_html:
+        trace.finish('local')
+        return ("Meal analyzed successfully", local_html), None, None
+    
+    if not gemini.get_model():
+        trace.finish('unavailable')
+        return ("AI service is currently unavailable. Please try again later.", None), None, None
+    return None, user_profile, trace
+
+def begin_meal_advice(meal_type, meal_description, estimated_calories, satisfaction, user_profile, trace):
+    # Free-text "Detailed AI advice": the entry is logged once the answer is complete
+    with trace.phase('prompt_build'):
+        prompt = build_meal_prompt(meal_type, meal_description, estimated_calories, user_profile)
+    return new_meal_entry(meal_type, meal_description, estimated_calories, satisfaction), prompt
+
+def finish_meal_advice(meal_entry, analysis, user_profile, trace):
+    meal_entry['analysis'] = analysis.text
+    with trace.phase('state_update'):
+        meal_store.add(user_profile['user_id'], meal_entry)
+    metrics.observe('meal_analysis_seconds', (datetime.now() - meal_entry['logged_at']).total_seconds(), path='llm')
+    
+    with trace.phase('render'):
+        html = render_meal_analysis(meal_entry, analysis.html)
+    trace.finish()
+    return "Meal analyzed successfully", html
+
+def new_meal_entry(meal_type, meal_description, calories, satisfaction, logged_at=None, **fields):
+    logged_at = logged_at or datetime.now()
+    return {
+        'logged_at': logged_at,
+        'timestamp': logged_at.strftime("%Y-%m-%d %H:%M"),
+        'meal_type': meal_type,
+        'description': meal_description,
+        'calories': calories,
+        'satisfaction': satisfaction,
+        **fields
+    }
+
+def meal_error(error, meal_description, user_profile, trace):
+    if not is_unavailable(error):
+        trace.finish('error', error)
+        return f"Error analyzing meal: {error}", None
+    
+    # Model busy or down: show what the food table can tell, without logging it
+    metrics.increment('gemini_degraded_total', handler='analyze_meal')
+    trace.finish('degraded', error)
+    result = nutrition.analyze_locally(meal_description, user_profile.get('goal'))
+    if not result['items']:
+        return DEGRADED_MEAL_STATUS, None
+    partial = f"<p><em>Estimate from the food table only. Not recognised: {escape_text(', '.join(result['unresolved']))}</em></p>"
+    return DEGRADED_MEAL_STATUS, partial + MealAnalysis.from_local(result).to_html()
+
+def analyze_meal_structured(meal_type, meal_description, estimated_calories, satisfaction, user_profile, trace):
+    started = time.perf_counter()
+    try:
+        with trace.phase('prompt_build'):
+            prompt = build_structured_meal_prompt(meal_type, meal_description, estimated_calories, user_profile)
+        result = generate_meal_analysis(prompt, trace)
+        return finish_structured_meal(meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace, started)
+    except Exception as e:
+        return meal_error(e, meal_description, user_profile, trace)
+
+def finish_structured_meal(meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace, started):
+    analysis_html = log_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace)
+    metrics.observe('meal_analysis_seconds', time.perf_counter() - started, path='structured')
+    trace.finish()
+    return "Meal analyzed successfully", analysis_html
+
+def generate_meal_analysis(prompt, trace):
+    with trace.phase('model'):
+        response = gemini.generate(prompt, task='meal', on_response=usage_recorder('analyze_meal', prompt, trace), generation_config=MEAL_JSON_CONFIG)
+    with trace.phase('parse'):
+        return parse_meal_analysis(response.text)
+
+async def generate_meal_analysis_async(prompt, trace):
+    with trace.phase('model'):
+        response = await gemini.generate_async(prompt, task='meal', on_response=usage_recorder('analyze_meal', prompt, trace), generation_config=MEAL_JSON_CONFIG)
+    with trace.phase('parse'):
+        return parse_meal_analysis(response.text)
+
+def parse_meal_analysis(text):
+    try:
+        result = MealAnalysis.from_json(text)
+    except ValueError:
+        metrics.increment('meal_analysis_invalid_total')
+        raise
+    return result
+
+def log_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace):
+    meal_entry = store_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace)
+    with trace.phase('render'):
+        return render_meal_analysis(meal_entry, result.to_html())
+
+def store_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace):
+    meal_entry = new_meal_entry(
+        meal_type, meal_description, estimated_calories or round(result.calories), satisfaction,
+        analysis=result.to_text(), **result.columns()
+    )
+    with trace.phase('state_update'):
+        meal_entry['id'] = meal_store.add(user_profile['user_id'], meal_entry)
+    return meal_entry
+
+def analyze_meal_locally(meal_type, meal_description, estimated_calories, satisfaction, user_profile, ai_advice, trace):
+    # Fully resolved descriptions are answered from the bundled food table; the
+    # model is only used for unknown foods or when narrative advice is asked for.
+    if ai_advice:
+        metrics.increment('nutrition_parse_total', result='skipped')
+        return None
     
-    prompt = f"""
-    Analyze this meal for nutritional content and provide health insights:
-    Meal: {meal_description}
-    Meal Type: {meal_type}
-    Estimated Calories: {estimated_calories}
+    started = time.perf_counter()
+    with trace.phase('local_parse'):
+        result = nutrition.analyze_locally(meal_description, user_profile.get('goal'))
+    if result['unresolved'] or not result['items']:
+        metrics.increment('nutrition_parse_total', result='unresolved')
+        return None
     
-    User Profile: {user_profile}
+    analysis_html = log_meal_analysis(
+        meal_type, meal_description, estimated_calories, satisfaction, user_profile, MealAnalysis.from_local(result), trace
+    )
     
-    Please provide:
-    1. Nutritional breakdown (proteins, carbs, fats)
-    2. Health score (1-10)
-    3. 2 positive aspects
-    4. 1 suggestion for improvement
-    5. Fit it into the user's goal: {user_profile.get('goal', 'General Health')}
+    metrics.increment('nutrition_parse_total', result='resolved')
+    metrics.observe('meal_analysis_seconds', time.perf_counter() - started, path='local')
+    return analysis_html
+
+def submit_meal(meal_type, meal_description, estimated_calories, satisfaction, ai_advice=False, request: gr.Request = None):
+    session_id = session_id_for(request)
+    user_profile = state_store.get(session_id)['profile']
     
-    Format the response clearly and concisely.
-    """
+    if not user_profile:
+        return "Please create your profile first", None, *render_meal_jobs(request)
+    
+    if not meal_description.strip():
+        return "Please describe your meal", None, *render_meal_jobs(request)
+    
+    trace = Trace('submit_meal', session_id)
+    local_html = analyze_meal_locally(meal_type, meal_description, estimated_calories, satisfaction, user_profile, ai_advice, trace)
+    if local_html:
+        trace.finish('local')
+        return "Meal analyzed successfully", local_html, *render_meal_jobs(request)
+    
+    # Logged right away as pending; the job fills in the analysis and macros
+    meal_entry = new_meal_entry(meal_type, meal_description, estimated_calories, satisfaction, status='pending')
+    with trace.phase('state_update'):
+        meal_id = meal_store.add(user_profile['user_id'], meal_entry)
     
     try:
-        response = model.generate_content(prompt)
-        analysis = response.text
-        
-        meal_entry = {
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-            'meal_type': meal_type,
-            'description': meal_description,
-            'calories': estimated_calories,
-            'satisfaction': satisfaction,
-            'analysis': analysis
-        }
-        
-        meal_log.append(meal_entry)
-        
-        analysis_html = f"""
+        job = meal_jobs.submit(session_id, run_meal_job, label=meal_description, data={
+            'meal_id': meal_id, 'entry': meal_entry, 'profile': user_profile, 'ai_advice': ai_advice
+        })
+    except QueueFull as e:
+        meal_store.update(meal_id, status='failed')
+        trace.finish('rejected', e)
+        return "Meal logged, but too many analyses are waiting; retry it from the list below shortly.", None, *render_meal_jobs(request)
+    
+    trace.set(job=job.id)
+    trace.finish('queued')
+    return f"Meal logged; analysis running in the background (job {job.id})", None, *render_meal_jobs(request)
+
+def run_meal_job(job):
+    data = job.data
+    meal_entry = data['entry']
+    trace = Trace('meal_job', job.session_id)
+    trace.record('queue_wait', job.started - job.submitted)
+    try:
+        if not gemini.get_model():
+            raise RuntimeError("AI service is currently unavailable")
+        if STRUCTURED_MEALS and not data['ai_advice']:
+            with trace.phase('prompt_build'):
+                prompt = build_structured_meal_prompt(meal_entry['meal_type'], meal_entry['description'], meal_entry['calories'], data['profile'])
+            result = generate_meal_analysis(prompt, trace)
+            fields = {'analysis': result.to_text(), **result.columns()}
+            if not meal_entry['calories']:
+                fields['calories'] = round(result.calories)
+            analysis_html = result.to_html()
+        else:
+            with trace.phase('prompt_build'):
+                prompt = build_meal_prompt(meal_entry['meal_type'], meal_entry['description'], meal_entry['calories'], data['profile'])
+            with trace.phase('model'):
+                response = gemini.generate(prompt, task='meal', on_response=usage_recorder('meal_job', prompt, trace))
+            fields = {'analysis': response.text}
+            analysis_html = escape_text(response.text)
+    except Exception as e:
+        if not job.cancelled:
+            meal_store.update(data['meal_id'], status='failed')
+        trace.finish('error', e)
+        raise
+    
+    if job.cancelled:
+        trace.finish('cancelled')
+        return None
+    with trace.phase('state_update'):
+        meal_store.update(data['meal_id'], status='done', **fields)
+    with trace.phase('render'):
+        analysis_html = render_meal_analysis({**meal_entry, 'calories': fields.get('calories', meal_entry['calories'])}, analysis_html)
+    trace.finish()
+    return analysis_html
+
+def cancel_meal_job(job_id, request: gr.Request = None):
+    job = meal_jobs.cancel(job_id.strip(), session_id_for(request))
+    if job is None:
+        return "No queued or running job with that ID", *render_meal_jobs(request)
+    meal_store.update(job.data['meal_id'], status='cancelled')
+    return f"Cancelled job {job.id}; the meal stays logged without analysis", *render_meal_jobs(request)
+
+def retry_meal_job(job_id, request: gr.Request = None):
+    job = meal_jobs.retry(job_id.strip(), session_id_for(request))
+    if job is None:
+        return "No failed or cancelled job with that ID", *render_meal_jobs(request)
+    meal_store.update(job.data['meal_id'], status='pending')
+    return f"Retrying job {job.id}", *render_meal_jobs(request)
+
+def render_meal_jobs(request: gr.Request = None):
+    # The session's recent jobs, and the poll timer, which only runs while one is unfinished
+    jobs = meal_jobs.for_session(session_id_for(request))
+    if not jobs:
+        return "", gr.Timer(active=False)
+    now = time.time()
+    rows = []
+    for job in jobs:
+        seconds = (job.finished or now) - job.submitted
+        detail = escape_text(str(job.error)) if job.error is not None else ""
+        rows.append(f"<tr><td><code>{job.id}</code></td><td>{escape_text(job.label)}</td>"
+                    f"<td>{job.status}</td><td>{seconds:.1f} s</td><td>{detail}</td></tr>")
+    finished = [job for job in jobs if job.status == 'done' and job.result]
+    jobs_html = f"""
+        <div class="analysis-box">
+            <h4>Meal Analysis Jobs</h4>
+            <table style="width: 100%; border-collapse: collapse;">
+                <tr><th>Job</th><th>Meal</th><th>Status</th><th>Time</th><th>Error</th></tr>
+                {''.join(rows)}
+            </table>
+        </div>
+        {finished[0].result if finished else ''}
+        """
+    return jobs_html, gr.Timer(active=any(job.status in ACTIVE_JOBS for job in jobs))
+
+def analyze_meal_batch(upload, pasted_meals, request: gr.Request = None):
+    user_profile = state_store.get(session_id_for(request))['profile']
+    
+    if not user_profile:
+        return "Please create your profile first", None
+    
+    try:
+        meals = parse_meals(path=upload) if upload else parse_meals(text=pasted_meals)
+    except Exception as e:
+        return f"Could not read meals: {e}", None
+    
+    if not meals:
+        return "Please upload a CSV/JSON file or paste one meal per line", None
+    
+    meal_entries, results = log_meal_batch(meals, user_profile)
+    failed = sum(1 for result in results if result['source'] == 'failed')
+    local = sum(1 for result in results if result['source'] == 'local')
+    queued = queue_failed_meals(session_id_for(request), user_profile, meal_entries) if MEAL_JOBS and failed else 0
+    
+    rows = "".join(
+        f"<tr><td>{entry['timestamp']}</td><td>{entry['meal_type']}</td><td>{escape_text(entry['description'])}</td>"
+        f"<td>{entry['calories']:.0f}</td><td>{escape_text(entry['analysis'] or result.get('error', ''))}</td></tr>"
+        for entry, result in zip(meal_entries, results)
+    )
+    batch_html = f"""
+        <div class="analysis-box">
+            <h4>Batch Meal Analysis</h4>
+            <table style="width: 100%; border-collapse: collapse;">
+                <tr><th>When</th><th>Type</th><th>Meal</th><th>Calories</th><th>Analysis</th></tr>
+                {rows}
+            </table>
+        </div>
+        """
+    
+    status = f"Logged {len(meals)} meals ({local} analyzed locally"
+    status += f", {failed} without analysis)" if failed else ")"
+    if queued:
+        status += f"; {queued} queued for another try as background jobs"
+    return status, batch_html
+
+def queue_failed_meals(session_id, user_profile, meal_entries):
+    # Meals whose group call failed get a meal job each, so they show up in the
+    # job list and can be retried; those that do not fit in the queue stay failed.
+    queued = 0
+    for entry in meal_entries:
+        if entry['status'] != 'failed':
+            continue
+        meal_store.update(entry['id'], status='pending')
+        try:
+            meal_jobs.submit(session_id, run_meal_job, label=entry['description'], data={
+                'meal_id': entry['id'], 'entry': entry, 'profile': user_profile, 'ai_advice': False
+            })
+        except QueueFull:
+            meal_store.update(entry['id'], status='failed')
+            break
+        queued += 1
+    return queued
+
+def log_meal_batch(meals, user_profile):
+    model = gemini.get_model()
+    
+    def generate(prompt):
+        if not model:
+            raise RuntimeError("AI service is currently unavailable")
+        return gemini.generate(prompt, task='meal_batch', on_response=usage_recorder('analyze_meal_batch', prompt), generation_config=BATCH_JSON_CONFIG).text
+    
+    started = time.perf_counter()
+    results = analyze_batch(meals, user_profile, generate, BATCH_GROUP_SIZE, BATCH_WORKERS)
+    metrics.observe('meal_batch_seconds', time.perf_counter() - started)
+    
+    meal_entries = []
+    for meal, result in zip(meals, results):
+        meal_entries.append(new_meal_entry(
+            meal['meal_type'], meal['description'], meal['calories'] or round(result.get('calories') or 0), meal['satisfaction'],
+            logged_at=meal['logged_at'], analysis=result.get('analysis'),
+            # no analysis came back; the UI batch retries these as meal jobs
+            status='failed' if result['source'] == 'failed' else 'done',
+            **result.get('columns', {})
+        ))
+    for entry, meal_id in zip(meal_entries, meal_store.add_many(user_profile['user_id'], meal_entries)):
+        entry['id'] = meal_id
+    
+    failed = sum(1 for result in results if result['source'] == 'failed')
+    local = sum(1 for result in results if result['source'] == 'local')
+    metrics.increment('meal_batch_meals_total', len(meals) - failed - local, source='llm')
+    metrics.increment('meal_batch_meals_total', local, source='local')
+    metrics.increment('meal_batch_meals_total', failed, source='failed')
+    return meal_entries, results
+
+def generate_fitness_plan(equipment, request: gr.Request = None):
+    session_id = session_id_for(request)
+    user_profile = state_store.get(session_id)['profile']
+    
+    if not user_profile:
+        return "Please create your profile first", None
+    
+    trace = Trace('fitness_plan', session_id)
+    bucket = profile_bucket(user_profile, equipment)
+    key = bucket_key(bucket)
+    trace.set(plan_bucket=key)
+    with trace.phase('cache_lookup'):
+        days = plan_cache.get(key)
+    metrics.increment('plan_cache_total', result='miss' if days is None else 'hit')
+    if days is not None:
+        prefetch_used('plan', key)
+    
+    failed = 0
+    if days is None:
+        # everyone in the bucket asking at once waits for the same seven calls
+        with trace.phase('model'):
+            days, failed = plan_flights.call(key, lambda: build_fitness_plan(bucket, key, trace))
+    
+    with trace.phase('personalize'):
+        days = personalize(days, user_profile)
+    
+    with trace.phase('state_update'):
+        state_store.set(session_id, 'fitness_plan', {
+            'bucket': key,
+            'created': datetime.now().strftime("%Y-%m-%d %H:%M"),
+            'days': days
+        })
+    
+    with trace.phase('render'):
+        plan = plan_html(days, user_profile)
+    
+    trace.finish('degraded' if failed else 'ok')
+    if failed:
+        return f"Workout plan ready; {failed} days use the built-in exercise library while the AI service is busy", plan
+    return "Workout plan ready", plan
+
+def build_fitness_plan(bucket, key, trace):
+    model = gemini.get_model()
+    if not model:
+        days = local_week(bucket)
+        return days, sum(1 for day in days if day['focus'] != REST)
+    
+    def generate(prompt):
+        return gemini.generate(prompt, task='plan_day', on_response=usage_recorder('fitness_plan', prompt, trace), generation_config=PLAN_JSON_CONFIG).text
+    
+    started = time.perf_counter()
+    days, failed = build_week(bucket, generate, PLAN_WORKERS)
+    metrics.observe('plan_build_seconds', time.perf_counter() - started)
+    # a plan patched from the library is served but not cached, so the next request retries the model
+    if not failed:
+        plan_cache.set(key, days)
+    return days, failed
+
+def render_meal_analysis(meal_entry, analysis_html):
+    # analysis_html is already escaped; the user's own fields are escaped here
+    return f"""
         <div class="analysis-box">
             <h4>AI Meal Analysis</h4>
             <div class="meal-log">
-                <strong>Meal:</strong> {meal_entry['description']}<br>
-                <strong>Type:</strong> {meal_entry['meal_type']}<br>
+                <strong>Meal:</strong> {escape_text(meal_entry['description'])}<br>
+                <strong>Type:</strong> {escape_text(meal_entry['meal_type'] or '')}<br>
                 <strong>Calories:</strong> {meal_entry['calories']}<br>
                 <strong>Satisfaction:</strong> {'★' * meal_entry['satisfaction']}
             </div>
             <div style="margin-top: 15px; padding: 20px; background: #489cef; border-radius: 10px; border: 1px solid #246cb5;">
-                {analysis.replace(chr(10), '<br>')}
+                {analysis_html}
             </div>
         </div>
         """
-        
-        return "Meal analyzed successfully", analysis_html
-        
+
+def analyze_meal_stream(meal_type, meal_description, estimated_calories, satisfaction, ai_advice=False, request: gr.Request = None):
+    reply, user_profile, trace = begin_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, ai_advice, request)
+    if reply:
+        yield reply
+        return
+    
+    if STRUCTURED_MEALS and not ai_advice:
+        # A JSON document is only useful once complete, so it is not streamed.
+        yield analyze_meal_structured(meal_type, meal_description, estimated_calories, satisfaction, user_profile, trace)
+        return
+    
+    meal_entry, prompt = begin_meal_advice(meal_type, meal_description, estimated_calories, satisfaction, user_profile, trace)
+    analysis = StreamingHTML()
+    try:
+        for chunk in stream_generate(prompt, 'analyze_meal', 'meal', trace):
+            with trace.phase('render'):
+                analysis.append(chunk)
+                html = render_meal_analysis(meal_entry, analysis.html)
+            yield "Analyzing meal...", html
+        yield finish_meal_advice(meal_entry, analysis, user_profile, trace)
     except Exception as e:
-        return f"Error analyzing meal: {e}", None
+        yield meal_error(e, meal_description, user_profile, trace)
 
-def chat_with_ai(message, chat_history):
+def stream_generate(prompt, handler, task, trace):
+    started = time.perf_counter()
+    first_token = True
+    chunks = iter(gemini.stream(prompt, task=task, on_response=usage_recorder(handler, prompt, trace)))
+    
+    while True:
+        # only the wait for the model counts; the caller renders between chunks
+        with trace.phase('model'):
+            text = next(chunks, None)
+        if text is None:
+            break
+        if first_token:
+            metrics.observe('time_to_first_token_seconds', time.perf_counter() - started, handler=handler)
+            trace.mark('first_token')
+            first_token = False
+        yield text
+    
+    metrics.observe('stream_duration_seconds', time.perf_counter() - started, handler=handler)
+
+def usage_recorder(handler, prompt, trace=None):
+    return lambda response: record_usage(response, handler, prompt, trace)
+
+def record_usage(response, handler, prompt, trace=None):
+    metrics.observe('prompt_tokens_estimated', contents_tokens(prompt), handler=handler)
+    usage = usage_counts(response)
+    if usage:
+        metrics.observe('prompt_tokens', usage['prompt'], handler=handler)
+        metrics.observe('output_tokens', usage['output'], handler=handler)
+        metrics.increment('tokens_total', usage['total'], handler=handler)
+        if trace is not None:
+            trace.set(prompt_tokens=usage['prompt'], output_tokens=usage['output'])
+
+async def analyze_meal_async(meal_type, meal_description, estimated_calories, satisfaction, ai_advice=False, request: gr.Request = None):
+    # The same steps as analyze_meal_stream; session reads, the food table and
+    # meal log writes run in worker threads so the event loop only awaits the model
+    reply, user_profile, trace = await anyio.to_thread.run_sync(
+        begin_meal_analysis, meal_type, meal_description, estimated_calories, satisfaction, ai_advice, request
+    )
+    if reply:
+        yield reply
+        return
+    
+    if STRUCTURED_MEALS and not ai_advice:
+        started = time.perf_counter()
+        try:
+            with trace.phase('prompt_build'):
+                prompt = build_structured_meal_prompt(meal_type, meal_description, estimated_calories, user_profile)
+            result = await generate_meal_analysis_async(prompt, trace)
+            yield await anyio.to_thread.run_sync(
+                finish_structured_meal, meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace, started
+            )
+        except Exception as e:
+            yield await anyio.to_thread.run_sync(meal_error, e, meal_description, user_profile, trace)
+        return
+    
+    meal_entry, prompt = begin_meal_advice(meal_type, meal_description, estimated_calories, satisfaction, user_profile, trace)
+    analysis = StreamingHTML()
+    try:
+        async for chunk in stream_generate_async(prompt, 'analyze_meal', 'meal', trace):
+            analysis.append(chunk)
+            if STREAM_RESPONSES:
+                with trace.phase('render'):
+                    html = render_meal_analysis(meal_entry, analysis.html)
+                yield "Analyzing meal...", html
+        yield await anyio.to_thread.run_sync(finish_meal_advice, meal_entry, analysis, user_profile, trace)
+    except Exception as e:
+        yield await anyio.to_thread.run_sync(meal_error, e, meal_description, user_profile, trace)
+
+async def stream_generate_async(prompt, handler, task, trace):
+    started = time.perf_counter()
+    first_token = True
+    chunks = gemini.stream_async(prompt, task=task, on_response=usage_recorder(handler, prompt, trace)).__aiter__()
+    
+    while True:
+        with trace.phase('model'):
+            text = await anext(chunks, None)
+        if text is None:
+            break
+        if first_token:
+            metrics.observe('time_to_first_token_seconds', time.perf_counter() - started, handler=handler)
+            trace.mark('first_token')
+            first_token = False
+        yield text
+    
+    metrics.observe('stream_duration_seconds', time.perf_counter() - started, handler=handler)
+
+def chat_with_ai(message, request: gr.Request = None):
+    # Returns the last 10 messages in full: Gradio only diffs successive updates
+    # within one event, so the append-only updates are limited to streamed replies
+    session_id = session_id_for(request)
+    state = state_store.get(session_id)
+    chat_history = state['chat_history']
+    
+    local_html = chat_locally(message, state['profile'], session_id, chat_history)
+    if local_html is not None:
+        return local_html
+    
+    model = gemini.get_model()
     if not model:
         error_msg = "AI service is currently unavailable. Please check if the API key is properly configured in Hugging Face secrets."
-        chat_history.append({"role": "user", "content": message})
-        chat_history.append({"role": "assistant", "content": error_msg})
-        
-        formatted_history = ""
-        for chat in chat_history[-10:]:
-            if chat["role"] == "user":
-                formatted_history += f'<div class="chat-message user-message"><strong>You:</strong> {chat["content"]}</div>'
-            else:
-                formatted_history += f'<div class="chat-message bot-message"><strong></strong> {chat["content"].replace(chr(10), "<br>")}</div>'
-        
-        return chat_history, formatted_history
+        record_chat(session_id, chat_history, {"role": "user", "content": message}, {"role": "assistant", "content": error_msg})
+        return render_chat_history(chat_history)
     
     if not message.strip():
-        return chat_history, "Please enter a message."
-    
-    chat_history.append({"role": "user", "content": message})
+        return "Please enter a message."
     
+    trace = Trace('chat_with_ai', session_id)
     try:
-        context = f"""
-        You are Vitalmina, a professional health and fitness assistant using the latest AI technology.
-        
-        User Profile: {user_profile if user_profile else "No profile created yet"}
-        
-        User's Question: {message}
-        
-        Please provide:
-        - Accurate, evidence-based information
-        - Practical, actionable advice
-        - Personalized recommendations when possible
-        - Clear explanations
-        - Warnings about consulting professionals for medical advice
-        
-        Focus on these areas:
-        Fitness & Exercise
-        Nutrition & Diet
-        Keto & Special Diets
-        Health & Wellness
-        Workout Routines
-        Meal Planning
-        Weight Management
-        Supplement Guidance
-        
-        Keep responses concise but informative and professional.
-        """
-        
-        response = model.generate_content(context)
-        ai_response = response.text
-        chat_history.append({"role": "assistant", "content": ai_response})
-        formatted_history = ""
-        for chat in chat_history[-10:]:
-            if chat["role"] == "user":
-                formatted_history += f'<div class="chat-message user-message"><strong>You:</strong> {chat["content"]}</div>'
-            else:
-                formatted_history += f'<div class="chat-message bot-message"><strong></strong> {chat["content"].replace(chr(10), "<br>")}</div>'
-        
-        return chat_history, formatted_history
+        ai_response = generate_chat_response(message, state['profile'], chat_history, trace)
+        with trace.phase('state_update'):
+            record_chat(session_id, chat_history, {"role": "user", "content": message}, {"role": "assistant", "content": ai_response})
         
     except Exception as e:
-        error_msg = f"Error processing your request: {str(e)}"
-        chat_history.append({"role": "assistant", "content": error_msg})
-        
-        formatted_history = ""
-        for chat in chat_history[-10:]:
-            if chat["role"] == "user":
-                formatted_history += f'<div class="chat-message user-message"><strong>You:</strong> {chat["content"]}</div>'
-            else:
-                formatted_history += f'<div class="chat-message bot-message"><strong></strong> {chat["content"].replace(chr(10), "<br>")}</div>'
+        error_msg = chat_error(e, message, state['profile'], chat_history, trace)
+        record_chat(session_id, chat_history, {"role": "user", "content": message}, {"role": "assistant", "content": error_msg})
+    
+    with trace.phase('render'):
+        html = render_chat_history(chat_history)
+    trace.finish(trace.attributes.get('cache', 'ok'))
+    return html
+
+def chat_locally(message, profile, session_id, chat_history):
+    # Calorie, macro, BMI and water questions are computed from the profile
+    # without the model or the response cache; anything else returns None.
+    if not LOCAL_INTENTS:
+        return None
+    trace = Trace('chat_with_ai', session_id)
+    with trace.phase('local_parse'):
+        intent, reply = local_reply(message, profile)
+    if reply is None:
+        return None
+    
+    with trace.phase('state_update'):
+        record_chat(session_id, chat_history, {"role": "user", "content": message}, {"role": "assistant", "content": reply})
+    with trace.phase('render'):
+        html = render_chat_history(chat_history)
+    trace.set(intent=intent)
+    trace.finish('local')
+    return html
+
+def local_reply(message, profile):
+    intent = intents.classify(message)
+    reply = intents.answer(intent, profile) if intent else None
+    if intent:
+        metrics.increment('chat_intent_total', intent=intent, path='local' if reply else 'llm')
+    return intent, reply
+
+def chat_error(error, message, profile, chat_history, trace):
+    if not is_unavailable(error):
+        trace.finish('error', error)
+        return f"Error processing your request: {str(error)}"
+    
+    metrics.increment('gemini_degraded_total', handler='chat_with_ai')
+    trace.finish('degraded', error)
+    key = make_key(message, profile) if not prompt_history(message, chat_history) else None
+    stale = response_cache.get_stale(key) if key else None
+    return stale or DEGRADED_CHAT_REPLY
+
+def record_chat(session_id, chat_history, *messages):
+    for chat in messages:
+        message_fragment(chat)
+    chat_history.extend(messages)
+    state_store.append(session_id, 'chat_history', *messages)
+
+def generate_chat_response(message, profile, chat_history, trace):
+    history = prompt_history(message, chat_history)
+    key = make_key(message, profile) if not history else None
+    if key:
+        with trace.phase('cache_lookup'):
+            cached = response_cache.get(key)
+        if cached is not None:
+            trace.set(cache='hit')
+            prefetch_used('question', key)
+            return cached
+    
+    with trace.phase('prompt_build'):
+        contents = build_chat_contents(message, prompt_profile(profile, key), history, HISTORY_TOKEN_BUDGET)
+    with trace.phase('model'):
+        response = gemini.generate(contents, task=chat_task(message), on_response=usage_recorder('chat_with_ai', contents, trace))
+    if key:
+        with trace.phase('state_update'):
+            response_cache.set(key, response.text)
+    return response.text
+
+def prompt_profile(profile, key):
+    # A cached answer is served to everyone with the same key, so its prompt
+    # may only use the fields the key covers
+    return shared_profile(profile) if key else profile
+
+def prompt_history(message, chat_history):
+    # Quick questions are answered standalone so their answers stay shareable
+    # through the response cache; free-form follow-ups see the earlier turns.
+    if normalize_prompt(message) in QUICK_QUESTION_KEYS:
+        return []
+    return chat_history
+
+def chat_task(message):
+    return 'quick_question' if normalize_prompt(message) in QUICK_QUESTION_KEYS else 'chat'
+
+def prewarm_profiles():
+    # Cached answers are keyed by goal, activity bucket and diet, so warming only
+    # the anonymous key helps nobody who has saved a profile. One profile per goal
+    # and activity bucket, with no dietary preferences, covers the common keys.
+    levels = {}
+    for level in ACTIVITY_LEVELS:
+        levels.setdefault(ACTIVITY_BUCKETS[level], level)
+    return [{'goal': goal, 'activity_level': level, 'dietary_preferences': []}
+            for goal in GOALS for level in levels.values()]
+
+def wait_for_headroom(timeout=60):
+    # Warming is optional: pace it so the users' calls keep most of the quota
+    deadline = time.monotonic() + timeout
+    while not prefetch_headroom():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.5)
+    return True
+
+def prewarm_quick_questions():
+    model = gemini.get_model()
+    if not model:
+        return
+    
+    # Every quick question for visitors without a profile, then each goal's likely ones
+    items = [(question, None) for question in QUICK_QUESTIONS]
+    for profile in prewarm_profiles():
+        items += [(QUICK_QUESTIONS[index], profile) for index in GOAL_QUESTIONS[profile['goal']]]
+    
+    for question, profile in items:
+        if LOCAL_INTENTS and intents.classify(question):
+            continue
+        if make_key(question, profile) in response_cache:
+            continue
+        if not wait_for_headroom():
+            print("WARNING: Cache prewarm stopped early; Gemini stayed busy or unavailable")
+            break
+        trace = Trace('prewarm')
+        try:
+            generate_chat_response(question, profile, (), trace)
+            trace.finish()
+        except Exception as e:
+            trace.finish('error', e)
+            print(f"ERROR: Cache prewarm failed for '{question}': {str(e)}")
+    
+    print(f"Response cache prewarmed: {response_cache.stats()}")
+
+def predicted_prefetches(profile):
+    # What a new profile is likely to ask for next: goal-specific quick questions
+    # and a bodyweight starter plan. Questions the calculators answer are skipped.
+    indices = GOAL_QUESTIONS.get(profile.get('goal'), GOAL_QUESTIONS['General Health'])
+    if 'Keto' in (profile.get('dietary_preferences') or []):
+        indices = KETO_QUESTIONS + indices
+    questions = [QUICK_QUESTIONS[index] for index in indices]
+    items = [('question', question) for question in questions if not (LOCAL_INTENTS and intents.classify(question))]
+    return items[:2] + [('plan', EQUIPMENT[0])] + items[2:]
+
+def schedule_prefetch(session_id, profile):
+    if not PREFETCH:
+        return
+    try:
+        prefetch_jobs.submit(session_id, lambda job: run_prefetch(profile), label='prefetch')
+    except QueueFull:
+        metrics.increment('prefetch_total', kind='profile', result='dropped')
+
+def prefetch_headroom():
+    for client in gemini.tiers.values():
+        guard = client.guard
+        if guard is None:
+            continue
+        if guard.breaker is not None and guard.breaker.state != 'closed':
+            return False
+        if guard.limiter is not None and guard.limiter.headroom() < PREFETCH_MIN_HEADROOM:
+            return False
+    return True
+
+def run_prefetch(profile):
+    if not gemini.get_model():
+        return
+    spent = prefetch_spent.get(profile['user_id']) or 0
+    for kind, item in predicted_prefetches(profile):
+        if kind == 'question':
+            key = make_key(item, profile)
+            cached = key in response_cache
+        else:
+            bucket = profile_bucket(profile, item)
+            key = bucket_key(bucket)
+            cached = key in plan_cache
         
-        return chat_history, formatted_history
-
-def clear_chat():
-    global chat_history
-    chat_history = []
-    return [], ""
-
-def create_interface():
-    with gr.Blocks(css=css, theme=gr.themes.Soft()) as demo:
-        gr.HTML("""
-        <div class="navbar">
-            <div class="nav-brand">Vitalmina</div>
-            <div class="nav-links"></div>
+        if cached:
+            result = 'cached'
+        elif spent >= PREFETCH_BUDGET:
+            result = 'over_budget'
+        elif not prefetch_headroom():
+            result = 'busy'
+        else:
+            trace = Trace('prefetch')
+            trace.set(kind=kind)
+            try:
+                if kind == 'question':
+                    generate_chat_response(item, profile, (), trace)
+                else:
+                    plan_flights.call(key, lambda: build_fitness_plan(bucket, key, trace))
+                prefetched_keys.set(f"{kind}:{key}", True)
+                spent += 1
+                prefetch_spent.set(profile['user_id'], spent)
+                trace.finish()
+                result = 'issued'
+            except Exception as e:
+                trace.finish('error', e)
+                result = 'failed'
+        metrics.increment('prefetch_total', kind=kind, result=result)
+
+def prefetch_used(kind, key):
+    # The first hit on a speculatively filled entry is what made it worth the call
+    if PREFETCH and key and prefetched_keys.pop(f"{kind}:{key}") is not None:
+        metrics.increment('prefetch_used_total', kind=kind)
+
+def chat_with_ai_stream(message, request: gr.Request = None):
+    html, turn = begin_chat_stream(message, request)
+    if turn is None:
+        yield html
+        return
+    
+    reply = StreamingHTML()
+    try:
+        for chunk in stream_generate(turn['contents'], 'chat_with_ai', chat_task(message), turn['trace']):
+            with turn['trace'].phase('render'):
+                reply.append(chunk)
+                html = render_streaming_reply(turn['previous_html'], reply)
+            yield html
+    except Exception as e:
+        yield finish_chat_stream(turn, error=e)
+        return
+    yield finish_chat_stream(turn, reply)
+
+async def chat_with_ai_async(message, request: gr.Request = None):
+    # The same steps as chat_with_ai_stream; the session store, cache and the
+    # non-streamed fallback run in worker threads so the event loop only awaits the model
+    html, turn = await anyio.to_thread.run_sync(begin_chat_stream, message, request)
+    if turn is None:
+        yield html
+        return
+    
+    reply = StreamingHTML()
+    try:
+        async for chunk in stream_generate_async(turn['contents'], 'chat_with_ai', chat_task(message), turn['trace']):
+            reply.append(chunk)
+            if STREAM_RESPONSES:
+                with turn['trace'].phase('render'):
+                    html = render_streaming_reply(turn['previous_html'], reply)
+                yield html
+    except Exception as e:
+        yield await anyio.to_thread.run_sync(finish_chat_stream, turn, None, e)
+        return
+    yield await anyio.to_thread.run_sync(finish_chat_stream, turn, reply)
+
+def begin_chat_stream(message, request):
+    # The start shared by the streaming chat handlers, up to the model call.
+    # Returns the finished HTML when the turn needs no model (local intent, cache
+    # hit, no model, empty message), or None with the turn to stream.
+    session_id = session_id_for(request)
+    state = state_store.get(session_id)
+    chat_history = state['chat_history']
+    
+    local_html = chat_locally(message, state['profile'], session_id, chat_history)
+    if local_html is not None:
+        return local_html, None
+    
+    if not gemini.get_model() or not message.strip():
+        return chat_with_ai(message, request), None
+    user_message = {"role": "user", "content": message}
+    
+    trace = Trace('chat_with_ai', session_id)
+    history = prompt_history(message, chat_history)
+    key = make_key(message, state['profile']) if not history else None
+    with trace.phase('cache_lookup'):
+        cached = response_cache.get(key) if key else None
+    if cached is not None:
+        prefetch_used('question', key)
+        with trace.phase('state_update'):
+            record_chat(session_id, chat_history, user_message, {"role": "assistant", "content": cached})
+        with trace.phase('render'):
+            html = render_chat_history(chat_history)
+        trace.finish('hit')
+        return html, None
+    
+    with trace.phase('prompt_build'):
+        contents = build_chat_contents(message, prompt_profile(state['profile'], key), history, HISTORY_TOKEN_BUDGET)
+    with trace.phase('render'):
+        previous_html = render_chat_history(chat_history + [user_message], limit=9)
+    return None, {
+        'session_id': session_id, 'profile': state['profile'], 'chat_history': chat_history, 'message': user_message,
+        'key': key, 'contents': contents, 'previous_html': previous_html, 'trace': trace,
+    }
+
+def finish_chat_stream(turn, reply=None, error=None):
+    session_id, chat_history, trace = turn['session_id'], turn['chat_history'], turn['trace']
+    if error is None:
+        with trace.phase('state_update'):
+            record_chat(session_id, chat_history, turn['message'], finished_reply(reply))
+            if turn['key']:
+                response_cache.set(turn['key'], reply.text)
+    else:
+        error_msg = chat_error(error, turn['message']['content'], turn['profile'], chat_history, trace)
+        record_chat(session_id, chat_history, turn['message'], {"role": "assistant", "content": error_msg})
+    
+    with trace.phase('render'):
+        html = render_chat_history(chat_history)
+    trace.finish()
+    return html
+
+def clear_chat(request: gr.Request = None):
+    state_store.clear(session_id_for(request), 'chat_history')
+    return ""
+
+def show_full_chat(request: gr.Request = None):
+    # Older messages are read back from the archive only when asked for
+    chat_history = state_store.history(session_id_for(request))
+    return render_chat_history(chat_history, limit=len(chat_history))
+
+def render_analytics(range_label, request: gr.Request = None):
+    user_profile = state_store.get(session_id_for(request))['profile']
+    
+    if not user_profile:
+        return "Please create your profile first", None, None, None, None
+    
+    user_id = user_profile['user_id']
+    target = calorie_target(user_profile)
+    today = datetime.now().date()
+    key = f"{user_id}:{meal_store.revision(user_id)}:{range_label}:{target}:{today}"
+    cached = chart_cache.get(key)
+    metrics.increment('analytics_cache_total', result='miss' if cached is None else 'hit')
+    
+    if cached is None:
+        started = time.perf_counter()
+        days = analytics.RANGES.get(range_label)
+        start_day = (today - timedelta(days=days - 1)).isoformat() if days else None
+        cached = analytics.chart_json(meal_store.daily(user_id, start_day), target)
+        chart_cache.set(key, cached)
+        metrics.observe('analytics_build_seconds', time.perf_counter() - started)
+    
+    figures, summary = cached
+    summary_html = f"""
+        <div class="stats-grid">
+            <div class="stat-item"><h3>{summary['meals']}</h3><h4>Meals logged</h4></div>
+            <div class="stat-item"><h3>{summary['avg_calories']}</h3><h4>Avg kcal / day (target {summary['target']})</h4></div>
+            <div class="stat-item"><h3>{summary['adherence']}%</h3><h4>Days on target</h4></div>
+            <div class="stat-item"><h3>{summary['avg_satisfaction']}</h3><h4>Avg satisfaction</h4></div>
         </div>
-        """)
-        
-        with gr.Tabs(elem_classes="tab-nav"):
-            with gr.TabItem("Home"):
-                gr.HTML("""
-                <div class="hero-section">
-                    <div class="hero-content">
-                        <h1 class="hero-title">FITNESS JOURNEY,<br>AI-OPTIMIZED</h1>
-                        <p class="hero-subtitle">Achieve Weight Loss, Muscle Gain, Or A Healthier Lifestyle<br>Effortlessly With AI-Driven Personalized Training</p>
-                    </div>
-                </div>
-                """)
-                
-                gr.HTML("""
-                <div class="feature-grid">
-                    <div class="feature-card">
-                        <h3 class="feature-title">Personalized Workouts</h3>
-                        <p class="feature-description">AI-generated fitness plans tailored to your goals, fitness level, and available equipment</p>
-                    </div>
-                    <div class="feature-card">
-                        <h3 class="feature-title">Smart Nutrition</h3>
-                        <p class="feature-description">Get instant nutritional insights and meal recommendations powered by advanced AI analysis</p>
-                    </div>
-                    <div class="feature-card">
-                        <h3 class="feature-title">AI Assistant</h3>
-                        <p class="feature-description">Monitor your fitness journey with detailed analytics and personalized insights</p>
-                    </div>
-                </div>
-                """)
-                
-                gr.HTML("""
+        """
+    return summary_html, *[PlotData(type="plotly", plot=figure) for figure in figures]
+
+def render_home_stats(request: gr.Request = None):
+    user_profile = state_store.get(session_id_for(request))['profile']
+    meals = meal_store.count(user_profile['user_id']) if user_profile else 0
+    return minify_html(f"""
                 <div class="stats-grid">
                     <div class="stat-item">
                         <h4>Keto Diet</h4>
@@ -634,6 +1586,7 @@ def create_interface():
                         <h4>Workout Routine</h4>
                     </div>
                     <div class="stat-item">
+                        <h3>{meals}</h3>
                         <h4>Meals Analyzed</h4>
                     </div>
                     <div class="stat-item">
@@ -641,42 +1594,209 @@ def create_interface():
                     </div>
                 </div>
                 """)
+
+def api_session_id(token):
+    # API clients name their own session; kept apart from Gradio's session hashes
+    return f"api:{token}"
+
+def meal_data(meal_entry, source, analysis):
+    return {
+        'id': meal_entry.get('id'),
+        'logged_at': meal_entry['timestamp'],
+        'meal_type': meal_entry['meal_type'],
+        'description': meal_entry['description'],
+        'calories': meal_entry['calories'],
+        'satisfaction': meal_entry['satisfaction'],
+        'source': source,
+        'analysis': analysis,
+    }
+
+def analyze_meal_data(session_id, meal_type, meal_description, estimated_calories, satisfaction):
+    # analyze_meal for the JSON API: the logged meal and its analysis as data.
+    # Raises when the model is needed and fails; nothing is logged then.
+    user_profile = state_store.get(session_id)['profile']
+    trace = Trace('api_meal', session_id)
+    started = time.perf_counter()
+    with trace.phase('local_parse'):
+        local = nutrition.analyze_locally(meal_description, user_profile.get('goal'))
+    if local['items'] and not local['unresolved']:
+        metrics.increment('nutrition_parse_total', result='resolved')
+        result, path = MealAnalysis.from_local(local), 'local'
+    else:
+        metrics.increment('nutrition_parse_total', result='unresolved')
+        try:
+            if not gemini.get_model():
+                raise ModelUnavailable("AI service is currently unavailable")
+            with trace.phase('prompt_build'):
+                prompt = build_structured_meal_prompt(meal_type, meal_description, estimated_calories, user_profile)
+            result, path = generate_meal_analysis(prompt, trace), 'structured'
+        except Exception as e:
+            trace.finish('degraded' if is_unavailable(e) else 'error', e)
+            raise
+    
+    meal_entry = store_meal_analysis(meal_type, meal_description, estimated_calories, satisfaction, user_profile, result, trace)
+    metrics.observe('meal_analysis_seconds', time.perf_counter() - started, path=path)
+    trace.finish('local' if path == 'local' else 'ok')
+    return meal_data(meal_entry, 'local' if path == 'local' else 'llm', result.to_dict())
+
+def food_table_estimate(meal_description, user_profile):
+    # What the food table alone can tell about a meal, for replies while the model is down
+    result = nutrition.analyze_locally(meal_description, user_profile.get('goal'))
+    if not result['items']:
+        return None
+    return {**MealAnalysis.from_local(result).to_dict(), 'unresolved': result['unresolved']}
+
+def analyze_meal_batch_data(session_id, records):
+    user_profile = state_store.get(session_id)['profile']
+    meals = normalize_meals(records)
+    meal_entries, results = log_meal_batch(meals, user_profile)
+    return {
+        'logged': len(meal_entries),
+        'local': sum(1 for result in results if result['source'] == 'local'),
+        'failed': sum(1 for result in results if result['source'] == 'failed'),
+        'meals': [
+            {**meal_data(entry, result['source'], result.get('details')), 'error': result.get('error')}
+            for entry, result in zip(meal_entries, results)
+        ],
+    }
+
+def chat_reply(session_id, message):
+    # chat_with_ai for the JSON API: the reply text and where it came from
+    # (local, cache, model or degraded), recorded in the session's history.
+    state = state_store.get(session_id)
+    chat_history = state['chat_history']
+    trace = Trace('api_chat', session_id)
+    with trace.phase('local_parse'):
+        reply = local_reply(message, state['profile'])[1] if LOCAL_INTENTS else None
+    source = 'local'
+    if reply is None:
+        try:
+            if not gemini.get_model():
+                raise ModelUnavailable("AI service is currently unavailable")
+            reply = generate_chat_response(message, state['profile'], chat_history, trace)
+            source = 'cache' if trace.attributes.get('cache') == 'hit' else 'model'
+        except Exception as e:
+            if not is_unavailable(e):
+                trace.finish('error', e)
+                raise
+            reply, source = chat_error(e, message, state['profile'], chat_history, trace), 'degraded'
+    
+    with trace.phase('state_update'):
+        record_chat(session_id, chat_history, {"role": "user", "content": message}, {"role": "assistant", "content": reply})
+    trace.finish(source)
+    return {'reply': reply, 'source': source}
+
+def chat_reply_stream(session_id, message):
+    # Streaming chat_reply: ('delta', {'text'}) events as the model writes, then
+    # ('done', {'reply', 'source'}), or ('error', {'error'}) if the stream breaks.
+    # Local and cached answers arrive as a single delta.
+    state = state_store.get(session_id)
+    chat_history = state['chat_history']
+    trace = Trace('api_chat_stream', session_id)
+    with trace.phase('local_parse'):
+        reply = local_reply(message, state['profile'])[1] if LOCAL_INTENTS else None
+    source = 'local'
+    history = prompt_history(message, chat_history)
+    key = make_key(message, state['profile']) if not history else None
+    if reply is None and key:
+        with trace.phase('cache_lookup'):
+            reply = response_cache.get(key)
+        if reply is not None:
+            source = 'cache'
+            prefetch_used('question', key)
+    
+    if reply is None:
+        parts = []
+        try:
+            if not gemini.get_model():
+                raise ModelUnavailable("AI service is currently unavailable")
+            with trace.phase('prompt_build'):
+                contents = build_chat_contents(message, prompt_profile(state['profile'], key), history, HISTORY_TOKEN_BUDGET)
+            for chunk in stream_generate(contents, 'api_chat_stream', chat_task(message), trace):
+                parts.append(chunk)
+                yield 'delta', {'text': chunk}
+            reply, source = "".join(parts), 'model'
+            if key:
+                response_cache.set(key, reply)
+        except Exception as e:
+            # part of the answer is already out; a substitute reply would not fit on it
+            if parts or not is_unavailable(e):
+                trace.finish('error', e)
+                yield 'error', {'error': str(e)}
+                return
+            reply, source = chat_error(e, message, state['profile'], chat_history, trace), 'degraded'
+            yield 'delta', {'text': reply}
+    else:
+        yield 'delta', {'text': reply}
+    
+    with trace.phase('state_update'):
+        record_chat(session_id, chat_history, {"role": "user", "content": message}, {"role": "assistant", "content": reply})
+    trace.finish(source)
+    yield 'done', {'reply': reply, 'source': source}
+
+def create_interface(stylesheet_url=None):
+    if not BROWSER_SECRET:
+        print("WARNING: VITALMINA_BROWSER_SECRET is not set; meal logs will not follow users across server restarts")
+    if ASYNC_HANDLERS:
+        chat_handler, meal_handler = chat_with_ai_async, analyze_meal_async
+    elif STREAM_RESPONSES:
+        chat_handler, meal_handler = chat_with_ai_stream, analyze_meal_stream
+    else:
+        chat_handler, meal_handler = chat_with_ai, analyze_meal
+    
+    # With a stylesheet URL the CSS is a cached static file instead of part of every page config
+    with gr.Blocks(
+        css=None if stylesheet_url else minify_css(css),
+        head=f'<link rel="stylesheet" href="{stylesheet_url}">' if stylesheet_url else None,
+        theme=gr.themes.Soft()
+    ) as demo:
+        gr.HTML(minify_html(NAVBAR_HTML))
+        
+        with gr.Tabs(elem_classes="tab-nav"):
+            with gr.TabItem("Home") as home_tab:
+                gr.HTML(minify_html(HERO_HTML))
+                
+                gr.HTML(minify_html(FEATURES_HTML))
+                
+                home_stats = gr.HTML(render_home_stats())
             
             with gr.TabItem("Profile"):
                 with gr.Row():
                     with gr.Column():
                         name = gr.Textbox(label="Full Name", placeholder="Enter your name")
                         age = gr.Slider(label="Age", minimum=10, maximum=100, value=25)
-                        gender = gr.Dropdown(label="Gender", choices=["Male", "Female", "Other"])
+                        gender = gr.Dropdown(label="Gender", choices=GENDERS)
                         height = gr.Slider(label="Height (cm)", minimum=100, maximum=250, value=170)
                     
                     with gr.Column():
                         weight = gr.Slider(label="Weight (kg)", minimum=30, maximum=200, value=70)
                         goal = gr.Dropdown(
                             label="Fitness Goal", 
-                            choices=["Weight Loss", "Muscle Gain", "Maintenance", "Improve Fitness", "General Health"]
+                            choices=GOALS
                         )
                         activity_level = gr.Dropdown(
                             label="Activity Level", 
-                            choices=["Sedentary", "Lightly Active", "Moderately Active", "Very Active", "Extremely Active"]
+                            choices=ACTIVITY_LEVELS
                         )
                         dietary_preferences = gr.CheckboxGroup(
                             label="Dietary Preferences",
-                            choices=["Vegetarian", "Vegan", "Gluten-Free", "Dairy-Free", "Low-Carb", "Keto", "No Restrictions"]
+                            choices=DIETARY_PREFERENCES
                         )
                 
                 save_btn = gr.Button("Save Profile", variant="primary")
                 profile_output = gr.HTML()
+                browser_user_id = gr.BrowserState(None, storage_key="vitalmina_user_id", secret=BROWSER_SECRET)
                 save_btn.click(
                     save_profile,
-                    inputs=[name, age, gender, height, weight, goal, activity_level, dietary_preferences],
-                    outputs=[gr.Textbox(label="Status"), profile_output]
+                    inputs=[name, age, gender, height, weight, goal, activity_level, dietary_preferences, browser_user_id],
+                    outputs=[gr.Textbox(label="Status"), profile_output, browser_user_id],
+                    api_name="save_profile"
                 )
             
             with gr.TabItem("Meal Analysis"):
                 with gr.Row():
                     with gr.Column():
-                        meal_type = gr.Dropdown(label="Meal Type", choices=["Breakfast", "Lunch", "Dinner", "Snack"])
+                        meal_type = gr.Dropdown(label="Meal Type", choices=MEAL_TYPES)
                         meal_description = gr.Textbox(
                             label="Meal Description",
                             placeholder="e.g., Grilled chicken breast with quinoa and steamed vegetables, 1 apple",
@@ -686,15 +1806,96 @@ def create_interface():
                     with gr.Column():
                         estimated_calories = gr.Number(label="Estimated Calories", value=0)
                         satisfaction = gr.Slider(label="Satisfaction", minimum=1, maximum=5, value=3, step=1)
+                        ai_advice = gr.Checkbox(label="Detailed AI advice", value=False)
                 
                 analyze_btn = gr.Button("Analyze Meal", variant="primary")
+                meal_status = gr.Textbox(label="Status")
                 meal_output = gr.HTML()
-                analyze_btn.click(
-                    analyze_meal,
-                    inputs=[meal_type, meal_description, estimated_calories, satisfaction],
-                    outputs=[gr.Textbox(label="Status"), meal_output]
+                meal_inputs = [meal_type, meal_description, estimated_calories, satisfaction, ai_advice]
+                # With jobs the button only logs and queues; the waiting analyze_meal
+                # endpoint stays available to API clients through a hidden button.
+                wait_btn = gr.Button(visible=False) if MEAL_JOBS else analyze_btn
+                wait_btn.click(
+                    meal_handler,
+                    inputs=meal_inputs,
+                    outputs=[meal_status, meal_output],
+                    concurrency_limit=MEAL_CONCURRENCY,
+                    api_name="analyze_meal"
+                )
+                
+                if MEAL_JOBS:
+                    jobs_output = gr.HTML()
+                    jobs_timer = gr.Timer(JOB_POLL_SECONDS, active=False)
+                    with gr.Row():
+                        job_id = gr.Textbox(label="Job ID", scale=3)
+                        cancel_btn = gr.Button("Cancel Job", variant="secondary", size="sm")
+                        retry_btn = gr.Button("Retry Job", variant="secondary", size="sm")
+                    analyze_btn.click(
+                        submit_meal,
+                        inputs=meal_inputs,
+                        outputs=[meal_status, meal_output, jobs_output, jobs_timer],
+                        concurrency_limit=MEAL_CONCURRENCY,
+                        api_name="submit_meal"
+                    )
+                    jobs_timer.tick(
+                        render_meal_jobs,
+                        outputs=[jobs_output, jobs_timer],
+                        concurrency_limit=None,
+                        show_progress="hidden",
+                        api_name="meal_jobs"
+                    )
+                    cancel_btn.click(cancel_meal_job, inputs=[job_id], outputs=[meal_status, jobs_output, jobs_timer])
+                    retry_btn.click(retry_meal_job, inputs=[job_id], outputs=[meal_status, jobs_output, jobs_timer])
+                
+                with gr.Accordion("Batch Import", open=False):
+                    with gr.Row():
+                        batch_file = gr.File(label="Meals file (CSV or JSON)", file_types=[".csv", ".json"])
+                        batch_text = gr.Textbox(
+                            label="Or paste meals, one per line",
+                            placeholder="Breakfast: oatmeal with blueberries\nLunch: chicken salad wrap\nDinner: salmon with brown rice",
+                            lines=5
+                        )
+                    batch_btn = gr.Button("Analyze All", variant="secondary")
+                    batch_output = gr.HTML()
+                    batch_event = batch_btn.click(
+                        analyze_meal_batch,
+                        inputs=[batch_file, batch_text],
+                        outputs=[gr.Textbox(label="Status"), batch_output],
+                        concurrency_limit=MEAL_CONCURRENCY
+                    )
+                    if MEAL_JOBS:
+                        # failed meals are retried as jobs; start polling the list
+                        batch_event.then(render_meal_jobs, outputs=[jobs_output, jobs_timer], show_progress="hidden")
+            
+            with gr.TabItem("Fitness Plan"):
+                with gr.Row():
+                    equipment = gr.Dropdown(label="Equipment", choices=EQUIPMENT, value=EQUIPMENT[0])
+                    plan_btn = gr.Button("Generate Weekly Plan", variant="primary")
+                plan_output = gr.HTML()
+                plan_btn.click(
+                    generate_fitness_plan,
+                    inputs=[equipment],
+                    outputs=[gr.Textbox(label="Status"), plan_output],
+                    concurrency_limit=MEAL_CONCURRENCY,
+                    api_name="fitness_plan"
                 )
             
+            with gr.TabItem("Analytics") as analytics_tab:
+                with gr.Row():
+                    analytics_range = gr.Dropdown(label="Range", choices=list(analytics.RANGES), value="Last 30 days")
+                    refresh_btn = gr.Button("Refresh", variant="secondary")
+                analytics_summary = gr.HTML()
+                with gr.Row():
+                    calories_plot = gr.Plot(label="Calories")
+                    macros_plot = gr.Plot(label="Macros")
+                with gr.Row():
+                    adherence_plot = gr.Plot(label="Goal adherence")
+                    satisfaction_plot = gr.Plot(label="Satisfaction")
+                
+                analytics_outputs = [analytics_summary, calories_plot, macros_plot, adherence_plot, satisfaction_plot]
+                for event in (analytics_tab.select, refresh_btn.click, analytics_range.change):
+                    event(render_analytics, inputs=[analytics_range], outputs=analytics_outputs)
+            
             with gr.TabItem("AI Assistant"):
                 gr.Markdown("### Quick Questions")
                 with gr.Row():
@@ -712,7 +1913,6 @@ def create_interface():
                     q8_btn = gr.Button("How to break plateau", size="sm")
                     q9_btn = gr.Button("Keto meal ideas", size="sm")
                 
-                chat_state = gr.State([])
                 chat_display = gr.HTML(label="Chat History")
                 
                 with gr.Row():
@@ -725,53 +1925,255 @@ def create_interface():
                 
                 with gr.Row():
                     clear_btn = gr.Button("Clear Chat", variant="secondary")
+                    history_btn = gr.Button("Show Full History", variant="secondary")
                 
                 send_btn.click(
-                    chat_with_ai,
-                    inputs=[chat_input, chat_state],
-                    outputs=[chat_state, chat_display]
+                    chat_handler,
+                    inputs=[chat_input],
+                    outputs=[chat_display],
+                    concurrency_limit=CHAT_CONCURRENCY,
+                    concurrency_id="chat",
+                    api_name="chat_with_ai"
                 ).then(lambda: "", outputs=[chat_input])
                 
                 chat_input.submit(
-                    chat_with_ai,
-                    inputs=[chat_input, chat_state],
-                    outputs=[chat_state, chat_display]
+                    chat_handler,
+                    inputs=[chat_input],
+                    outputs=[chat_display],
+                    concurrency_limit=CHAT_CONCURRENCY,
+                    concurrency_id="chat"
                 ).then(lambda: "", outputs=[chat_input])
                 
                 clear_btn.click(
                     clear_chat,
-                    outputs=[chat_state, chat_display]
+                    outputs=[chat_display]
                 )
                 
-                quick_questions = [
-                    "What are the best exercises for weight loss?",
-                    "Explain keto diet basics for beginners",
-                    "Give me some healthy breakfast ideas",
-                    "Suggest a home workout routine without equipment",
-                    "What are good meal prep tips for the week?",
-                    "How do I calculate my daily calorie needs?",
-                    "Why is hydration important for fitness?",
-                    "How can I break through a fitness plateau?",
-                    "What are some good keto meal ideas?"
-                ]
+                history_btn.click(
+                    show_full_chat,
+                    outputs=[chat_display],
+                    api_name="chat_history"
+                )
                 
                 question_buttons = [q1_btn, q2_btn, q3_btn, q4_btn, q5_btn, q6_btn, q7_btn, q8_btn, q9_btn]
                 
-                for i, (btn, question) in enumerate(zip(question_buttons, quick_questions)):
+                for i, (btn, question) in enumerate(zip(question_buttons, QUICK_QUESTIONS)):
                     btn.click(
                         lambda q=question: q,
                         outputs=[chat_input]
                     ).then(
-                        chat_with_ai,
-                        inputs=[chat_input, chat_state],
-                        outputs=[chat_state, chat_display]
+                        chat_handler,
+                        inputs=[chat_input],
+                        outputs=[chat_display],
+                        concurrency_limit=CHAT_CONCURRENCY,
+                        concurrency_id="chat"
                     ).then(lambda: "", outputs=[chat_input])
         
         gr.Markdown("---")
         gr.Markdown("### Vitalmina AI - Powered by Google Gemini 2.5 Flash")
         
+        home_tab.select(render_home_stats, outputs=[home_stats])
+        demo.load(render_home_stats, outputs=[home_stats])
+    
+    demo.queue(max_size=QUEUE_MAX_SIZE)
     return demo
 
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+def collect_runtime_metrics():
+    for tier, stats in response_cache.stats().items():
+        for field, value in stats.items():
+            metrics.set_gauge(f'response_cache_{field}', value, tier=tier)
+    session_stats = state_store.stats()
+    metrics.set_gauge('sessions', session_stats['sessions'])
+    if 'spilled_sessions' in session_stats:
+        metrics.set_gauge('sessions_spilled', session_stats['spilled_sessions'])
+    metrics.set_gauge('plan_cache_entries', len(plan_cache))
+    for status, count in meal_jobs.stats().items():
+        metrics.set_gauge('meal_jobs', count, status=status)
+    for tier, status in gemini.status().items():
+        metrics.set_gauge('gemini_healthy', 1 if status['healthy'] else 0, model=tier)
+        if status['circuit'] is not None:
+            metrics.set_gauge('gemini_circuit_state', CIRCUIT_STATES[status['circuit']], model=tier)
+    for tier, client in gemini.tiers.items():
+        if client.flights is not None:
+            for kind, count in client.flights.in_flight().items():
+                metrics.set_gauge('singleflight_in_flight', count, model=tier, kind=kind)
+
+metrics.register_collector(collect_runtime_metrics)
+
+def create_api():
+    # Versioned JSON API for mobile and partner clients: the same handlers as the
+    # UI without HTML or the Gradio queue. POST /profile without X-Session-Id
+    # issues a random session ID; every other call must send one it was issued.
+    from typing import Literal
+    from fastapi import APIRouter, Header, HTTPException
+    from fastapi.responses import JSONResponse, StreamingResponse
+    from pydantic import BaseModel, Field
+    
+    class ProfileIn(BaseModel):
+        name: str = Field(min_length=1, max_length=100)
+        age: int = Field(ge=10, le=100)
+        gender: Literal[tuple(GENDERS)]
+        height: float = Field(ge=100, le=250)
+        weight: float = Field(ge=30, le=200)
+        goal: Literal[tuple(GOALS)]
+        activity_level: Literal[tuple(ACTIVITY_LEVELS)]
+        dietary_preferences: list[Literal[tuple(DIETARY_PREFERENCES)]] = []
+    
+    class MealIn(BaseModel):
+        meal_type: Literal[tuple(MEAL_TYPES)] = 'Snack'
+        description: str = Field(min_length=1, max_length=2000)
+        calories: float = Field(default=0, ge=0)
+        satisfaction: int = Field(default=3, ge=1, le=5)
+    
+    class BatchMealIn(MealIn):
+        timestamp: str | None = Field(default=None, description="ISO date or time, for backfilling history")
+    
+    class MealBatchIn(BaseModel):
+        meals: list[BatchMealIn] = Field(min_length=1, max_length=MAX_BATCH_MEALS)
+    
+    class ChatIn(BaseModel):
+        message: str = Field(min_length=1, max_length=4000)
+    
+    router = APIRouter(prefix=API_PREFIX)
+    
+    def session_for(token):
+        if not token:
+            raise HTTPException(status_code=400, detail="X-Session-Id header is required")
+        session_id = api_session_id(token)
+        if not state_store.exists(session_id):
+            # Only IDs handed out by POST /profile are accepted, so a client cannot
+            # pick one and land in a session it was not issued. exists() does not
+            # create a session, so rejected requests cannot push real ones out.
+            raise HTTPException(status_code=401, detail=f"Unknown session; POST {API_PREFIX}/profile without X-Session-Id for a new one")
+        return session_id
+    
+    def profile_for(session_id):
+        profile = state_store.get(session_id)['profile']
+        if not profile:
+            raise HTTPException(status_code=404, detail=f"No profile for this session; POST {API_PREFIX}/profile first")
+        return profile
+    
+    def unavailable(error, estimate=None):
+        return JSONResponse(
+            status_code=503,
+            content={'detail': str(error) or "AI service is busy", 'estimate': estimate},
+            headers={'Retry-After': '30'}
+        )
+    
+    @router.post("/profile")
+    def post_profile(body: ProfileIn, x_session_id: str | None = Header(default=None)):
+        if x_session_id:
+            session_for(x_session_id)
+        token = x_session_id or uuid.uuid4().hex
+        profile = store_profile(api_session_id(token), body.name.strip(), body.age, body.gender, body.height, body.weight,
+                                body.goal, body.activity_level, body.dietary_preferences)
+        return {'session_id': token, 'profile': profile}
+    
+    @router.get("/profile")
+    def get_profile(x_session_id: str | None = Header(default=None)):
+        return {'profile': profile_for(session_for(x_session_id))}
+    
+    @router.post("/meals")
+    def post_meal(body: MealIn, x_session_id: str | None = Header(default=None)):
+        session_id = session_for(x_session_id)
+        profile = profile_for(session_id)
+        try:
+            return analyze_meal_data(session_id, body.meal_type, body.description, body.calories, body.satisfaction)
+        except ValueError as e:
+            raise HTTPException(status_code=502, detail=f"Invalid analysis from the model: {e}")
+        except Exception as e:
+            if is_unavailable(e):
+                return unavailable(e, food_table_estimate(body.description, profile))
+            raise HTTPException(status_code=500, detail=f"Error analyzing meal: {e}")
+    
+    @router.post("/meals/batch")
+    def post_meal_batch(body: MealBatchIn, x_session_id: str | None = Header(default=None)):
+        session_id = session_for(x_session_id)
+        profile_for(session_id)
+        return analyze_meal_batch_data(session_id, [meal.model_dump() for meal in body.meals])
+    
+    @router.get("/meals")
+    def get_meals(limit: int = 20, x_session_id: str | None = Header(default=None)):
+        profile = profile_for(session_for(x_session_id))
+        return {'meals': meal_store.recent(profile['user_id'], limit=min(max(limit, 1), 100), with_analysis=True)}
+    
+    @router.post("/chat")
+    def post_chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
+        session_id = session_for(x_session_id)
+        try:
+            return chat_reply(session_id, body.message)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing your request: {e}")
+    
+    @router.post("/chat/stream")
+    def post_chat_stream(body: ChatIn, x_session_id: str | None = Header(default=None)):
+        # Server-sent events, one per delta; the generator runs in the threadpool
+        session_id = session_for(x_session_id)
+        events = (f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in chat_reply_stream(session_id, body.message))
+        return StreamingResponse(events, media_type="text/event-stream", headers={'Cache-Control': 'no-cache'})
+    
+    @router.get("/chat/history")
+    def get_chat_history(limit: int = 50, x_session_id: str | None = Header(default=None)):
+        chat_history = state_store.history(session_for(x_session_id), min(max(limit, 1), 200))
+        return {'messages': [{'role': chat['role'], 'content': chat['content']} for chat in chat_history]}
+    
+    return router
+
+def create_server(demo, assets=None):
+    # Gradio mounted on a FastAPI app, so the static assets, the JSON API and
+    # /metrics can sit next to the UI
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.middleware.gzip import GZipMiddleware
+    from fastapi.responses import FileResponse, PlainTextResponse
+    
+    def collect_queue_metrics():
+        queue = demo._queue
+        for concurrency_id, event_queue in queue.event_queue_per_concurrency_id.items():
+            metrics.set_gauge('gradio_queue_waiting', len(event_queue.queue), concurrency_id=concurrency_id)
+            metrics.set_gauge('gradio_queue_active', event_queue.current_concurrency, concurrency_id=concurrency_id)
+    
+    metrics.register_collector(collect_queue_metrics)
+    server = FastAPI()
+    # page, config and JS bundles; event streams are left uncompressed by the middleware
+    server.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+    
+    if assets is not None:
+        @server.get(STATIC_ROUTE + "/{name}")
+        def static_file(name: str, request: Request):
+            found = assets.lookup(name, request.headers.get('accept-encoding', ''))
+            if found is None:
+                raise HTTPException(status_code=404)
+            path, headers = found
+            return FileResponse(path, media_type=assets.media_type(name), headers=headers)
+    
+    if API_ENABLED:
+        server.include_router(create_api())
+    
+    if METRICS_ENDPOINT:
+        @server.get("/metrics", response_class=PlainTextResponse)
+        def metrics_endpoint():
+            return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+    
+    return gr.mount_gradio_app(server, demo, path="/")
+
 if __name__ == "__main__":
-    demo = create_interface()
-    demo.launch(share=True)
+    gemini.start_health_probe()
+    start_idle_eviction(state_store)
+    # pandas and the food table load off the startup path, before the first meal arrives
+    threading.Thread(target=nutrition.load_table, daemon=True).start()
+    
+    if os.getenv('VITALMINA_PREWARM', '0') == '1':
+        threading.Thread(target=prewarm_quick_questions, daemon=True).start()
+    
+    import uvicorn
+    assets, stylesheet_url = build_static_assets()
+    demo = create_interface(stylesheet_url)
+    uvicorn.run(
+        create_server(demo, assets),
+        host=os.getenv('GRADIO_SERVER_NAME', '127.0.0.1'),
+        port=int(os.getenv('GRADIO_SERVER_PORT', '7860')),
+        # API clients reuse their connection between requests
+        timeout_keep_alive=int(os.getenv('VITALMINA_KEEPALIVE', '30'))
+    )
@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import nutrition
+from meal_analysis import MealAnalysis
+from prompts import build_batch_prompt
+
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snack"]
+MAX_MEALS = 500
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def _number(value, default=0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _normalize(record):
+    description = str(record.get('description') or record.get('meal') or '').strip()
+    if not description:
+        return None
+    meal_type = str(record.get('meal_type') or record.get('type') or '').strip().title()
+    return {
+        'meal_type': meal_type if meal_type in MEAL_TYPES else 'Snack',
+        'description': description,
+        'calories': _number(record.get('calories')),
+        'satisfaction': int(min(5, max(1, _number(record.get('satisfaction'), 3)))),
+        'logged_at': _parse_time(record.get('timestamp') or record.get('date')),
+    }
+
+
+def _parse_lines(text):
+    # "Breakfast: oatmeal with berries" or just "oatmeal with berries", one meal per line
+    records = []
+    for line in text.splitlines():
+        line = line.strip(' -*\t')
+        if not line:
+            continue
+        meal_type, _, rest = line.partition(':')
+        if rest and meal_type.strip().title() in MEAL_TYPES:
+            records.append({'meal_type': meal_type, 'description': rest})
+        else:
+            records.append({'description': line})
+    return records
+
+
+def parse_meals(text=None, path=None):
+    if path:
+        with open(path, encoding='utf-8') as handle:
+            text = handle.read()
+        extension = os.path.splitext(path)[1].lower()
+    else:
+        extension = ''
+    text = (text or '').strip()
+    if not text:
+        return []
+
+    if extension == '.json' or text[0] in '[{':
+        data = json.loads(text)
+        records = data.get('meals', []) if isinstance(data, dict) else data
+    elif extension == '.csv' or 'description' in text.splitlines()[0].lower():
+        records = list(csv.DictReader(io.StringIO(text)))
+    else:
+        records = _parse_lines(text)
+
+    return normalize_meals(records)
+
+
+def normalize_meals(records):
+    # Records with a description, with missing or odd fields defaulted, at most MAX_MEALS
+    meals = [meal for meal in map(_normalize, records) if meal]
+    return meals[:MAX_MEALS]
+
+
+def _analyze_group(group, profile, generate):
+    try:
+        results = json.loads(generate(build_batch_prompt([meal for _, meal in group], profile)))
+    except Exception as e:
+        return {position: {'source': 'failed', 'error': str(e)} for position, _ in group}
+
+    by_index = {}
+    for item in results if isinstance(results, list) else []:
+        if isinstance(item, dict) and isinstance(item.get('index'), int):
+            by_index[item['index']] = item
+
+    analyzed = {}
+    for offset, (position, _) in enumerate(group, start=1):
+        item = by_index.get(offset)
+        if item is None:
+            analyzed[position] = {'source': 'failed', 'error': 'missing from model response'}
+            continue
+        try:
+            analyzed[position] = _result('llm', MealAnalysis.from_dict(item))
+        except ValueError as e:
+            analyzed[position] = {'source': 'failed', 'error': str(e)}
+    return analyzed
+
+
+def _result(source, analysis):
+    return {
+        'source': source,
+        'analysis': analysis.to_text(),
+        'calories': analysis.calories,
+        'columns': analysis.columns(),
+        'details': analysis.to_dict(),
+    }
+
+
+def analyze_batch(meals, profile, generate, group_size=5, max_workers=4):
+    # Meals the food table fully resolves are answered locally; the rest are sent
+    # group_size at a time, one structured prompt per group, with bounded fan-out.
+    results = [None] * len(meals)
+    pending = []
+    for position, meal in enumerate(meals):
+        local = nutrition.analyze_locally(meal['description'], profile.get('goal'))
+        if local['items'] and not local['unresolved']:
+            results[position] = _result('local', MealAnalysis.from_local(local))
+        else:
+            pending.append((position, meal))
+
+    groups = [pending[start:start + group_size] for start in range(0, len(pending), group_size)]
+    if groups:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as pool:
+            for analyzed in pool.map(lambda group: _analyze_group(group, profile, generate), groups):
+                for position, result in analyzed.items():
+                    results[position] = result
+    return results
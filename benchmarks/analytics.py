@@ -0,0 +1,74 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import analytics
+from meal_store import MealStore
+
+TARGET = 2200
+
+
+def build_log(store, user_id, days, meals_per_day):
+    now = datetime.now()
+    entries = []
+    for day in range(days):
+        for meal in range(meals_per_day):
+            entries.append({
+                'logged_at': now - timedelta(days=day, hours=meal * 5),
+                'meal_type': 'Lunch',
+                'description': 'sample meal',
+                'calories': random.randint(300, 1000),
+                'satisfaction': random.randint(1, 5),
+                'protein_g': random.uniform(10, 50),
+                'carbs_g': random.uniform(20, 120),
+                'fat_g': random.uniform(5, 40),
+                'health_score': random.randint(3, 9),
+            })
+    store.add_many(user_id, entries)
+
+
+def rebuild_from_log(store, user_id):
+    # What the charts would cost without rollups: load every meal and group it.
+    meals = pd.DataFrame(store.recent(user_id, limit=10 ** 9))
+    meals['day'] = pd.to_datetime(meals['ts'], unit='s').dt.strftime('%Y-%m-%d')
+    daily = meals.groupby('day').agg(
+        meals=('id', 'count'), calories=('calories', 'sum'), protein=('protein_g', 'sum'),
+        carbs=('carbs_g', 'sum'), fat=('fat_g', 'sum'), avg_satisfaction=('satisfaction', 'mean'),
+        avg_health_score=('health_score', 'mean')
+    ).reset_index().rename(columns={'day': 'period'})
+    return analytics.chart_json(daily.to_dict('records'), TARGET, max_points=len(daily))
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics chart build time against meal history length")
+    parser.add_argument("--meals-per-day", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'days':>6} {'meals':>7} {'full rebuild ms':>16} {'rollups ms':>11} {'add meal ms':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for days in (30, 365, 1000, 3000):
+            store = MealStore(os.path.join(directory, f"meals-{days}.sqlite"))
+            build_log(store, 'bench', days, args.meals_per_day)
+            full = timed(lambda: rebuild_from_log(store, 'bench'), args.repeat)
+            rollups = timed(lambda: analytics.chart_json(store.daily('bench'), TARGET), args.repeat)
+            add = timed(lambda: store.add('bench', {'description': 'snack', 'calories': 200, 'satisfaction': 3}), 20)
+            print(f"{days:>6} {store.count('bench'):>7} {full:>16.1f} {rollups:>11.1f} {add:>12.2f}")
+    print("\nrollups: daily totals maintained on insert, downsampled to "
+          f"{analytics.MAX_POINTS} points; cached figure JSON is served without rebuilding")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import metrics
+from benchmarks.loadtest import HTTPDriver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_SCRIPT = """
+import uvicorn
+import app
+app.nutrition.load_table()
+uvicorn.run(app.create_server(app.create_interface()), host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+PROFILE = ["Api Tester", 34, "Female", 168, 64, "Weight Loss", "Moderately Active", ["No Restrictions"]]
+# Resolved by the food table, so the server does no model work for them
+MEALS = ["1 apple, 2 boiled eggs", "1 banana and a glass of milk", "2 slices of toast with peanut butter"]
+QUESTIONS = ["Give me some healthy breakfast ideas", "What are good meal prep tips for the week?", "What are my macros?"]
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    # Counts response bytes as they come off the wire, before any gzip decoding
+
+    def __init__(self, connections):
+        self.inner = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=connections * 2))
+        self.received = 0
+
+    async def handle_async_request(self, request):
+        response = await self.inner.handle_async_request(request)
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=CountingStream(self, response.stream), extensions=response.extensions)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class CountingStream(httpx.AsyncByteStream):
+    def __init__(self, transport, stream):
+        self.transport = transport
+        self.stream = stream
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.transport.received += len(chunk)
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+class GradioDriver(HTTPDriver):
+    # The UI's event API: the queue join plus the session's event stream per call
+
+    def __init__(self, url, connections):
+        self.url = url.rstrip('/')
+        self.transport = CountingTransport(connections)
+        self.client = httpx.AsyncClient(timeout=None, transport=self.transport)
+        self.fn_index = {}
+
+    async def profile(self, session, data):
+        await self.call(session, 'save_profile', data + [None])
+
+    async def meal(self, session, description):
+        await self.call(session, 'analyze_meal', ["Lunch", description, 0, 3, False])
+
+    async def chat(self, session, message):
+        await self.call(session, 'chat_with_ai', [message])
+
+
+class APIDriver:
+    def __init__(self, url, connections):
+        self.url = url.rstrip('/') + "/api/v1"
+        self.transport = CountingTransport(connections)
+        self.client = httpx.AsyncClient(timeout=None, transport=self.transport)
+        # The server issues session IDs; the benchmark's names map onto them
+        self.tokens = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def post(self, session, path, body):
+        headers = {'X-Session-Id': self.tokens[session]} if session in self.tokens else {}
+        response = await self.client.post(f"{self.url}{path}", json=body, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def profile(self, session, data):
+        fields = ['name', 'age', 'gender', 'height', 'weight', 'goal', 'activity_level', 'dietary_preferences']
+        self.tokens[session] = (await self.post(session, "/profile", dict(zip(fields, data))))['session_id']
+
+    async def meal(self, session, description):
+        await self.post(session, "/meals", {'meal_type': "Lunch", 'description': description})
+
+    async def chat(self, session, message):
+        await self.post(session, "/chat", {'message': message})
+
+
+def server_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def drive(driver, users, turns, concurrency, prefix):
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def timed(call):
+        started = time.perf_counter()
+        await call
+        latencies.append(time.perf_counter() - started)
+
+    async def user(number):
+        async with slots:
+            session = f"{prefix}-{number}"
+            await timed(driver.profile(session, [f"{PROFILE[0]} {number}"] + PROFILE[1:]))
+            for turn in range(turns):
+                await timed(driver.meal(session, MEALS[(number + turn) % len(MEALS)]))
+                await timed(driver.chat(session, QUESTIONS[(number + turn) % len(QUESTIONS)]))
+
+    async with driver:
+        driver.transport.received = 0
+        started = time.perf_counter()
+        await asyncio.gather(*(user(number) for number in range(users)))
+        return latencies, time.perf_counter() - started, driver.transport.received
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile, meal and chat calls through the Gradio event API vs. the JSON API")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=3, help="meal + chat pairs per user")
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vitalmina-api-")
+    port = free_port()
+    env = {**os.environ, 'VITALMINA_FAKE_MODEL': "latency=0", 'VITALMINA_METRICS': "1",
+           'VITALMINA_MEAL_DB': os.path.join(workdir, "meals.sqlite"),
+           'VITALMINA_CHAT_ARCHIVE': os.path.join(workdir, "chat.sqlite")}
+    env.pop('VITALMINA_STATE_DB', None)
+    server = subprocess.Popen([sys.executable, "-W", "ignore", "-c", SERVER_SCRIPT.format(port=port)], cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(300):
+            try:
+                httpx.get(f"{url}/config", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+
+        requests = args.users * (1 + 2 * args.turns)
+        print(f"{args.users} users x (profile + {args.turns} meals + {args.turns} chats) = {requests} requests, "
+              f"{args.concurrency} concurrent, food-table meals and cached or local chat answers")
+        print(f"  {'path':<8} {'req/s':>7} {'server CPU ms/req':>18} {'KB/response':>12} {'p50 ms':>7} {'p95 ms':>7}")
+        for label, make_driver in (('gradio', GradioDriver), ('api', APIDriver)):
+            driver = make_driver(url, args.concurrency)
+            cpu = server_cpu_seconds(server.pid)
+            latencies, elapsed, received = asyncio.run(drive(driver, args.users, args.turns, args.concurrency, label))
+            cpu = server_cpu_seconds(server.pid) - cpu
+            print(f"  {label:<8} {len(latencies) / elapsed:>7.1f} {cpu / len(latencies) * 1000:>18.2f} "
+                  f"{received / len(latencies) / 1024:>12.2f} {metrics.percentile(latencies, 50) * 1000:>7.1f} "
+                  f"{metrics.percentile(latencies, 95) * 1000:>7.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import html
+import time
+
+from rendering import StreamingHTML, render_chat_history, render_streaming_reply
+
+SAMPLE_ANSWER = (
+    "Aim for 1.6-2.2 g of protein per kg of body weight & spread it across 3-4 meals.\n"
+    "Good sources: eggs, Greek yogurt, lentils, chicken breast <grilled>, tofu.\n"
+) * 6
+
+
+def naive_render(chat_history, limit=10):
+    formatted_history = ""
+    for chat in chat_history[-limit:]:
+        content = html.escape(chat["content"], quote=False).replace(chr(10), "<br>")
+        if chat["role"] == "user":
+            formatted_history += f'<div class="chat-message user-message"><strong>You:</strong> {content}</div>'
+        else:
+            formatted_history += f'<div class="chat-message bot-message"><strong></strong> {content}</div>'
+    return formatted_history
+
+
+def build_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Question {i}: how much protein do I need?"})
+        history.append({"role": "assistant", "content": SAMPLE_ANSWER})
+    return history
+
+
+def time_per_call(fn, history, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(history)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def streamed_bytes(chunks, incremental):
+    previous_html = render_chat_history(build_history(4), limit=9)
+    reply = StreamingHTML()
+    sent, last = 0, ""
+    for chunk in chunks:
+        reply.append(chunk)
+        if incremental:
+            current = render_streaming_reply(previous_html, reply)
+        else:
+            current = previous_html + naive_render([{"role": "assistant", "content": reply.text}])
+        sent += len(current) - len(last) if current.startswith(last) else len(current)
+        last = current
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat render cost against conversation length")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'naive us/turn':>14} {'cached us/turn':>15}")
+    for turns in (5, 50, 200, 1000):
+        history = build_history(turns)
+        render_chat_history(history)
+        naive = time_per_call(naive_render, history, args.repeat)
+        cached = time_per_call(render_chat_history, history, args.repeat)
+        print(f"{turns:>6} {naive:>14.1f} {cached:>15.1f}")
+
+    chunks = [word + " " for word in SAMPLE_ANSWER.split(" ")]
+    full = streamed_bytes(chunks, incremental=False)
+    incremental = streamed_bytes(chunks, incremental=True)
+    print(f"\nstreamed answer of {len(chunks)} chunks: {full / 1024:.1f} KiB re-sent in full, "
+          f"{incremental / 1024:.1f} KiB as append-only updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import app
+from fake_gemini import FakeGenerativeModel
+from single_flight import SingleFlight
+
+
+async def burst(clicks, stagger):
+    # Many users pressing the same quick-question button within a short window.
+    async def one(i):
+        await asyncio.sleep(i * stagger)
+        async for _ in app.chat_with_ai_async(app.QUICK_QUESTIONS[0], SimpleNamespace(session_hash=f"burst-{i}")):
+            pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(clicks)))
+    return time.perf_counter() - started
+
+
+def run(model, clicks, stagger, coalesce):
+    for client in app.gemini.tiers.values():
+        client.flights = SingleFlight(name='gemini') if coalesce else None
+    app.response_cache.clear()
+    model.calls = 0
+    seconds = asyncio.run(burst(clicks, stagger))
+    return model.calls, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstream calls for a burst of identical quick questions")
+    parser.add_argument("--clicks", type=int, default=200)
+    parser.add_argument("--window", type=float, default=0.5, help="seconds over which the clicks arrive")
+    parser.add_argument("--latency", type=float, default=1.0, help="simulated model latency in seconds")
+    args = parser.parse_args()
+
+    model = FakeGenerativeModel(latency=args.latency)
+    app.gemini.set_model(model)
+    stagger = args.window / args.clicks
+
+    print(f"{args.clicks} identical questions over {args.window:.1f}s, {args.latency:.1f}s model latency")
+    for coalesce in (False, True):
+        calls, seconds = run(model, args.clicks, stagger, coalesce)
+        label = 'single-flight' if coalesce else 'no coalescing'
+        print(f"  {label:<14} upstream calls {calls:>4}   wall {seconds:5.2f}s")
+
+
+if __name__ == "__main__":
+    main()
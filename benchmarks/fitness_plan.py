@@ -0,0 +1,95 @@
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import app
+import metrics
+from fake_gemini import FakeGenerativeModel
+from fitness_plan import EQUIPMENT, build_week, profile_bucket
+
+# Rough shares of goals, activity levels and equipment among users
+GOALS = {"Weight Loss": 40, "General Health": 20, "Muscle Gain": 20, "Improve Fitness": 15, "Maintenance": 5}
+ACTIVITY = {"Sedentary": 30, "Lightly Active": 30, "Moderately Active": 25, "Very Active": 10, "Extremely Active": 5}
+EQUIPMENT_SHARES = [60, 25, 15]
+
+
+def pick(rng, shares):
+    return rng.choices(list(shares), weights=list(shares.values()))[0]
+
+
+def random_profile(rng, number):
+    height = rng.gauss(170, 9)
+    weight = rng.gauss(78, 15)
+    return [f"Plan User {number}", int(min(80, max(18, rng.gauss(38, 12)))), rng.choice(["Male", "Female"]),
+            height, weight, pick(rng, GOALS), pick(rng, ACTIVITY), []]
+
+
+def per_user(model, users, equipment):
+    # What a plan per request would cost: every day generated, one after another, nothing shared
+    def generate(prompt):
+        return model.generate_content(prompt, generation_config=app.PLAN_JSON_CONFIG).text
+
+    latencies = []
+    for profile, choice in zip(users, equipment):
+        started = time.perf_counter()
+        build_week(profile_bucket(profile, choice), generate, max_workers=1)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bucketed(users, equipment, concurrency):
+    def one(item):
+        number, choice = item
+        started = time.perf_counter()
+        app.generate_fitness_plan(choice, SimpleNamespace(session_hash=f"plan-{number}"))
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, enumerate(equipment)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fitness plan latency and model calls, per user vs. bucketed cache")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated model latency in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = [random_profile(rng, number) for number in range(args.users)]
+    equipment = [rng.choices(EQUIPMENT, weights=EQUIPMENT_SHARES)[0] for _ in rows]
+    users = []
+    for number, row in enumerate(rows):
+        app.save_profile(*row, SimpleNamespace(session_hash=f"plan-{number}"))
+        users.append(app.state_store.get(f"plan-{number}")['profile'])
+
+    model = FakeGenerativeModel(latency=args.latency)
+    app.gemini.set_model(model)
+    # measure the cache and fan-out, not the quota pacing in front of the model
+    for client in app.gemini.tiers.values():
+        client.guard.limiter = None
+    buckets = len({app.bucket_key(profile_bucket(profile, choice)) for profile, choice in zip(users, equipment)})
+    print(f"{args.users} users in {buckets} buckets, model latency {args.latency:g}s")
+    print(f"  {'setup':<34} {'model calls':>12} {'p50 s':>7} {'p95 s':>7} {'hit rate':>9}")
+
+    sample = min(20, args.users)
+    latencies = per_user(model, users[:sample], equipment[:sample])
+    calls = model.calls * args.users / sample
+    print(f"  {'per user, sequential days':<34} {calls:>12.0f} {metrics.percentile(latencies, 50):>7.2f} "
+          f"{metrics.percentile(latencies, 95):>7.2f} {'-':>9}   (extrapolated from {sample} users)")
+
+    model.calls = 0
+    app.plan_cache.clear()
+    metrics.reset()
+    latencies = bucketed(users, equipment, args.concurrency)
+    counts = metrics.summary()
+    hits = counts.get('plan_cache_total{result="hit"}', 0)
+    print(f"  {'bucket cache, parallel days':<34} {model.calls:>12} {metrics.percentile(latencies, 50):>7.2f} "
+          f"{metrics.percentile(latencies, 95):>7.2f} {hits / args.users:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only load when the feature needing them runs.
+DEFERRED = ['pandas', 'plotly', 'google.generativeai']
+
+# Seconds allowed for `import app` on a cold interpreter; gradio alone is most of it.
+DEFAULT_BUDGET = float(os.getenv('VITALMINA_IMPORT_BUDGET', '5.0'))
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def profile_import(module):
+    # Same report as `python -X importtime -c "import app"`, parsed into
+    # (module, self seconds, cumulative seconds, depth) rows.
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            rows.append((name, int(own) / 1e6, int(cumulative) / 1e6, len(indent) // 2))
+    return rows
+
+
+def direct_imports(rows, module):
+    # importtime lists children before their parent, so the depth-1 rows since
+    # the previous top-level row are the ones the module imported itself.
+    children = []
+    for row in rows:
+        if row[3] == 0:
+            if row[0] == module:
+                return children
+            children = []
+        elif row[3] == 1:
+            children.append(row)
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of app.py with a startup budget")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="seconds allowed for the import")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest direct imports to list")
+    args = parser.parse_args()
+
+    runs = [profile_import(args.module) for _ in range(args.runs)]
+    totals = sorted(next(cumulative for name, _, cumulative, depth in rows if depth == 0 and name == args.module)
+                    for rows in runs)
+    fastest = min(runs, key=lambda rows: rows[-1][2])
+
+    print(f"import {args.module}: min {totals[0]:.3f}s  median {totals[len(totals) // 2]:.3f}s  (budget {args.budget:.1f}s)")
+    print(f"\n{'direct import':<32} {'cumulative s':>12}")
+    direct = sorted(direct_imports(fastest, args.module), key=lambda row: row[2], reverse=True)
+    for name, _, cumulative, _ in direct[:args.top]:
+        print(f"{name:<32} {cumulative:>12.3f}")
+
+    loaded = {name for name, _, _, _ in fastest}
+    eager = [module for module in DEFERRED if module in loaded]
+    print(f"\ndeferred modules loaded at import: {', '.join(eager) if eager else 'none'}")
+
+    failures = []
+    if totals[len(totals) // 2] > args.budget:
+        failures.append(f"median import time {totals[len(totals) // 2]:.3f}s is over the {args.budget:.1f}s budget")
+    if eager:
+        failures.append(f"{', '.join(eager)} imported eagerly")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import time
+from types import SimpleNamespace
+
+import app
+import intents
+import metrics
+from fake_gemini import FakeGenerativeModel
+
+PROFILE = ["Intent Tester", 34, "Female", 168, 64, "Weight Loss", "Moderately Active", ["No Restrictions"]]
+
+# A chat mix: the quick-question buttons plus typed questions, some computable
+QUESTIONS = app.QUICK_QUESTIONS + [
+    "How many calories should I eat to lose weight?",
+    "What is my BMR?",
+    "What are my macros?",
+    "How much protein do I need?",
+    "What's my BMI?",
+    "How much water should I drink a day?",
+    "How many calories in an avocado?",
+    "Is it fine to train while sore?",
+    "What should I eat before a morning run?",
+    "Give me some low calorie snack ideas",
+]
+
+# Mention a metric without asking for it to be computed, or ask about a food,
+# an activity or a moment; these must reach the model
+NOT_COMPUTABLE = [
+    "Is BMI a good measure for athletes?",
+    "Does BMI apply to kids?",
+    "What foods help me keep a healthy weight?",
+    "My daily calories seem too high, should I eat less sugar?",
+    "My BMI is 32, which exercises are safe for my knees?",
+    "I want to lower my BMI, what diet should I follow?",
+    "How many calories should I eat before a workout?",
+    "How much protein should I eat after training?",
+    "How much water is in a cucumber?",
+    "Is my water intake affecting my sleep?",
+    "How much water should I drink during a marathon?",
+]
+
+
+def run(rounds):
+    # Each round is a new user with the same profile; the response cache is
+    # shared between them, as it is between real users.
+    latencies = []
+    app.response_cache.clear()
+    for step in range(rounds):
+        request = SimpleNamespace(session_hash=f"intents-{step}")
+        app.save_profile(*PROFILE, request)
+        for question in QUESTIONS + NOT_COMPUTABLE:
+            started = time.perf_counter()
+            app.chat_with_ai(question, request)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat latency and model calls with and without the local intent router")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.4, help="simulated model latency in seconds")
+    args = parser.parse_args()
+
+    model = FakeGenerativeModel(latency=args.latency)
+    app.gemini.set_model(model)
+    computable = sum(1 for question in QUESTIONS if intents.classify(question))
+    print(f"{len(QUESTIONS)} questions x {args.rounds} rounds, {computable} computable, model latency {args.latency:g}s")
+    misrouted = [question for question in NOT_COMPUTABLE if intents.classify(question)]
+    print(f"{len(NOT_COMPUTABLE) - len(misrouted)}/{len(NOT_COMPUTABLE)} non-computable questions left to the model"
+          + "".join(f"\n  answered locally: {question}" for question in misrouted))
+
+    app.save_profile(*PROFILE, SimpleNamespace(session_hash="intents-timing"))
+    profile = app.state_store.get("intents-timing")['profile']
+    started = time.perf_counter()
+    for _ in range(10000):
+        intents.answer(intents.classify("How do I calculate my daily calorie needs?"), profile)
+    print(f"classify + answer: {(time.perf_counter() - started) / 10000 * 1e6:.1f} us per question")
+
+    print(f"  {'setup':<20} {'model calls':>12} {'p50 s':>7} {'p95 s':>7}")
+    for label, enabled in (('all to the model', False), ('local intents', True)):
+        app.LOCAL_INTENTS = enabled
+        model.calls = 0
+        metrics.reset()
+        latencies = run(args.rounds)
+        print(f"  {label:<20} {model.calls:>12} {metrics.percentile(latencies, 50):>7.3f} {metrics.percentile(latencies, 95):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
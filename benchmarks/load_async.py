@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import app
+from fake_gemini import FakeGenerativeModel
+
+QUESTION = "How many grams of protein should I eat after a workout?"
+
+
+def run_sync(requests, threads):
+    def one(i):
+        app.chat_with_ai(f"{QUESTION} #{i}", SimpleNamespace(session_hash=f"sync-{i}"))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(requests)))
+    return time.perf_counter() - started
+
+
+async def run_async(requests):
+    async def one(i):
+        async for _ in app.chat_with_ai_async(f"{QUESTION} #{i}", SimpleNamespace(session_hash=f"async-{i}")):
+            pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync and async chat handlers against a fake model")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated model latency in seconds")
+    parser.add_argument("--threads", type=int, default=40,
+                        help="worker threads for the sync handler (Gradio's default thread pool size)")
+    args = parser.parse_args()
+
+    app.gemini.set_model(FakeGenerativeModel(latency=args.latency))
+    # measure the handlers, not the quota pacing in front of the model
+    for client in app.gemini.tiers.values():
+        client.guard.limiter = None
+    app.response_cache.clear()
+
+    sync_seconds = run_sync(args.requests, args.threads)
+    app.response_cache.clear()
+    async_seconds = asyncio.run(run_async(args.requests))
+
+    print(f"{args.requests} chat requests, {args.latency:.2f}s simulated model latency")
+    print(f"  sync  ({args.threads} threads): {sync_seconds:6.2f}s  {args.requests / sync_seconds:8.1f} req/s")
+    print(f"  async (max in-flight {app.gemini.max_inflight}): {async_seconds:6.2f}s  {args.requests / async_seconds:8.1f} req/s")
+    print(f"  speedup: {sync_seconds / async_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from types import SimpleNamespace
+
+import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Latency differences smaller than this (seconds) never count as regressions
+MIN_LATENCY_CHANGE = 0.05
+
+PROFILE = ["Load Tester", 34, "Female", 168, 64, "Weight Loss", "Moderately Active", ["No Restrictions"]]
+
+# Not in data/foods.csv, so every meal goes to the model rather than the local path
+MEALS = [
+    ("Lunch", "mystery stew with dumplings"),
+    ("Dinner", "homemade lasagna and garlic bread"),
+    ("Breakfast", "acai bowl with granola"),
+    ("Snack", "protein bar and a latte"),
+]
+
+QUESTIONS = [
+    "How should I adjust my meals on rest days?",
+    "What should I eat before a morning run?",
+    "Is it fine to train while sore?",
+]
+
+
+class Session:
+    # One simulated user: saves a profile, then alternates meals and chat.
+
+    def __init__(self, number, rounds, quick_share):
+        self.number = number
+        self.rounds = rounds
+        self.quick_share = quick_share
+
+    def steps(self, quick_questions):
+        name = f"{PROFILE[0]} {self.number}"
+        # the trailing None is the user id the browser has stored: none on a first visit
+        yield 'save_profile', [name] + PROFILE[1:] + [None]
+        for step in range(self.rounds):
+            meal_type, description = MEALS[(self.number + step) % len(MEALS)]
+            yield 'analyze_meal', [meal_type, f"{description} #{self.number}-{step}", 0, 3, False]
+            # a share of chat turns are quick-question buttons, which the response cache answers
+            if (self.number * self.rounds + step) % 100 < self.quick_share * 100:
+                message = quick_questions[(self.number + step) % len(quick_questions)]
+            else:
+                message = f"{QUESTIONS[step % len(QUESTIONS)]} ({self.number}-{step})"
+            yield 'chat_with_ai', [message]
+
+
+class DirectDriver:
+    # Calls the same handlers create_interface() wires up, bypassing Gradio.
+
+    def __init__(self, app):
+        self.app = app
+        if app.ASYNC_HANDLERS:
+            self.handlers = {'analyze_meal': app.analyze_meal_async, 'chat_with_ai': app.chat_with_ai_async}
+        else:
+            self.handlers = {'analyze_meal': app.analyze_meal, 'chat_with_ai': app.chat_with_ai}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def call(self, session_hash, endpoint, data):
+        request = SimpleNamespace(session_hash=session_hash)
+        if endpoint == 'save_profile':
+            *profile, user_id = data
+            return await asyncio.to_thread(self.app.save_profile, *profile, request, user_id)
+        handler = self.handlers[endpoint]
+        if self.app.ASYNC_HANDLERS:
+            output = None
+            async for output in handler(*data, request):
+                pass
+            return output
+        return await asyncio.to_thread(handler, *data, request)
+
+
+class HTTPDriver:
+    # Speaks Gradio's queue protocol, like the browser client: join the queue,
+    # then read the session's server-sent events until the event completes.
+
+    def __init__(self, url, connections):
+        import httpx
+        self.url = url.rstrip('/')
+        self.client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=connections * 2))
+        self.fn_index = {}
+
+    async def __aenter__(self):
+        config = (await self.client.get(f"{self.url}/config")).json()
+        self.fn_index = {dep['api_name']: dep['id'] for dep in config['dependencies'] if dep.get('api_name')}
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def call(self, session_hash, endpoint, data):
+        joined = await self.client.post(f"{self.url}/gradio_api/queue/join", json={
+            'data': data, 'fn_index': self.fn_index[endpoint], 'session_hash': session_hash,
+            'event_data': None, 'trigger_id': None,
+        })
+        joined.raise_for_status()
+        event_id = joined.json()['event_id']
+        async with self.client.stream('GET', f"{self.url}/gradio_api/queue/data",
+                                      params={'session_hash': session_hash}) as events:
+            async for line in events.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                message = json.loads(line[5:])
+                if message.get('event_id') not in (None, event_id):
+                    continue
+                if message['msg'] == 'process_completed':
+                    if not message.get('success'):
+                        raise RuntimeError(f"{endpoint} failed: {message.get('output')}")
+                    return message['output'].get('data')
+                if message['msg'] == 'unexpected_error':
+                    raise RuntimeError(message.get('message'))
+        raise RuntimeError(f"{endpoint}: event stream closed before completion")
+
+
+async def drive(make_driver, sessions, concurrency, rounds, quick_share, quick_questions, prefix):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def user(driver, number):
+        async with slots:
+            session_hash = f"{prefix}-{number}"
+            for endpoint, data in Session(number, rounds, quick_share).steps(quick_questions):
+                started = time.perf_counter()
+                try:
+                    await driver.call(session_hash, endpoint, data)
+                except Exception as e:
+                    errors[endpoint] += 1
+                    if errors[endpoint] == 1:
+                        print(f"  {endpoint} error: {e}", file=sys.stderr)
+                    continue
+                latencies[endpoint].append(time.perf_counter() - started)
+
+    async with make_driver() as driver:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(driver, number) for number in range(sessions)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def memory_per_session(make_driver, sessions, concurrency, rounds, quick_share, quick_questions, prefix):
+    # Memory still held after the sessions finished (profiles, chat history,
+    # Gradio session state), divided by the number of sessions.
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    asyncio.run(drive(make_driver, sessions, concurrency, rounds, quick_share, quick_questions, prefix))
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return max(0, after - before) / sessions / 1024
+
+
+def report(latencies, errors, elapsed, memory_kb):
+    result = {'endpoints': {}, 'throughput': 0.0, 'memory_per_session_kb': round(memory_kb, 1)}
+    completed = 0
+    for endpoint, values in sorted(latencies.items()):
+        completed += len(values)
+        result['endpoints'][endpoint] = {
+            'count': len(values),
+            'errors': errors.get(endpoint, 0),
+            'p50': round(metrics.percentile(values, 50), 4),
+            'p95': round(metrics.percentile(values, 95), 4),
+            'p99': round(metrics.percentile(values, 99), 4),
+        }
+    result['throughput'] = round(completed / elapsed, 2) if elapsed else 0.0
+    return result
+
+
+def print_result(mode, result):
+    print(f"\n{mode}: {result['throughput']:.1f} req/s, {result['memory_per_session_kb']:.1f} KiB retained per session")
+    print(f"  {'endpoint':<14} {'count':>6} {'errors':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}")
+    for endpoint, row in result['endpoints'].items():
+        print(f"  {endpoint:<14} {row['count']:>6} {row['errors']:>6} {row['p50']:>8.3f} {row['p95']:>8.3f} {row['p99']:>8.3f}")
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for mode, result in results.items():
+        previous = baseline.get('results', {}).get(mode)
+        if not previous:
+            continue
+        checks = [('throughput', previous['throughput'], result['throughput'], False),
+                  ('memory_per_session_kb', previous['memory_per_session_kb'], result['memory_per_session_kb'], True)]
+        for endpoint, row in result['endpoints'].items():
+            for field in ('p50', 'p95', 'p99'):
+                old = previous['endpoints'].get(endpoint, {}).get(field)
+                # millisecond-scale timings are mostly scheduler noise
+                if old is not None and abs(row[field] - old) >= MIN_LATENCY_CHANGE:
+                    checks.append((f"{endpoint} {field}", old, row[field], True))
+        for label, old, new, lower_is_better in checks:
+            if not old:
+                continue
+            change = (new - old) / old
+            if (change if lower_is_better else -change) > tolerance:
+                found.append(f"{mode} {label}: {old} -> {new} ({change:+.0%})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test save_profile, analyze_meal and chat_with_ai against a fake model")
+    parser.add_argument("--mode", choices=["direct", "http", "both"], default="both")
+    parser.add_argument("--sessions", type=int, default=100, help="simulated users")
+    parser.add_argument("--concurrency", type=int, default=25, help="users active at the same time")
+    parser.add_argument("--rounds", type=int, default=3, help="meal + chat pairs per user")
+    parser.add_argument("--quick-share", type=float, default=0.3, help="share of chat turns that are quick questions")
+    parser.add_argument("--memory-sessions", type=int, default=50, help="sessions in the memory pass (0 skips it)")
+    parser.add_argument("--fake", default="latency=0.4,latency_sigma=0.5,tokens_per_second=150,error_rate=0.01",
+                        help="fake model spec (see fake_gemini.from_spec)")
+    parser.add_argument("--live", action="store_true", help="use the real Gemini API (needs GEMINI_API_KEY)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    # keep the benchmark's meals and sessions out of the real databases
+    workdir = tempfile.mkdtemp(prefix="vitalmina-load-")
+    os.environ['VITALMINA_MEAL_DB'] = os.path.join(workdir, "meals.sqlite")
+    os.environ.pop('VITALMINA_STATE_DB', None)
+    os.environ.pop('VITALMINA_CACHE_DB', None)
+    if not args.live:
+        os.environ['VITALMINA_FAKE_MODEL'] = args.fake
+    import app
+    # what __main__ does in a background thread; loading it here keeps it out of the timings
+    app.nutrition.load_table()
+
+    modes = ['direct', 'http'] if args.mode == 'both' else [args.mode]
+    workload = (args.sessions, args.concurrency, args.rounds, args.quick_share, app.QUICK_QUESTIONS)
+    print(f"{args.sessions} sessions x ({args.rounds} meals + {args.rounds} chats), {args.concurrency} concurrent, "
+          f"model: {'live Gemini' if args.live else 'fake ' + args.fake}")
+
+    results = {}
+    for mode in modes:
+        if mode == 'direct':
+            make_driver = lambda: DirectDriver(app)
+        else:
+            demo = app.create_interface()
+            demo.launch(prevent_thread_lock=True, quiet=True, server_name="127.0.0.1")
+            make_driver = lambda: HTTPDriver(demo.local_url, args.concurrency)
+        app.response_cache.clear()
+        metrics.reset()
+        latencies, errors, elapsed = asyncio.run(drive(make_driver, *workload, prefix=f"{mode}-load"))
+        memory_kb = 0.0
+        if args.memory_sessions:
+            memory_kb = memory_per_session(make_driver, args.memory_sessions, *workload[1:], prefix=f"{mode}-memory")
+        results[mode] = report(latencies, errors, elapsed, memory_kb)
+        print_result(mode, results[mode])
+        if mode == 'http':
+            demo.close()
+
+    config = {key: getattr(args, key) for key in ('sessions', 'concurrency', 'rounds', 'quick_share', 'fake', 'live')}
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': config, 'python': platform.python_version(), 'results': results}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline yet; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print(f"\nBaseline was recorded with {baseline.get('config')}; comparison may not be meaningful")
+    found = regressions(results, baseline, args.tolerance)
+    if found:
+        print(f"\nRegressions beyond {args.tolerance:.0%} of the baseline:")
+        for line in found:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nWithin {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ['VITALMINA_MEAL_DB'] = os.path.join(tempfile.mkdtemp(prefix="vitalmina-jobs-"), "meals.sqlite")
+
+import app
+import metrics
+from fake_gemini import FakeGenerativeModel
+
+PROFILE = ["Job Tester", 34, "Female", 168, 64, "Weight Loss", "Moderately Active", ["No Restrictions"]]
+
+
+def log_meals(handler, meals, request):
+    # Time the user spends at the button, meal after meal
+    waits = []
+    for number in range(meals):
+        started = time.perf_counter()
+        handler("Lunch", f"mystery stew with dumplings #{number}", 0, 3, False, request)
+        waits.append(time.perf_counter() - started)
+    return waits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging several meals in a row, waiting on each analysis vs. background jobs")
+    parser.add_argument("--meals", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=1.0, help="simulated model latency in seconds")
+    args = parser.parse_args()
+
+    app.gemini.set_model(FakeGenerativeModel(latency=args.latency))
+    print(f"{args.meals} meals in a row, model latency {args.latency:g}s")
+    print(f"  {'mode':<18} {'per click p50 s':>16} {'all logged s':>13} {'all analyzed s':>15}")
+
+    for label, handler in (('wait per meal', app.analyze_meal), ('background jobs', app.submit_meal)):
+        request = SimpleNamespace(session_hash=f"jobs-{label}")
+        app.save_profile(*PROFILE, request)
+        metrics.reset()
+        started = time.perf_counter()
+        waits = log_meals(handler, args.meals, request)
+        logged = time.perf_counter() - started
+        while any(job.status in app.ACTIVE_JOBS for job in app.meal_jobs.for_session(request.session_hash, limit=args.meals)):
+            time.sleep(0.01)
+        analyzed = time.perf_counter() - started
+        print(f"  {label:<18} {metrics.percentile(waits, 50):>16.3f} {logged:>13.2f} {analyzed:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
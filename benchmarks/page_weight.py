@@ -0,0 +1,90 @@
+import argparse
+import gzip
+import re
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+import app
+from static_assets import minify_css, minify_html
+
+# Lighthouse's "Fast 3G" profile
+MOBILE_BANDWIDTH = 1.6e6 / 8  # bytes per second
+MOBILE_RTT = 0.150
+
+
+def serve(application, port):
+    server = uvicorn.Server(uvicorn.Config(application, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def critical_path(client, url):
+    # The document plus the same-origin stylesheets and scripts it links, which
+    # the browser needs before Gradio can paint anything.
+    page = client.get(url)
+    resources = [('document', page)]
+    links = re.findall(r'(?:href|src)="((?:\./|/)[^"]+\.(?:css|js)(?:\?[^"]*)?)"', page.text)
+    # the custom stylesheet is linked from the head Gradio builds out of its config
+    links += sorted(set(re.findall(r'/static/[\w.-]+\.css', page.text)))
+    for link in links:
+        resources.append((link, client.get(httpx.URL(url).join(link))))
+    return resources
+
+
+def cacheable(response):
+    return 'max-age' in response.headers.get('cache-control', '') and 'no-cache' not in response.headers['cache-control']
+
+
+def measure(url, repeat):
+    with httpx.Client(headers={'Accept-Encoding': 'gzip'}) as client:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            resources = critical_path(client, url)
+        local = (time.perf_counter() - started) / repeat
+    first = sum(response.num_bytes_downloaded for _, response in resources)
+    repeat_visit = sum(response.num_bytes_downloaded for _, response in resources if not cacheable(response))
+    # one round trip for the document, one for its subresources fetched in parallel
+    paint = 2 * MOBILE_RTT + first / MOBILE_BANDWIDTH
+    return first, repeat_visit, local, paint, resources
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Page-load bytes and estimated first paint, inline CSS vs static assets")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--verbose", action="store_true", help="list every resource on the critical path")
+    args = parser.parse_args()
+
+    html = app.NAVBAR_HTML + app.HERO_HTML + app.FEATURES_HTML + app.render_home_stats()
+    print("Static text          raw   minified   gzip")
+    for label, raw, small in (('custom CSS', app.css, minify_css(app.css)), ('home HTML', html, minify_html(html))):
+        print(f"  {label:<14} {len(raw):>7} {len(small):>10} {len(gzip.compress(small.encode())):>6}")
+
+    app.os.environ.setdefault('VITALMINA_STATIC_DIR', tempfile.mkdtemp(prefix="vitalmina-static-"))
+    inline = app.create_interface()
+    inline.launch(prevent_thread_lock=True, quiet=True, server_name="127.0.0.1", server_port=7881)
+    assets, stylesheet_url = app.build_static_assets()
+    serve(app.create_server(app.create_interface(stylesheet_url), assets), 7882)
+
+    print(f"\nCritical path (document + linked CSS/JS), mean of {args.repeat} loads")
+    print(f"  {'setup':<34} {'first visit':>12} {'repeat visit':>13} {'local ms':>9} {'Fast 3G paint s':>16}")
+    for label, url in (('demo.launch, inline CSS', "http://127.0.0.1:7881/"),
+                       ('create_server, static CSS + gzip', "http://127.0.0.1:7882/")):
+        first, repeat_visit, local, paint, resources = measure(url, args.repeat)
+        print(f"  {label:<34} {first:>12,} {repeat_visit:>13,} {local * 1000:>9.1f} {paint:>16.2f}")
+        if args.verbose:
+            for name, response in resources:
+                print(f"      {response.num_bytes_downloaded:>9,} {response.headers.get('content-encoding', '-'):<5} "
+                      f"{response.headers.get('cache-control', '-'):<40} {name}")
+    print(f"\nFast 3G estimate: {MOBILE_RTT * 1000:.0f} ms RTT, {MOBILE_BANDWIDTH * 8 / 1e6:.1f} Mbit/s, "
+          "two round trips plus transfer time; no browser parse or render time")
+    inline.close()
+
+
+if __name__ == "__main__":
+    main()
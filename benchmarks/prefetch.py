@@ -0,0 +1,80 @@
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import app
+import metrics
+from fake_gemini import FakeGenerativeModel
+
+GOALS = {"Weight Loss": 40, "General Health": 20, "Muscle Gain": 20, "Improve Fitness": 15, "Maintenance": 5}
+ACTIVITY = ["Sedentary", "Lightly Active", "Moderately Active", "Very Active"]
+
+
+def user_plan(rng, number, predicted_share):
+    goal = rng.choices(list(GOALS), weights=list(GOALS.values()))[0]
+    diet = ["Keto"] if rng.random() < 0.1 else []
+    profile = [f"Prefetch User {number}", rng.randint(20, 65), rng.choice(["Male", "Female"]), 170, 75,
+               goal, rng.choice(ACTIVITY), diet]
+    # most users click one of the questions predicted for their goal, the rest anything
+    if rng.random() < predicted_share:
+        indices = (app.KETO_QUESTIONS if diet else []) + app.GOAL_QUESTIONS[goal]
+        question = app.QUICK_QUESTIONS[rng.choice(indices[:2])]
+    else:
+        question = rng.choice(app.QUICK_QUESTIONS)
+    return profile, question
+
+
+def run(users, think, concurrency):
+    def one(item):
+        number, (profile, question) = item
+        request = SimpleNamespace(session_hash=f"prefetch-{number}")
+        app.save_profile(*profile, request)
+        time.sleep(think)
+        started = time.perf_counter()
+        app.chat_with_ai(question, request)
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, enumerate(users)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="First quick-question latency after saving a profile, with and without prefetch")
+    parser.add_argument("--users", type=int, default=150)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--think", type=float, default=8.0, help="seconds between saving the profile and the first click")
+    parser.add_argument("--predicted-share", type=float, default=0.7, help="share of users clicking a predicted question")
+    parser.add_argument("--latency", type=float, default=1.0, help="simulated model latency in seconds")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    users = [user_plan(rng, number, args.predicted_share) for number in range(args.users)]
+    model = FakeGenerativeModel(latency=args.latency)
+    app.gemini.set_model(model)
+    print(f"{args.users} users, {args.think:g}s think time, model latency {args.latency:g}s")
+    print(f"  {'setup':<10} {'model calls':>12} {'clicks on model':>16} {'click mean s':>13} {'prefetched':>11} {'used':>6}")
+
+    for label, enabled in (('off', False), ('prefetch', True)):
+        app.PREFETCH = enabled
+        app.response_cache.clear()
+        app.plan_cache.clear()
+        app.prefetch_spent.clear()
+        app.prefetched_keys.clear()
+        model.calls = 0
+        metrics.reset()
+        latencies = run(users, args.think, args.concurrency)
+        while app.prefetch_jobs.stats()['queued'] or app.prefetch_jobs.stats()['running']:
+            time.sleep(0.05)
+        counts = metrics.summary()
+        issued = sum(value for name, value in counts.items() if name.startswith('prefetch_total') and 'result="issued"' in name)
+        used = sum(value for name, value in counts.items() if name.startswith('prefetch_used_total'))
+        # a click answered from the cache takes milliseconds; one that waits on the model takes ~latency
+        waited = sum(1 for seconds in latencies if seconds > args.latency / 2)
+        print(f"  {label:<10} {model.calls:>12} {waited:>16} {sum(latencies) / len(latencies):>13.3f} "
+              f"{issued:>11} {used:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+
+from cache import shared_profile
+from prompts import (
+    SYSTEM_INSTRUCTION, build_chat_contents, build_meal_prompt, build_structured_meal_prompt, contents_tokens, estimate_tokens
+)
+
+PROFILE = {
+    'name': 'Alex Morgan', 'age': 34, 'gender': 'Female', 'height': 168, 'weight': 72,
+    'goal': 'Weight Loss', 'activity_level': 'Moderately Active',
+    'dietary_preferences': ['Vegetarian', 'Gluten-Free'], 'bmi': 25.5,
+}
+
+LEGACY_CHAT = """
+        You are Vitalmina, a professional health and fitness assistant using the latest AI technology.
+        
+        User Profile: {profile}
+        
+        User's Question: {message}
+        
+        Please provide:
+        - Accurate, evidence-based information
+        - Practical, actionable advice
+        - Personalized recommendations when possible
+        - Clear explanations
+        - Warnings about consulting professionals for medical advice
+        
+        Focus on these areas:
+        Fitness & Exercise
+        Nutrition & Diet
+        Keto & Special Diets
+        Health & Wellness
+        Workout Routines
+        Meal Planning
+        Weight Management
+        Supplement Guidance
+        
+        Keep responses concise but informative and professional.
+        """
+
+LEGACY_MEAL = """
+    Analyze this meal for nutritional content and provide health insights:
+    Meal: {meal}
+    Meal Type: {meal_type}
+    Estimated Calories: {calories}
+    
+    User Profile: {profile}
+    
+    Please provide:
+    1. Nutritional breakdown (proteins, carbs, fats)
+    2. Health score (1-10)
+    3. 2 positive aspects
+    4. 1 suggestion for improvement
+    5. Fit it into the user's goal: {goal}
+    
+    Format the response clearly and concisely.
+    """
+
+ANSWER = "Try brisk walking, cycling and two full-body strength sessions a week. " * 8
+
+
+def conversation(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Follow-up question number {i} about my training week?"})
+        history.append({"role": "assistant", "content": ANSWER})
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimated input tokens per request, before and after the prompt builder")
+    parser.add_argument("--budget", type=int, default=800, help="history token budget")
+    args = parser.parse_args()
+
+    message = "How many rest days should I take?"
+    legacy_chat = estimate_tokens(LEGACY_CHAT.format(profile=PROFILE, message=message))
+    legacy_meal = estimate_tokens(LEGACY_MEAL.format(
+        meal="Oatmeal with berries and almond butter", meal_type="Breakfast", calories=420,
+        profile=PROFILE, goal=PROFILE['goal']))
+    system = estimate_tokens(SYSTEM_INSTRUCTION)
+    meal = system + estimate_tokens(build_meal_prompt("Breakfast", "Oatmeal with berries and almond butter", 420, PROFILE))
+    structured = system + estimate_tokens(build_structured_meal_prompt("Breakfast", "Oatmeal with berries and almond butter", 420, PROFILE))
+
+    print(f"'after' includes the {system}-token system instruction, which is billed with every request")
+    print(f"{'request':<32} {'before':>8} {'after':>8}")
+    print(f"{'analyze_meal':<32} {legacy_meal:>8} {meal:>8}")
+    print(f"{'analyze_meal, JSON output':<32} {legacy_meal:>8} {structured:>8}")
+    quick = system + contents_tokens(build_chat_contents(message, shared_profile(PROFILE), (), args.budget))
+    print(f"{'chat_with_ai, cacheable question':<32} {legacy_chat:>8} {quick:>8}")
+    for turns in (0, 2, 10, 50):
+        after = system + contents_tokens(build_chat_contents(message, PROFILE, conversation(turns), args.budget))
+        label = f"chat_with_ai, {turns} prior turns"
+        print(f"{label:<32} {legacy_chat:>8} {after:>8}")
+    print("\nbefore: no earlier turns were sent at all; after: history is included up to the budget, "
+          "older turns folded into a running summary; a cacheable question sends only the goal, activity and diet it is keyed on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+from fake_gemini import FakeGenerativeModel
+from gemini_client import GeminiClient
+from resilience import CircuitBreaker, Guard, RateLimiter
+
+
+def client_for(model, guard):
+    client = GeminiClient(coalesce=False, guard=guard)
+    client.set_model(model)
+    return client
+
+
+async def drive(client, workers, duration):
+    # Each worker sends distinct questions back to back until the deadline.
+    successes = []
+    failures = Counter()
+    deadline = time.monotonic() + duration
+
+    async def worker(number):
+        sent = 0
+        while time.monotonic() < deadline:
+            sent += 1
+            try:
+                await client.generate_async(f"question {number}-{sent}")
+                successes.append(time.monotonic())
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker(number) for number in range(workers)))
+    per_second = Counter(int(moment - started) for moment in successes)
+    series = [per_second.get(second, 0) for second in range(int(duration))]
+    return len(successes), failures, series
+
+
+def quota_scenario(args):
+    ceiling = args.quota / args.period
+    print(f"Quota: {args.quota} requests per {args.period:.0f}s (ceiling {ceiling:.1f}/s), "
+          f"{args.workers} workers for {args.duration:.0f}s")
+    print(f"  {'client':<26} {'ok/s':>6} {'of ceiling':>10} {'429s':>6} {'stdev ok/s':>10}  other failures")
+    setups = [
+        ('no protection', lambda: None),
+        ('retry + backoff', lambda: Guard(retries=3, base_delay=0.1, max_delay=2.0)),
+        ('token bucket + retry', lambda: Guard(
+            RateLimiter(args.quota, 10 ** 9, period=args.period, max_wait=args.duration),
+            CircuitBreaker(), retries=3, base_delay=0.1, max_delay=2.0)),
+    ]
+    for label, make_guard in setups:
+        model = FakeGenerativeModel(latency=args.latency, quota=args.quota, quota_period=args.period)
+        ok, failures, series = asyncio.run(drive(client_for(model, make_guard()), args.workers, args.duration))
+        # skip the first window, where every client can spend the full quota at once
+        steady = series[int(args.period):] or series
+        rate = sum(steady) / len(steady)
+        other = {name: count for name, count in failures.items() if name != 'FakeAPIError'}
+        print(f"  {label:<26} {rate:>6.1f} {rate / ceiling:>9.0%} {model.rejected:>6} "
+              f"{statistics.pstdev(steady):>10.1f}  {other or ''}")
+
+
+def outage_scenario(args):
+    print(f"\nOutage: every call fails with 503, {args.requests} sequential requests")
+    print(f"  {'client':<26} {'upstream calls':>14} {'mean latency':>13}")
+    for label, breaker in (('retry only', None), ('retry + circuit breaker', CircuitBreaker(5, reset_timeout=60))):
+        model = FakeGenerativeModel(latency=args.latency, error_rate=1.0, error_code=503)
+        client = client_for(model, Guard(breaker=breaker, retries=3, base_delay=0.1, max_delay=2.0))
+
+        async def run():
+            started = time.monotonic()
+            for i in range(args.requests):
+                try:
+                    await client.generate_async(f"outage {i}")
+                except Exception:
+                    pass
+            return (time.monotonic() - started) / args.requests
+
+        mean = asyncio.run(run())
+        print(f"  {label:<26} {model.calls:>14} {mean * 1000:>11.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate limiting, retries and circuit breaking against a faulty fake model")
+    parser.add_argument("--quota", type=int, default=120, help="requests the fake model accepts per period")
+    parser.add_argument("--period", type=float, default=6.0, help="quota window in seconds (60 in production)")
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=18.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=30, help="requests in the outage scenario")
+    args = parser.parse_args()
+
+    quota_scenario(args)
+    outage_scenario(args)
+
+
+if __name__ == "__main__":
+    main()
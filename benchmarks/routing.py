@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import time
+
+import metrics
+from fake_gemini import FakeGenerativeModel
+from gemini_client import GeminiClient
+from router import ModelRouter
+
+
+def router_for(latencies, deadline):
+    tiers = {}
+    for name, latency in latencies.items():
+        tiers[name] = GeminiClient(model_name=name, coalesce=False)
+        tiers[name].set_model(FakeGenerativeModel(latency=latency))
+    return ModelRouter(tiers, {'chat': deadline})
+
+
+async def drive(router, requests, concurrency):
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            started = time.perf_counter()
+            await router.generate_async(f"question {i}", task='chat')
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return metrics.percentile(latencies, 50), metrics.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat latency with and without lite/flash routing")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--lite-latency", type=float, default=0.3)
+    parser.add_argument("--flash-latency", type=float, default=1.0)
+    parser.add_argument("--deadline", type=float, default=1.5, help="seconds before a chat call falls through")
+    args = parser.parse_args()
+
+    setups = [
+        ('flash only', {'flash': args.flash_latency}),
+        ('routed', {'lite': args.lite_latency, 'flash': args.flash_latency}),
+        ('routed, lite stalled', {'lite': args.deadline * 10, 'flash': args.flash_latency}),
+    ]
+    print(f"{args.requests} chat requests, {args.concurrency} at a time, deadline {args.deadline:g}s")
+    print(f"  {'setup':<22} {'p50 s':>7} {'p95 s':>7} {'fallbacks':>10}  first tier now")
+    for label, latencies in setups:
+        metrics.reset()
+        router = router_for(latencies, args.deadline)
+        p50, p95 = asyncio.run(drive(router, args.requests, args.concurrency))
+        fallbacks = sum(value for name, value in metrics.summary().items() if name.startswith('model_fallback_total'))
+        print(f"  {label:<22} {p50:>7.2f} {p95:>7.2f} {fallbacks:>10}  {router.plan('chat', 'question')[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter per store so RSS is not shared between them
+GROW_SCRIPT = """
+import copy, json, os, random, re, resource, tempfile
+from rendering import message_fragment
+from state_store import ChatArchive, MemoryStateStore
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class ListStore:
+    # The previous in-memory layout: a list of message dicts per session, trimmed at max_items
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.sessions = {{}}
+
+    def append(self, session_id, field, *items):
+        values = self.sessions.setdefault(session_id, [])
+        values.extend(copy.deepcopy(items))
+        del values[:max(0, len(values) - self.max_items)]
+
+rng = random.Random(5)
+words = re.findall(r"[a-z]+", open('README.md').read().lower())
+def text(chars):
+    out, length = [], 0
+    while length < chars:
+        out.append(rng.choice(words))
+        length += len(out[-1]) + 1
+    return " ".join(out)
+
+if {compact}:
+    store = MemoryStateStore(max_items={max_items}, window={window},
+                             archive=ChatArchive(os.path.join(tempfile.mkdtemp(), "archive.sqlite"), max_items={max_items}))
+else:
+    store = ListStore({max_items})
+
+start = rss_kb()
+results = []
+turns = 0
+for checkpoint in {checkpoints}:
+    while turns < checkpoint // 2:
+        for number in range({sessions}):
+            question = {{"role": "user", "content": text(rng.randint(40, 160))}}
+            answer = {{"role": "assistant", "content": text(rng.randint(600, 1800))}}
+            message_fragment(question)
+            message_fragment(answer)
+            store.append(f"session-{{number}}", "chat_history", question, answer)
+        turns += 1
+    results.append([checkpoint, (rss_kb() - start) / {sessions}])
+print(json.dumps(results))
+"""
+
+
+def grow(compact, args):
+    script = GROW_SCRIPT.format(compact=compact, sessions=args.sessions, max_items=args.max_items,
+                                window=args.window, checkpoints=args.checkpoints)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server RSS per session as chat sessions age, list of dicts vs. compact window with spill")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--max-items", type=int, default=200)
+    parser.add_argument("--window", type=int, default=40)
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=[20, 100, 200, 400],
+                        help="messages per session at which RSS is sampled")
+    args = parser.parse_args()
+
+    before = grow(False, args)
+    after = grow(True, args)
+    print(f"{args.sessions} sessions, max {args.max_items} messages, in-memory window {args.window}")
+    print(f"  {'messages':>9} {'list of dicts KB/session':>25} {'compact KB/session':>19}")
+    for (messages, old), (_, new) in zip(before, after):
+        print(f"  {messages:>9} {old:>25.1f} {new:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASE_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+demo = app.create_interface()
+built = time.perf_counter()
+if {use_fake}:
+    from fake_gemini import FakeGenerativeModel
+    app.gemini.set_model(FakeGenerativeModel(latency={latency}))
+html = app.chat_with_ai("How much water should I drink per day?")
+answered = time.perf_counter()
+print(json.dumps({{
+    'import_seconds': imported - started,
+    'create_interface_seconds': built - imported,
+    'first_request_seconds': answered - built,
+    'total_seconds': answered - started,
+}}))
+"""
+
+
+def run_once(use_fake, latency):
+    script = PHASE_SCRIPT.format(use_fake=use_fake, latency=latency)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Break down Vitalmina cold-start time")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--fake-latency", type=float, default=0.5,
+                        help="simulated model latency when GEMINI_API_KEY is not set")
+    args = parser.parse_args()
+
+    use_fake = not os.getenv('GEMINI_API_KEY')
+    results = [run_once(use_fake, args.fake_latency) for _ in range(args.runs)]
+
+    print(f"Startup benchmark ({'fake model' if use_fake else 'live Gemini'}, {args.runs} runs)")
+    for phase in ('import_seconds', 'create_interface_seconds', 'first_request_seconds', 'total_seconds'):
+        values = sorted(result[phase] for result in results)
+        print(f"  {phase:<26} min {values[0]:.3f}s  median {values[len(values) // 2]:.3f}s  max {values[-1]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+ACTIVITY_BUCKETS = {
+    'Sedentary': 'low',
+    'Lightly Active': 'low',
+    'Moderately Active': 'moderate',
+    'Very Active': 'high',
+    'Extremely Active': 'high',
+}
+
+
+def normalize_prompt(prompt):
+    return re.sub(r'\s+', ' ', prompt.strip().lower()).rstrip('?!. ')
+
+
+def shared_profile(profile):
+    # The only profile fields a cached answer may depend on: make_key() hashes
+    # them and the prompt for a cacheable question carries nothing else, so a
+    # cached answer fits everyone with the same key and reveals nothing personal.
+    if not profile:
+        return None
+    return {
+        'goal': profile.get('goal') or '',
+        'dietary_preferences': sorted(profile.get('dietary_preferences') or []),
+        'activity_level': ACTIVITY_BUCKETS.get(profile.get('activity_level'), 'unknown'),
+    }
+
+
+def profile_fingerprint(profile):
+    if not profile:
+        return 'anonymous'
+    return hashlib.sha1(json.dumps(shared_profile(profile), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def make_key(prompt, profile=None, namespace='chat'):
+    return f"{namespace}:{profile_fingerprint(profile)}:{normalize_prompt(prompt)}"
+
+
+class LRUCache:
+    def __init__(self, maxsize=512, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                # kept until overwritten or evicted so peek() can serve it while the model is down
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            return item[0] if item is not None else None
+
+    def __contains__(self, key):
+        # a fresh entry exists; unlike get() this leaves the hit/miss counts alone
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and item[1] >= time.monotonic()
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item is not None else None
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class DiskCache:
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[1] < time.time():
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT expires FROM responses WHERE key = ?", (key,)).fetchone()
+            return row is not None and row[0] >= time.time()
+
+    def peek(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, expires)
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM responses WHERE expires < ?", (time.time(),)).rowcount
+            self._conn.commit()
+        self.expirations += deleted
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+        }
+
+
+class ResponseCache:
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        value = self.disk.get(key)
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def __contains__(self, key):
+        return key in self.memory or (self.disk is not None and key in self.disk)
+
+    def get_stale(self, key):
+        # Ignores expiry: an old answer beats no answer while the model is unavailable.
+        value = self.memory.peek(key)
+        if value is None and self.disk is not None:
+            value = self.disk.peek(key)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        stats = {'memory': self.memory.stats()}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
@@ -0,0 +1,79 @@
+ACTIVITY_FACTORS = {
+    'Sedentary': 1.2,
+    'Lightly Active': 1.375,
+    'Moderately Active': 1.55,
+    'Very Active': 1.725,
+    'Extremely Active': 1.9,
+}
+
+GOAL_ADJUSTMENTS = {
+    'Weight Loss': -500,
+    'Muscle Gain': 300,
+}
+
+
+def bmr(weight, height, age, gender=None):
+    # Mifflin-St Jeor; 'Other' or unknown gender uses the midpoint of the two offsets
+    base = 10 * weight + 6.25 * height - 5 * age
+    offset = {'Male': 5, 'Female': -161}.get(gender, -78)
+    return base + offset
+
+
+def tdee(profile):
+    factor = ACTIVITY_FACTORS.get(profile.get('activity_level'), 1.375)
+    return bmr(profile['weight'], profile['height'], profile['age'], profile.get('gender')) * factor
+
+
+def calorie_target(profile):
+    return round(tdee(profile) + GOAL_ADJUSTMENTS.get(profile.get('goal'), 0))
+
+# WHO adult categories: (upper bound, label); the last has no upper bound
+BMI_CATEGORIES = [(18.5, 'underweight'), (25, 'healthy weight'), (30, 'overweight'), (None, 'obese')]
+
+# Grams of protein per kg of body weight
+PROTEIN_PER_KG = {
+    'Weight Loss': 1.8,
+    'Muscle Gain': 2.0,
+}
+
+# Share of calories from fat, and grams of carbs kept on restricted diets
+FAT_SHARE = 0.25
+CARB_LIMITS = {'Keto': 25, 'Low-Carb': 100}
+
+# Extra water on top of the 35 ml/kg baseline, for sweat lost to activity
+ACTIVITY_WATER_ML = {
+    'Sedentary': 0,
+    'Lightly Active': 250,
+    'Moderately Active': 500,
+    'Very Active': 750,
+    'Extremely Active': 1000,
+}
+
+
+def bmi_category(bmi):
+    for upper, label in BMI_CATEGORIES:
+        if upper is None or bmi < upper:
+            return label
+
+
+def healthy_weight_range(height):
+    metres = height / 100
+    return 18.5 * metres ** 2, 24.9 * metres ** 2
+
+
+def macro_targets(profile):
+    kcal = calorie_target(profile)
+    protein = profile['weight'] * PROTEIN_PER_KG.get(profile.get('goal'), 1.4)
+    limits = [CARB_LIMITS[diet] for diet in profile.get('dietary_preferences') or [] if diet in CARB_LIMITS]
+    if limits:
+        # restricted carbs are capped and fat makes up the rest of the calories
+        carbs = min(limits)
+        fat = max(0, kcal - protein * 4 - carbs * 4) / 9
+    else:
+        fat = kcal * FAT_SHARE / 9
+        carbs = max(0, kcal - protein * 4 - fat * 9) / 4
+    return {'kcal': kcal, 'protein': round(protein), 'carbs': round(carbs), 'fat': round(fat)}
+
+
+def water_target(profile):
+    return (profile['weight'] * 35 + ACTIVITY_WATER_ML.get(profile.get('activity_level'), 250)) / 1000
@@ -0,0 +1,18 @@
+import zlib
+
+# Shorter text compresses badly and is cheaper to keep as it is
+COMPRESS_MIN_CHARS = 256
+
+
+def pack(text):
+    # Long text is kept as zlib-compressed UTF-8 bytes, short text as the str
+    # itself, so callers can tell the two apart and unpack() is a no-op for str.
+    if text is None or len(text) < COMPRESS_MIN_CHARS:
+        return text
+    return zlib.compress(text.encode('utf-8'), 6)
+
+
+def unpack(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
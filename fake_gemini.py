@@ -0,0 +1,180 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    # Mirrors google.api_core.exceptions.GoogleAPICallError closely enough for
+    # the retry logic: the HTTP status is in .code.
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    def __init__(self, text, chunks=None, usage=None, pace=0.0, fail_after=None):
+        self.text = text
+        self._chunks = chunks or [text]
+        self.usage_metadata = usage
+        # seconds between streamed chunks, and the chunk count after which the
+        # stream breaks off with a 503 (None streams to the end)
+        self._pace = pace
+        self._fail_after = fail_after
+
+    def __iter__(self):
+        for position, chunk in enumerate(self._chunks):
+            if position == self._fail_after:
+                raise FakeAPIError(503, "stream interrupted")
+            if position and self._pace:
+                time.sleep(self._pace)
+            yield FakeChunk(chunk)
+
+
+class FakeAsyncResponse(FakeResponse):
+    async def __aiter__(self):
+        for position, chunk in enumerate(self._chunks):
+            if position == self._fail_after:
+                raise FakeAPIError(503, "stream interrupted")
+            if position and self._pace:
+                await asyncio.sleep(self._pace)
+            yield FakeChunk(chunk)
+
+
+def sample_json(schema, prompt=""):
+    # A minimal reply that satisfies a response_schema. Top-level arrays get one
+    # item per numbered line in the prompt, the way batch prompts list meals.
+    if schema.get('type') == 'array' and 'index' in schema['items'].get('properties', {}):
+        count = len(re.findall(r'^\d+\. ', prompt, re.MULTILINE)) or 1
+        return [{**_sample(schema['items']), 'index': index} for index in range(1, count + 1)]
+    return _sample(schema)
+
+
+def _sample(schema):
+    kind = schema.get('type')
+    if kind == 'object':
+        return {name: _sample(field) for name, field in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [_sample(schema['items'])]
+    if kind == 'number':
+        return 420.0
+    if kind == 'integer':
+        return 7
+    if kind == 'boolean':
+        return True
+    return "simulated"
+
+
+def _prompt_text(prompt):
+    if isinstance(prompt, str):
+        return prompt
+    return "\n".join(part for item in prompt for part in item.get("parts", []))
+
+
+class FakeGenerativeModel:
+    # Stand-in for genai.GenerativeModel so benchmarks can run without an API key.
+
+    def __init__(self, model_name='fake-gemini', latency=0.05, reply="This is a simulated Vitalmina answer.",
+                 system_instruction=None, error_rate=0.0, error_code=503, quota=None, quota_period=60.0,
+                 latency_sigma=0.0, tokens_per_second=None, reply_tokens=None, stream_error_rate=0.0):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        # Time to first token. With latency_sigma > 0 it is drawn from a
+        # log-normal distribution with median `latency`, which gives the long
+        # right tail real model latencies have.
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        # Output speed; None returns the whole reply at once
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply if reply_tokens is None else _repeat_words(reply, reply_tokens)
+        self.calls = 0
+        # Fault injection: error_rate fails that share of calls with error_code;
+        # quota answers 429 once `quota` calls were accepted within quota_period;
+        # stream_error_rate breaks that share of streams off after the first chunk.
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.quota = quota
+        self.quota_period = quota_period
+        self.stream_error_rate = stream_error_rate
+        self.accepted = deque()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            if self.error_rate and random.random() < self.error_rate:
+                self.rejected += 1
+                raise FakeAPIError(self.error_code, "injected failure")
+            if self.quota is not None:
+                now = time.monotonic()
+                while self.accepted and self.accepted[0] <= now - self.quota_period:
+                    self.accepted.popleft()
+                if len(self.accepted) >= self.quota:
+                    self.rejected += 1
+                    raise FakeAPIError(429, "Resource has been exhausted (e.g. check quota).")
+                self.accepted.append(now)
+
+    def _delay(self):
+        if self.latency_sigma:
+            return random.lognormvariate(0.0, self.latency_sigma) * self.latency
+        return self.latency
+
+    def _reply(self, prompt, stream, kwargs):
+        config = kwargs.get('generation_config') or {}
+        schema = config.get('response_schema') if isinstance(config, dict) else None
+        prompt = _prompt_text(prompt)
+        text = json.dumps(sample_json(schema, prompt)) if schema else self.reply
+        words = [word + " " for word in text.split(" ")]
+        words[-1] = words[-1][:-1]
+        output_tokens = max(1, len(text) // 4)
+        prompt_tokens = max(1, len(prompt) // 4)
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+                                total_token_count=prompt_tokens + output_tokens)
+        # time to produce the rest of the answer after the first token
+        generation = output_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        fail_after = 1 if stream and self.stream_error_rate and random.random() < self.stream_error_rate else None
+        chunks = words if stream else None
+        pace = generation / max(1, len(words) - 1) if stream else 0.0
+        return text, chunks, usage, pace, 0.0 if stream else generation, fail_after
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        time.sleep(self._delay())
+        self._admit()
+        text, chunks, usage, pace, remaining, fail_after = self._reply(prompt, stream, kwargs)
+        time.sleep(remaining)
+        return FakeResponse(text, chunks, usage, pace, fail_after)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        await asyncio.sleep(self._delay())
+        self._admit()
+        text, chunks, usage, pace, remaining, fail_after = self._reply(prompt, stream, kwargs)
+        await asyncio.sleep(remaining)
+        return FakeAsyncResponse(text, chunks, usage, pace, fail_after)
+
+
+def _repeat_words(text, count):
+    words = text.split()
+    return " ".join(words[i % len(words)] for i in range(count))
+
+
+def from_spec(spec, **kwargs):
+    # "latency=0.8,latency_sigma=0.4,tokens_per_second=60,error_rate=0.02";
+    # "1" (or an empty spec) keeps the defaults.
+    options = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, value = (part.strip() for part in item.split('=', 1))
+        options[name] = int(value) if name in ('error_code', 'quota', 'reply_tokens') else float(value)
+    return FakeGenerativeModel(**options, **kwargs)
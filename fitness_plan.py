@@ -0,0 +1,296 @@
+import html
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from cache import ACTIVITY_BUCKETS
+from prompts import build_workout_day_prompt
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+EQUIPMENT = ["Bodyweight only", "Dumbbells", "Full gym"]
+INTENSITIES = ["low", "moderate", "high"]
+REST = "Rest"
+
+WORKOUT_DAY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "duration_min": {"type": "integer"},
+        "intensity": {"type": "string", "enum": INTENSITIES},
+        "warmup": {"type": "string"},
+        "exercises": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "sets": {"type": "integer"},
+                    "reps": {"type": "string"},
+                    "rest_seconds": {"type": "integer"},
+                },
+                "required": ["name", "sets", "reps", "rest_seconds"],
+            },
+        },
+        "cooldown": {"type": "string"},
+    },
+    "required": ["duration_min", "intensity", "warmup", "exercises", "cooldown"],
+}
+
+# One focus per weekday; the plan's shape depends only on the goal
+SPLITS = {
+    'Weight Loss': ["Full-body strength", "Cardio intervals", "Lower-body strength", "Mobility",
+                    "Upper-body strength", "Steady cardio", REST],
+    'Muscle Gain': ["Upper-body push", "Lower-body strength", "Upper-body pull", REST,
+                    "Upper-body strength", "Lower-body strength", REST],
+    'Maintenance': ["Full-body strength", "Steady cardio", "Mobility", "Full-body strength",
+                    REST, "Steady cardio", REST],
+    'Improve Fitness': ["Cardio intervals", "Full-body strength", "Mobility", "Steady cardio",
+                        "Full-body circuit", "Cardio intervals", REST],
+    'General Health': ["Full-body strength", "Steady cardio", "Mobility", "Full-body strength",
+                       REST, "Steady cardio", REST],
+}
+
+# Training days per activity bucket; less active users rest on the last days of the split instead
+TRAINING_DAYS = {'low': 3, 'moderate': 5, 'high': 6}
+
+# (upper bound, label); the last band has no upper bound. Few, wide bands keep
+# the number of distinct plans small enough for the cache to be shared.
+AGE_BANDS = [(40, 'under 40'), (60, '40-59'), (None, '60+')]
+BMI_BANDS = [(25, 'under 25'), (30, '25-30'), (None, '30+')]
+
+# Compendium of Physical Activities METs for resistance and aerobic training
+METS = {'low': 3.5, 'moderate': 5.0, 'high': 8.0}
+
+# Swapped in for users with an obese BMI or aged 60+, whose joints take the impact
+# (checked in order, so the more specific patterns come first)
+LOW_IMPACT = {
+    'jumping jack': "step jack",
+    'jump': "step-up",
+    'burpee': "incline push-up",
+    'sprint': "brisk incline walk",
+    'running': "brisk walking",
+    'high knees': "marching in place",
+}
+
+# Fallback exercises when the model is unavailable: (name, sets, reps, rest seconds)
+LIBRARY = {
+    'strength': {
+        "Bodyweight only": [("Squats", 3, "12-15", 60), ("Push-ups", 3, "8-12", 60), ("Glute bridges", 3, "15", 45),
+                            ("Inverted rows under a table", 3, "8-10", 60), ("Plank", 3, "30-45 s", 45)],
+        "Dumbbells": [("Goblet squats", 3, "10-12", 75), ("Dumbbell bench press", 3, "8-12", 75),
+                      ("Romanian deadlifts", 3, "10", 75), ("One-arm rows", 3, "10 each", 60),
+                      ("Overhead press", 3, "8-10", 60)],
+        "Full gym": [("Back squats", 4, "6-8", 120), ("Bench press", 4, "6-8", 120), ("Deadlifts", 3, "5", 150),
+                     ("Lat pulldowns", 3, "10-12", 75), ("Cable face pulls", 3, "12-15", 60)],
+    },
+    'cardio': {
+        "Bodyweight only": [("Jumping jacks", 3, "45 s", 30), ("High knees", 3, "30 s", 30),
+                            ("Mountain climbers", 3, "30 s", 30), ("Burpees", 3, "8", 45)],
+        "Dumbbells": [("Dumbbell thrusters", 3, "12", 45), ("Renegade rows", 3, "8 each", 45),
+                      ("Jumping jacks", 3, "45 s", 30), ("Dumbbell swings", 3, "15", 45)],
+        "Full gym": [("Rowing machine intervals", 6, "1 min hard", 60), ("Bike sprints", 6, "30 s", 60),
+                     ("Incline treadmill walk", 1, "15 min", 0)],
+    },
+    'mobility': {
+        "Bodyweight only": [("Cat-cow", 2, "10", 15), ("World's greatest stretch", 2, "5 each", 15),
+                            ("Hip flexor stretch", 2, "45 s each", 15), ("Thoracic rotations", 2, "8 each", 15)],
+    },
+}
+
+
+def weekly_split(goal, activity):
+    split = list(SPLITS.get(goal, SPLITS['General Health']))
+    training = [position for position, focus in enumerate(split) if focus != REST]
+    for position in training[TRAINING_DAYS.get(activity, 3):]:
+        split[position] = REST
+    return split
+
+
+def _band(value, bands):
+    for upper, label in bands:
+        if upper is None or value < upper:
+            return label
+
+
+def profile_bucket(profile, equipment):
+    # The coarse profile a cached plan is shared across; nothing in it identifies the user
+    return {
+        'goal': profile.get('goal') or 'General Health',
+        'activity': ACTIVITY_BUCKETS.get(profile.get('activity_level'), 'low'),
+        'age_band': _band(profile.get('age') or 30, AGE_BANDS),
+        'bmi_band': _band(profile.get('bmi') or 22, BMI_BANDS),
+        'equipment': equipment if equipment in EQUIPMENT else EQUIPMENT[0],
+    }
+
+
+def bucket_key(bucket):
+    return "|".join(bucket[name] for name in ('goal', 'activity', 'age_band', 'bmi_band', 'equipment'))
+
+
+def _text(data, key):
+    value = data.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{key}' must be a non-empty string")
+    return value.strip()
+
+
+def _integer(data, key, low, high):
+    value = data.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{key}' must be a number, got {value!r}")
+    return int(min(high, max(low, round(value))))
+
+
+@dataclass
+class WorkoutDay:
+    day: str
+    focus: str
+    duration_min: int = 0
+    intensity: str = 'low'
+    warmup: str = ''
+    exercises: list = field(default_factory=list)
+    cooldown: str = ''
+    kcal: int = 0
+
+    @classmethod
+    def from_dict(cls, data, day, focus):
+        if not isinstance(data, dict):
+            raise ValueError("workout day must be a JSON object")
+        exercises = data.get('exercises')
+        if not isinstance(exercises, list) or not exercises:
+            raise ValueError("'exercises' must be a non-empty list")
+        parsed = []
+        for exercise in exercises[:8]:
+            if not isinstance(exercise, dict):
+                raise ValueError("each exercise must be a JSON object")
+            parsed.append({
+                'name': _text(exercise, 'name'),
+                'sets': _integer(exercise, 'sets', 1, 10),
+                'reps': _text(exercise, 'reps'),
+                'rest_seconds': _integer(exercise, 'rest_seconds', 0, 300),
+            })
+        intensity = data.get('intensity')
+        return cls(
+            day=day,
+            focus=focus,
+            duration_min=_integer(data, 'duration_min', 10, 120),
+            intensity=intensity if intensity in INTENSITIES else 'moderate',
+            warmup=_text(data, 'warmup'),
+            exercises=parsed,
+            cooldown=_text(data, 'cooldown'),
+        )
+
+    @classmethod
+    def from_json(cls, text, day, focus):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"model did not return valid JSON: {e}")
+        return cls.from_dict(data, day, focus)
+
+    @classmethod
+    def local(cls, day, focus, equipment):
+        if focus == REST:
+            return cls(day=day, focus=REST)
+        if focus == 'Mobility':
+            kind, intensity, duration = 'mobility', 'low', 25
+        elif 'cardio' in focus.lower():
+            kind, intensity, duration = 'cardio', 'moderate' if focus == 'Steady cardio' else 'high', 30
+        else:
+            kind, intensity, duration = 'strength', 'moderate', 45
+        options = LIBRARY[kind]
+        exercises = options.get(equipment) or options["Bodyweight only"]
+        return cls(
+            day=day,
+            focus=focus,
+            duration_min=duration,
+            intensity=intensity,
+            warmup="5 minutes of easy cardio and dynamic stretches",
+            exercises=[{'name': name, 'sets': sets, 'reps': reps, 'rest_seconds': rest}
+                       for name, sets, reps, rest in exercises],
+            cooldown="5 minutes of walking and static stretches",
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def build_week(bucket, generate, max_workers=7):
+    # Every training day is its own prompt, all sent at once; a day the model
+    # fails on falls back to the exercise library. Returns (days, failed days).
+    split = weekly_split(bucket['goal'], bucket['activity'])
+
+    def build_day(day, focus):
+        if focus == REST:
+            return WorkoutDay(day=day, focus=REST), False
+        try:
+            return WorkoutDay.from_json(generate(build_workout_day_prompt(bucket, day, focus)), day, focus), False
+        except Exception as e:
+            print(f"Workout generation failed for {day}: {e}")
+            return WorkoutDay.local(day, focus, bucket['equipment']), True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda item: build_day(*item), zip(DAYS, split)))
+    return [day.to_dict() for day, _ in results], sum(1 for _, failed in results if failed)
+
+
+def local_week(bucket):
+    split = weekly_split(bucket['goal'], bucket['activity'])
+    return [WorkoutDay.local(day, focus, bucket['equipment']).to_dict() for day, focus in zip(DAYS, split)]
+
+
+def _low_impact(name):
+    lowered = name.lower()
+    for pattern, replacement in LOW_IMPACT.items():
+        if pattern in lowered:
+            return replacement[0].upper() + replacement[1:]
+    return name
+
+
+def personalize(days, profile):
+    # Per-user touches on a shared plan: calorie burn from the user's weight,
+    # and low-impact swaps for heavier or older users. Never mutates the plan.
+    weight = profile.get('weight') or 70
+    gentle = (profile.get('bmi') or 0) >= 30 or (profile.get('age') or 0) >= 60
+    personalized = []
+    for day in days:
+        day = dict(day, exercises=[dict(exercise) for exercise in day['exercises']])
+        if gentle:
+            for exercise in day['exercises']:
+                exercise['name'] = _low_impact(exercise['name'])
+        if day['focus'] != REST:
+            day['kcal'] = round(METS.get(day['intensity'], METS['moderate']) * weight * day['duration_min'] / 60)
+        personalized.append(day)
+    return personalized
+
+
+def plan_html(days, profile):
+    training = [day for day in days if day['focus'] != REST]
+    cards = []
+    for day in days:
+        if day['focus'] == REST:
+            cards.append(f"<div class=\"stat-item\"><h4>{day['day']}</h4><p>Rest and recovery</p></div>")
+            continue
+        exercises = "".join(
+            f"<li>{html.escape(exercise['name'])}: {exercise['sets']} x {html.escape(exercise['reps'])}"
+            + (f", rest {exercise['rest_seconds']} s" if exercise['rest_seconds'] else "") + "</li>"
+            for exercise in day['exercises']
+        )
+        cards.append(f"""
+            <div class="stat-item" style="text-align: left;">
+                <h4>{day['day']}: {html.escape(day['focus'])}</h4>
+                <p>{day['duration_min']} min, {day['intensity']} intensity, about {day['kcal']} kcal</p>
+                <p><strong>Warm-up:</strong> {html.escape(day['warmup'])}</p>
+                <ul>{exercises}</ul>
+                <p><strong>Cool-down:</strong> {html.escape(day['cooldown'])}</p>
+            </div>""")
+    return f"""
+        <div class="analysis-box">
+            <h4>Weekly plan for {html.escape(profile.get('name') or 'you')}</h4>
+            <div style="display: flex; flex-wrap: wrap;">
+                <span class="profile-badge">{len(training)} training days</span>
+                <span class="profile-badge">{sum(day['duration_min'] for day in training)} min / week</span>
+                <span class="profile-badge">about {sum(day['kcal'] for day in training)} kcal / week</span>
+            </div>
+            <div class="stats-grid">{''.join(cards)}</div>
+        </div>
+        """
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from single_flight import SingleFlight
+
+DEFAULT_MODEL = 'gemini-2.5-flash'
+
+
+def create_gemini_model(model_name=DEFAULT_MODEL, system_instruction=None):
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        return None
+
+    # Imported here so startup does not pay for the SDK; without a key it is never loaded.
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+
+def check_gemini_model(model, model_name):
+    # Metadata lookup: verifies key and connectivity without paying for a generation.
+    import google.generativeai as genai
+    genai.get_model(f"models/{model_name}")
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        # chunks without text parts (safety stops, finish markers) raise on .text
+        return None
+
+
+class GeminiClient:
+    def __init__(self, model_name=DEFAULT_MODEL, factory=create_gemini_model, system_instruction=None,
+                 health_check=check_gemini_model, probe_interval=300, max_inflight=256, coalesce=True, guard=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.factory = factory
+        self.health_check = health_check
+        self.probe_interval = probe_interval
+        self.healthy = None
+        self.last_error = None
+        self.last_probe = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self._stop = threading.Event()
+        self._warned = False
+        # Shared by every async handler so one process can hold many calls open
+        # on the model's async transport without unbounded fan-out.
+        self.max_inflight = max_inflight
+        self.async_slots = asyncio.Semaphore(max_inflight)
+        self.flights = SingleFlight(name='gemini') if coalesce else None
+        self.guard = guard
+
+    def get_model(self):
+        if self._model is not None:
+            return self._model
+
+        with self._lock:
+            if self._model is None:
+                try:
+                    self._model = self.factory(self.model_name, self.system_instruction)
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"ERROR: Gemini setup failed: {str(e)}")
+                    return None
+                if self._model is None and not self._warned:
+                    print("ERROR: GEMINI_API_KEY not found in environment variables")
+                    self._warned = True
+            return self._model
+
+    def request_key(self, prompt, kwargs):
+        payload = json.dumps([self.model_name, prompt, kwargs], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    # The generate/stream methods below coalesce identical concurrent requests
+    # and, when a guard is configured, apply its rate limit, retries and circuit
+    # breaker to the one upstream call. on_response runs once per upstream call,
+    # not once per caller, so usage is not counted again for coalesced callers.
+
+    def generate(self, prompt, on_response=None, **kwargs):
+        model = self.get_model()
+
+        def call():
+            if self.guard is None:
+                response = model.generate_content(prompt, **kwargs)
+            else:
+                response = self.guard.run(lambda: model.generate_content(prompt, **kwargs), prompt)
+            if on_response:
+                on_response(response)
+            return response
+
+        if self.flights is None:
+            return call()
+        return self.flights.call(self.request_key(prompt, kwargs), call)
+
+    async def generate_async(self, prompt, on_response=None, **kwargs):
+        model = self.get_model()
+
+        async def attempt():
+            async with self.async_slots:
+                return await model.generate_content_async(prompt, **kwargs)
+
+        async def call():
+            if self.guard is None:
+                response = await attempt()
+            else:
+                response = await self.guard.run_async(attempt, prompt)
+            if on_response:
+                on_response(response)
+            return response
+
+        if self.flights is None:
+            return await call()
+        return await self.flights.call_async(self.request_key(prompt, kwargs), call)
+
+    def stream(self, prompt, on_response=None, **kwargs):
+        model = self.get_model()
+
+        def attempt(reserved=0):
+            response = model.generate_content(prompt, stream=True, **kwargs)
+            for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+            if self.guard is not None:
+                self.guard.settle(reserved, response)
+            if on_response:
+                on_response(response)
+
+        def produce():
+            return attempt() if self.guard is None else self.guard.stream(attempt, prompt)
+
+        if self.flights is None:
+            return produce()
+        return self.flights.stream(self.request_key(prompt, kwargs), produce)
+
+    def stream_async(self, prompt, on_response=None, **kwargs):
+        model = self.get_model()
+
+        async def attempt(reserved=0):
+            async with self.async_slots:
+                response = await model.generate_content_async(prompt, stream=True, **kwargs)
+                async for chunk in response:
+                    text = _chunk_text(chunk)
+                    if text:
+                        yield text
+            if self.guard is not None:
+                self.guard.settle(reserved, response)
+            if on_response:
+                on_response(response)
+
+        def produce():
+            return attempt() if self.guard is None else self.guard.stream_async(attempt, prompt)
+
+        if self.flights is None:
+            return produce()
+        return self.flights.stream_async(self.request_key(prompt, kwargs), produce)
+
+    def set_model(self, model, health_check=None):
+        with self._lock:
+            self._model = model
+            self.health_check = health_check
+            self.healthy = None
+
+    def reset(self):
+        with self._lock:
+            self._model = None
+
+    def probe(self):
+        model = self.get_model()
+        self.last_probe = time.time()
+
+        if model is None:
+            self.healthy = False
+            return False
+        if self.health_check is None:
+            self.healthy = True
+            return True
+
+        try:
+            self.health_check(model, self.model_name)
+        except Exception as e:
+            if self.healthy is not False:
+                print(f"ERROR: Gemini health check failed: {str(e)}")
+            self.healthy = False
+            self.last_error = str(e)
+            self.reset()
+            return False
+
+        if self.healthy is not True:
+            print(f"SUCCESS: Gemini {self.model_name} reachable")
+        self.healthy = True
+        self.last_error = None
+        return True
+
+    def start_health_probe(self):
+        if self._probe_thread is not None:
+            return self._probe_thread
+
+        def run():
+            while not self._stop.is_set():
+                self.probe()
+                self._stop.wait(self.probe_interval)
+
+        self._probe_thread = threading.Thread(target=run, name="gemini-health-probe", daemon=True)
+        self._probe_thread.start()
+        return self._probe_thread
+
+    def stop_health_probe(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            'model': self.model_name,
+            'configured': self._model is not None,
+            'healthy': self.healthy,
+            'last_probe': self.last_probe,
+            'last_error': self.last_error,
+            'circuit': self.guard.breaker.state if self.guard and self.guard.breaker else None,
+        }
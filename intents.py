@@ -0,0 +1,105 @@
+import re
+
+from calculators import ACTIVITY_FACTORS, GOAL_ADJUSTMENTS, bmi_category, bmr, calorie_target, healthy_weight_range, macro_targets, tdee, water_target
+
+# Questions the calculators can answer exactly from the profile. A pattern has
+# to match the whole question, so a question with a second clause or an object
+# of its own ("before a workout", "in a cucumber", "which exercises ...") still
+# goes to the model rather than getting a canned answer.
+ASK = r"(?:(?:please|can you|could you) )?(?:what is|what's|whats|what are|calculate|work out|check|tell me|how do i calculate|how can i calculate)"
+PER_DAY = r"(?: (?:a|per|each|every) day| daily)?"
+FOR_GOAL = r"(?: to (?:lose|gain|maintain) (?:weight|muscle|fat)| for my goal| for weight loss| for muscle gain)?"
+
+INTENTS = [
+    ('calories', re.compile(
+        ASK + r" my (?:daily )?(?:bmr|tdee|basal metabolic rate|maintenance calories|calories|calorie (?:needs|intake|target|goal|requirements?))"
+        r"|how many (?:calories|kcal) (?:should|do) i (?:eat|need|have|consume)" + PER_DAY + FOR_GOAL +
+        r"|what should my (?:daily )?(?:calories|calorie (?:intake|target|goal)) be"
+        r"|my (?:daily )?(?:calorie|kcal) (?:needs|intake|target|goal|requirements?)")),
+    ('macros', re.compile(
+        ASK + r" my (?:daily )?(?:macros|macro targets|macro split|macronutrients)"
+        r"|how (?:much|many grams of) (?:protein|carbs|fat) (?:should|do) i (?:eat|need|have|get)" + PER_DAY + FOR_GOAL +
+        r"|what should my (?:daily )?macros be")),
+    ('bmi', re.compile(
+        ASK + r" my (?:bmi|body mass index)"
+        r"|is my (?:bmi|weight) (?:healthy|normal|ok|okay|good)"
+        r"|(?:what is|what's|whats) my (?:healthy|ideal|normal|target) (?:body )?weight"
+        r"|(?:what is|what's|whats) a (?:healthy|ideal|normal) (?:body )?weight for (?:me|my height)"
+        r"|how much should i weigh(?: for my height)?")),
+    ('water', re.compile(
+        r"how much (?:water )?should i (?:drink|have)" + PER_DAY +
+        r"|how many (?:litres|liters|glasses|cups)(?: of water)? should i (?:drink|have)" + PER_DAY +
+        "|" + ASK + r" my (?:daily )?water (?:intake|target|goal|needs)"
+        r"|what should my (?:daily )?water intake be")),
+]
+
+
+def classify(message):
+    text = re.sub(r"\s+", " ", message.strip().lower()).rstrip("?!. ")
+    for intent, pattern in INTENTS:
+        if pattern.fullmatch(text):
+            return intent
+    return None
+
+
+def answer(intent, profile):
+    # None when the profile lacks what the calculation needs; the model then
+    # answers the question in general terms instead.
+    if not profile or intent not in ANSWERS:
+        return None
+    if not all(profile.get(field) for field in ('age', 'height', 'weight')):
+        return None
+    return ANSWERS[intent](profile)
+
+
+def _calories(profile):
+    base = bmr(profile['weight'], profile['height'], profile['age'], profile.get('gender'))
+    factor = ACTIVITY_FACTORS.get(profile.get('activity_level'), 1.375)
+    goal = profile.get('goal') or 'General Health'
+    adjustment = GOAL_ADJUSTMENTS.get(goal, 0)
+    lines = [
+        f"Your daily calorie target is about {calorie_target(profile):,} kcal.",
+        f"- BMR (Mifflin-St Jeor, energy at rest): {base:,.0f} kcal",
+        f"- Maintenance (TDEE, BMR x {factor} for {(profile.get('activity_level') or 'light activity').lower()}): {tdee(profile):,.0f} kcal",
+    ]
+    if adjustment:
+        lines.append(f"- {goal}: {adjustment:+d} kcal a day")
+    lines.append("Reassess every few weeks as your weight changes.")
+    return "\n".join(lines)
+
+
+def _macros(profile):
+    targets = macro_targets(profile)
+    return "\n".join([
+        f"Daily macro targets for {targets['kcal']:,} kcal ({profile.get('goal') or 'General Health'}):",
+        f"- Protein: {targets['protein']} g ({targets['protein'] / profile['weight']:.1f} g per kg)",
+        f"- Carbs: {targets['carbs']} g",
+        f"- Fat: {targets['fat']} g",
+        "Spread the protein over 3-4 meals.",
+    ])
+
+
+def _bmi(profile):
+    bmi = profile.get('bmi') or round(profile['weight'] / (profile['height'] / 100) ** 2, 1)
+    low, high = healthy_weight_range(profile['height'])
+    return "\n".join([
+        f"Your BMI is {bmi} ({bmi_category(bmi)}).",
+        f"For {profile['height']:.0f} cm, a BMI of 18.5-24.9 is {low:.0f}-{high:.0f} kg.",
+        "BMI does not tell muscle from fat, so read it alongside waist size and how training feels.",
+    ])
+
+
+def _water(profile):
+    litres = water_target(profile)
+    return "\n".join([
+        f"Aim for about {litres:.1f} litres of fluid a day (35 ml per kg plus extra for your activity level).",
+        "Add 0.5-1 litre per hour of hard training or hot weather; food covers part of it.",
+    ])
+
+
+ANSWERS = {
+    'calories': _calories,
+    'macros': _macros,
+    'bmi': _bmi,
+    'water': _water,
+}
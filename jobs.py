@@ -0,0 +1,155 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from compact import pack, unpack
+
+ACTIVE = ('queued', 'running')
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    # One unit of background work and everything the UI shows about it. `run`
+    # receives the job, so it can check `cancelled` before writing anything.
+    # Finished jobs are kept for a while, so a long text result is compressed.
+    __slots__ = ('id', 'session_id', 'run', 'label', 'data', 'status', 'attempts',
+                 'submitted', 'started', 'finished', '_result', 'error', 'future')
+
+    def __init__(self, session_id, run, label, data):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.run = run
+        self.label = label
+        self.data = data
+        self.status = 'queued'
+        self.attempts = 0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.future = None
+
+    @property
+    def cancelled(self):
+        return self.status == 'cancelled'
+
+    @property
+    def result(self):
+        return unpack(self._result)
+
+    @result.setter
+    def result(self, value):
+        self._result = pack(value) if isinstance(value, str) else value
+
+
+class JobQueue:
+    # A bounded worker pool for slow calls the user should not wait on. Jobs
+    # are kept for `keep` seconds after they finish so their result can still
+    # be polled, retried or shown in the list.
+
+    def __init__(self, name='jobs', workers=4, max_queued=256, keep=3600):
+        self.name = name
+        self.max_queued = max_queued
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, run, label='', data=None):
+        job = Job(session_id, run, label, data or {})
+        with self._lock:
+            self._prune()
+            if sum(1 for other in self._jobs.values() if other.status == 'queued') >= self.max_queued:
+                metrics.increment('jobs_rejected_total', queue=self.name)
+                raise QueueFull(f"{self.name} queue is full ({self.max_queued} jobs waiting)")
+            self._jobs[job.id] = job
+        self._start(job)
+        return job
+
+    def _start(self, job):
+        job.submitted = time.time()
+        job.future = self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        with self._lock:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started = time.time()
+            job.attempts += 1
+            attempt = job.attempts
+        metrics.observe('job_wait_seconds', job.started - job.submitted, queue=self.name)
+
+        result, error = None, None
+        try:
+            result = job.run(job)
+        except Exception as e:
+            error = e
+        with self._lock:
+            # cancelled meanwhile, or cancelled and retried, so a newer run owns the job
+            if job.cancelled or job.attempts != attempt:
+                return
+            job.status = 'failed' if error is not None else 'done'
+            job.result, job.error = result, error
+            job.finished = time.time()
+        self._record(job)
+
+    def _record(self, job):
+        metrics.increment('jobs_total', queue=self.name, outcome=job.status)
+        metrics.observe('job_seconds', job.finished - job.submitted, queue=self.name, outcome=job.status)
+
+    def cancel(self, job_id, session_id=None):
+        # A running job cannot be interrupted; it finishes in the background
+        # and its result is dropped.
+        with self._lock:
+            job = self._owned(job_id, session_id)
+            if job is None or job.status not in ACTIVE:
+                return None
+            job.status = 'cancelled'
+            job.finished = time.time()
+        job.future.cancel()
+        self._record(job)
+        return job
+
+    def retry(self, job_id, session_id=None):
+        with self._lock:
+            job = self._owned(job_id, session_id)
+            if job is None or job.status not in ('failed', 'cancelled'):
+                return None
+            job.status = 'queued'
+            job.result = job.error = job.finished = None
+        metrics.increment('jobs_retried_total', queue=self.name)
+        self._start(job)
+        return job
+
+    def get(self, job_id, session_id=None):
+        with self._lock:
+            return self._owned(job_id, session_id)
+
+    def for_session(self, session_id, limit=10):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.session_id == session_id]
+        return jobs[::-1][:limit]
+
+    def _owned(self, job_id, session_id):
+        job = self._jobs.get(job_id)
+        if job is None or (session_id is not None and job.session_id != session_id):
+            return None
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - self.keep
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ('queued', 'running', 'done', 'failed', 'cancelled')}
@@ -0,0 +1,148 @@
+import html
+import json
+from dataclasses import dataclass, field
+
+MEAL_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "calories": {"type": "number"},
+        "protein_g": {"type": "number"},
+        "carbs_g": {"type": "number"},
+        "fat_g": {"type": "number"},
+        "health_score": {"type": "integer"},
+        "positives": {"type": "array", "items": {"type": "string"}},
+        "suggestion": {"type": "string"},
+        "goal_fit": {"type": "string"},
+    },
+    "required": ["calories", "protein_g", "carbs_g", "fat_g", "health_score", "positives", "suggestion", "goal_fit"],
+}
+
+BATCH_ANALYSIS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"index": {"type": "integer"}, **MEAL_ANALYSIS_SCHEMA["properties"]},
+        "required": ["index"] + MEAL_ANALYSIS_SCHEMA["required"],
+    },
+}
+
+
+def _number(data, key):
+    value = data.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{key}' must be a number, got {value!r}")
+    return max(0.0, float(value))
+
+
+def _text(data, key):
+    value = data.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{key}' must be a non-empty string")
+    return value.strip()
+
+
+@dataclass
+class MealAnalysis:
+    calories: float
+    protein_g: float
+    carbs_g: float
+    fat_g: float
+    health_score: int
+    positives: list
+    suggestion: str
+    goal_fit: str
+    items: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError("meal analysis must be a JSON object")
+        positives = data.get('positives')
+        if not isinstance(positives, list) or not all(isinstance(p, str) for p in positives):
+            raise ValueError("'positives' must be a list of strings")
+        return cls(
+            calories=_number(data, 'calories'),
+            protein_g=_number(data, 'protein_g'),
+            carbs_g=_number(data, 'carbs_g'),
+            fat_g=_number(data, 'fat_g'),
+            health_score=int(min(10, max(1, round(_number(data, 'health_score'))))),
+            positives=[p.strip() for p in positives if p.strip()][:3],
+            suggestion=_text(data, 'suggestion'),
+            goal_fit=_text(data, 'goal_fit'),
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"model did not return valid JSON: {e}")
+        return cls.from_dict(data)
+
+    @classmethod
+    def from_local(cls, result):
+        totals = result['totals']
+        return cls(
+            calories=totals['kcal'],
+            protein_g=totals['protein'],
+            carbs_g=totals['carbs'],
+            fat_g=totals['fat'],
+            health_score=result['health_score'],
+            positives=result['positives'],
+            suggestion=result['suggestion'],
+            goal_fit=result['goal_fit'],
+            items=result['items'],
+        )
+
+    def columns(self):
+        return {
+            'protein_g': round(self.protein_g, 1),
+            'carbs_g': round(self.carbs_g, 1),
+            'fat_g': round(self.fat_g, 1),
+            'health_score': self.health_score,
+        }
+
+    def to_dict(self):
+        return {
+            'calories': round(self.calories, 1),
+            **self.columns(),
+            'positives': self.positives,
+            'suggestion': self.suggestion,
+            'goal_fit': self.goal_fit,
+            'items': self.items,
+        }
+
+    def to_text(self):
+        lines = []
+        if self.items:
+            lines.append("Nutritional breakdown:")
+            for item in self.items:
+                lines.append(f"- {item['food']} ({item['grams']:.0f} g): {item['kcal']:.0f} kcal, "
+                             f"P {item['protein']:.0f} g / C {item['carbs']:.0f} g / F {item['fat']:.0f} g")
+        lines.append(f"Total: {self.calories:.0f} kcal, protein {self.protein_g:.0f} g, "
+                     f"carbs {self.carbs_g:.0f} g, fat {self.fat_g:.0f} g")
+        lines.append(f"Health score: {self.health_score}/10")
+        lines.append("Positives: " + "; ".join(self.positives))
+        lines.append(f"Suggestion: {self.suggestion}")
+        lines.append(f"Goal fit: {self.goal_fit}")
+        return "\n".join(lines)
+
+    def to_html(self):
+        items = "".join(
+            f"<li>{html.escape(item['food'])} ({item['grams']:.0f} g): {item['kcal']:.0f} kcal</li>"
+            for item in self.items
+        )
+        positives = "".join(f"<li>{html.escape(p)}</li>" for p in self.positives)
+        return f"""
+                <div style="display: flex; flex-wrap: wrap;">
+                    <span class="profile-badge">{self.calories:.0f} kcal</span>
+                    <span class="profile-badge">Protein {self.protein_g:.0f} g</span>
+                    <span class="profile-badge">Carbs {self.carbs_g:.0f} g</span>
+                    <span class="profile-badge">Fat {self.fat_g:.0f} g</span>
+                    <span class="profile-badge">Health score {self.health_score}/10</span>
+                </div>
+                {f'<ul>{items}</ul>' if items else ''}
+                <p><strong>Positives:</strong></p><ul>{positives}</ul>
+                <p><strong>Suggestion:</strong> {html.escape(self.suggestion)}</p>
+                <p><strong>Goal fit:</strong> {html.escape(self.goal_fit)}</p>
+                """
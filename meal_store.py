@@ -0,0 +1,279 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from compact import pack, unpack
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meals (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    meal_type TEXT,
+    description TEXT NOT NULL,
+    calories REAL NOT NULL DEFAULT 0,
+    satisfaction INTEGER NOT NULL DEFAULT 0,
+    analysis TEXT,
+    protein_g REAL,
+    carbs_g REAL,
+    fat_g REAL,
+    health_score INTEGER,
+    status TEXT NOT NULL DEFAULT 'done'
+);
+CREATE INDEX IF NOT EXISTS idx_meals_user_ts ON meals (user_id, ts);
+
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    meals INTEGER NOT NULL,
+    calories REAL NOT NULL,
+    satisfaction_sum INTEGER NOT NULL,
+    protein REAL NOT NULL DEFAULT 0,
+    carbs REAL NOT NULL DEFAULT 0,
+    fat REAL NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    scored INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS weekly_totals (
+    user_id TEXT NOT NULL,
+    week TEXT NOT NULL,
+    meals INTEGER NOT NULL,
+    calories REAL NOT NULL,
+    satisfaction_sum INTEGER NOT NULL,
+    protein REAL NOT NULL DEFAULT 0,
+    carbs REAL NOT NULL DEFAULT 0,
+    fat REAL NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    scored INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, week)
+) WITHOUT ROWID;
+"""
+
+# Columns added after the first release; created on older databases at startup.
+MIGRATIONS = {
+    'meals': [('protein_g', 'REAL'), ('carbs_g', 'REAL'), ('fat_g', 'REAL'), ('health_score', 'INTEGER'),
+              ('status', "TEXT NOT NULL DEFAULT 'done'")],
+    'daily_totals': [('protein', 'REAL NOT NULL DEFAULT 0'), ('carbs', 'REAL NOT NULL DEFAULT 0'),
+                     ('fat', 'REAL NOT NULL DEFAULT 0'), ('score_sum', 'INTEGER NOT NULL DEFAULT 0'),
+                     ('scored', 'INTEGER NOT NULL DEFAULT 0')],
+}
+MIGRATIONS['weekly_totals'] = MIGRATIONS['daily_totals']
+
+ROLLUP_FIELDS = ['meals', 'calories', 'satisfaction_sum', 'protein', 'carbs', 'fat', 'score_sum', 'scored']
+
+ROLLUP_SQL = """
+INSERT INTO {table} (user_id, {period}, meals, calories, satisfaction_sum, protein, carbs, fat, score_sum, scored)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, {period}) DO UPDATE SET
+    meals = meals + excluded.meals,
+    calories = calories + excluded.calories,
+    satisfaction_sum = satisfaction_sum + excluded.satisfaction_sum,
+    protein = protein + excluded.protein,
+    carbs = carbs + excluded.carbs,
+    fat = fat + excluded.fat,
+    score_sum = score_sum + excluded.score_sum,
+    scored = scored + excluded.scored
+"""
+
+# Long analysis text is stored zlib-compressed (compact.pack) and unpacked on read
+MEAL_COLUMNS = "id, ts, meal_type, description, calories, satisfaction, protein_g, carbs_g, fat_g, health_score, status"
+
+# Meals logged before their analysis is back are 'pending' until a job completes them
+MEAL_STATUSES = ('done', 'pending', 'failed', 'cancelled')
+UPDATABLE = {'analysis', 'calories', 'protein_g', 'carbs_g', 'fat_g', 'health_score', 'status'}
+
+
+def week_of(moment):
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _rollup_row(row):
+    period, meals, calories, satisfaction_sum, protein, carbs, fat, score_sum, scored = row
+    return {
+        'period': period,
+        'meals': meals,
+        'calories': round(calories, 1),
+        'protein': round(protein, 1),
+        'carbs': round(carbs, 1),
+        'fat': round(fat, 1),
+        'avg_satisfaction': round(satisfaction_sum / meals, 2) if meals else 0.0,
+        'avg_health_score': round(score_sum / scored, 2) if scored else None,
+    }
+
+
+def _meal_row(names, row):
+    meal = dict(zip(names, row))
+    if 'analysis' in meal:
+        meal['analysis'] = unpack(meal['analysis'])
+    return meal
+
+
+def _migrate(conn):
+    for table, columns in MIGRATIONS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, definition in columns:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+class MealStore:
+    # Append-only meal log with daily and weekly totals maintained in the same
+    # transaction as each insert, so summaries never rescan a user's history.
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        _migrate(conn)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, user_id, meal_entry):
+        return self.add_many(user_id, [meal_entry])[0]
+
+    def add_many(self, user_id, meal_entries):
+        rows = []
+        daily = {}
+        weekly = {}
+        for entry in meal_entries:
+            moment = entry.get('logged_at') or datetime.now()
+            calories = float(entry.get('calories') or 0)
+            satisfaction = int(entry.get('satisfaction') or 0)
+            score = entry.get('health_score')
+            day = moment.strftime("%Y-%m-%d")
+            week = week_of(moment)
+            rows.append((
+                user_id, int(moment.timestamp()), day, entry.get('meal_type'),
+                entry['description'], calories, satisfaction, pack(entry.get('analysis')),
+                entry.get('protein_g'), entry.get('carbs_g'), entry.get('fat_g'), score,
+                entry.get('status') or 'done'
+            ))
+            increments = (
+                1, calories, satisfaction,
+                entry.get('protein_g') or 0, entry.get('carbs_g') or 0, entry.get('fat_g') or 0,
+                score or 0, 1 if score is not None else 0
+            )
+            for totals, period in ((daily, day), (weekly, week)):
+                current = totals.setdefault(period, [0] * len(ROLLUP_FIELDS))
+                for index, value in enumerate(increments):
+                    current[index] += value
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = []
+            for row in rows:
+                ids.append(conn.execute(
+                    "INSERT INTO meals (user_id, ts, day, meal_type, description, calories, satisfaction, analysis, "
+                    "protein_g, carbs_g, fat_g, health_score, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                ).lastrowid)
+            conn.executemany(
+                ROLLUP_SQL.format(table='daily_totals', period='day'),
+                [(user_id, day, *values) for day, values in daily.items()]
+            )
+            conn.executemany(
+                ROLLUP_SQL.format(table='weekly_totals', period='week'),
+                [(user_id, week, *values) for week, values in weekly.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def update(self, meal_id, **fields):
+        # Fills in a logged meal (analysis, calories, macros, status) and moves
+        # the daily and weekly totals by the difference, in one transaction.
+        unknown = set(fields) - UPDATABLE
+        if unknown:
+            raise ValueError(f"cannot update meal columns: {', '.join(sorted(unknown))}")
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT user_id, ts, day, calories, protein_g, carbs_g, fat_g, health_score FROM meals WHERE id = ?",
+                (meal_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            user_id, ts, day, calories, protein, carbs, fat, score = row
+            new = {'calories': calories, 'protein_g': protein, 'carbs_g': carbs, 'fat_g': fat, 'health_score': score, **fields}
+            new_score = new['health_score']
+            increments = (
+                0, float(new['calories'] or 0) - calories, 0,
+                (new['protein_g'] or 0) - (protein or 0), (new['carbs_g'] or 0) - (carbs or 0), (new['fat_g'] or 0) - (fat or 0),
+                (new_score or 0) - (score or 0), (new_score is not None) - (score is not None)
+            )
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            values = [pack(value) if name == 'analysis' else value for name, value in fields.items()]
+            conn.execute(f"UPDATE meals SET {assignments} WHERE id = ?", (*values, meal_id))
+            if any(increments):
+                week = week_of(datetime.fromtimestamp(ts))
+                conn.execute(ROLLUP_SQL.format(table='daily_totals', period='day'), (user_id, day, *increments))
+                conn.execute(ROLLUP_SQL.format(table='weekly_totals', period='week'), (user_id, week, *increments))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def recent(self, user_id, limit=20, before_ts=None, with_analysis=False):
+        columns = MEAL_COLUMNS + (", analysis" if with_analysis else "")
+        if before_ts is None:
+            before_ts = int(time.time()) + 1
+        cursor = self._connect().execute(
+            f"SELECT {columns} FROM meals WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+            (user_id, before_ts, limit)
+        )
+        names = [description[0] for description in cursor.description]
+        return [_meal_row(names, row) for row in cursor.fetchall()]
+
+    def get(self, meal_id):
+        cursor = self._connect().execute(f"SELECT {MEAL_COLUMNS}, analysis FROM meals WHERE id = ?", (meal_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return _meal_row([description[0] for description in cursor.description], row)
+
+    def daily(self, user_id, start_day=None, end_day=None):
+        rows = self._connect().execute(
+            f"SELECT day, {', '.join(ROLLUP_FIELDS)} FROM daily_totals "
+            "WHERE user_id = ? AND day >= ? AND day <= ? ORDER BY day",
+            (user_id, start_day or "0000-00-00", end_day or "9999-99-99")
+        ).fetchall()
+        return [_rollup_row(row) for row in rows]
+
+    def weekly(self, user_id, start_week=None, end_week=None):
+        rows = self._connect().execute(
+            f"SELECT week, {', '.join(ROLLUP_FIELDS)} FROM weekly_totals "
+            "WHERE user_id = ? AND week >= ? AND week <= ? ORDER BY week",
+            (user_id, start_week or "0000-W00", end_week or "9999-W99")
+        ).fetchall()
+        return [_rollup_row(row) for row in rows]
+
+    def count(self, user_id):
+        return self._connect().execute(
+            "SELECT COALESCE(SUM(meals), 0) FROM daily_totals WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+    def revision(self, user_id):
+        # Changes whenever a meal is logged or a pending meal's analysis lands
+        meals, scored, calories = self._connect().execute(
+            "SELECT COALESCE(SUM(meals), 0), COALESCE(SUM(scored), 0), COALESCE(SUM(calories), 0) "
+            "FROM daily_totals WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return f"{meals}.{scored}.{calories:.0f}"
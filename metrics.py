@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MAX_SAMPLES = 2048
+
+_lock = threading.Lock()
+_counters = {}
+_samples = {}
+_totals = {}
+_gauges = {}
+_collectors = []
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        if key not in _samples:
+            _samples[key] = deque(maxlen=MAX_SAMPLES)
+            _totals[key] = [0, 0.0]
+        _samples[key].append(value)
+        _totals[key][0] += 1
+        _totals[key][1] += value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register_collector(collect):
+    # Called before every export, so gauges read from caches and queues are current
+    _collectors.append(collect)
+
+
+@contextmanager
+def timed(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def _collect():
+    for collect in list(_collectors):
+        try:
+            collect()
+        except Exception as e:
+            print(f"ERROR: Metrics collector failed: {str(e)}")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summary():
+    _collect()
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples = {key: list(values) for key, values in _samples.items()}
+        totals = {key: tuple(total) for key, total in _totals.items()}
+
+    report = {}
+    for (name, labels), value in list(counters.items()) + list(gauges.items()):
+        report[name + _format_labels(labels)] = value
+    for key, values in samples.items():
+        name, labels = key
+        count, total = totals[key]
+        report[name + _format_labels(labels)] = {
+            'count': count,
+            'avg': round(total / count, 4) if count else 0.0,
+            'p50': round(percentile(values, 50), 4),
+            'p95': round(percentile(values, 95), 4),
+            'max': round(max(values), 4) if values else 0.0,
+        }
+    return report
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def prometheus():
+    # Prometheus text exposition format. Timings are summaries: quantiles over
+    # the last MAX_SAMPLES observations, with _sum and _count over all of them.
+    _collect()
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples = {key: list(values) for key, values in _samples.items()}
+        totals = {key: tuple(total) for key, total in _totals.items()}
+
+    lines = []
+    for kind, series in (('counter', counters), ('gauge', gauges)):
+        for name in sorted({name for name, _ in series}):
+            lines.append(f"# TYPE {name} {kind}")
+            for (series_name, labels), value in sorted(series.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+    for name in sorted({name for name, _ in samples}):
+        lines.append(f"# TYPE {name} summary")
+        for key, values in sorted(samples.items()):
+            if key[0] != name:
+                continue
+            labels = key[1]
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f"{name}{_format_labels(labels + (('quantile', q),))} {_number(percentile(values, q * 100))}")
+            count, total = totals[key]
+            lines.append(f"{name}_sum{_format_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    if value is None:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _samples.clear()
+        _totals.clear()
+        _gauges.clear()
@@ -0,0 +1,197 @@
+import os
+import re
+import threading
+
+FOODS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'foods.csv')
+NUTRIENTS = ['kcal', 'protein', 'carbs', 'fat', 'fiber', 'sugar']
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'half': 0.5, 'a half': 0.5, 'half a': 0.5, 'a couple of': 2, 'couple of': 2, 'a few': 3, 'few': 3,
+}
+
+# grams per unit; None means "use the food's own portion weight"
+UNIT_GRAMS = {
+    'g': 1, 'gram': 1, 'grams': 1, 'gr': 1, 'kg': 1000,
+    'oz': 28.35, 'ounce': 28.35, 'ounces': 28.35, 'lb': 453.6, 'lbs': 453.6,
+    'ml': 1, 'l': 1000, 'tbsp': 15, 'tablespoon': 15, 'tablespoons': 15,
+    'tsp': 5, 'teaspoon': 5, 'teaspoons': 5, 'scoop': 30, 'scoops': 30,
+    'glass': 240, 'glasses': 240, 'can': 355, 'cans': 355,
+    'cup': 'cup', 'cups': 'cup', 'bowl': 'bowl', 'bowls': 'bowl',
+    'slice': None, 'slices': None, 'piece': None, 'pieces': None,
+    'serving': None, 'servings': None, 'portion': None, 'portions': None,
+}
+
+# "without" starts its own segment, which NEGATION then drops
+SEGMENT_SPLIT = re.compile(r',|;|\+|&|\n|\band\b|\bwith\b|\bplus\b|(?=\bwithout\b)')
+NEGATION = re.compile(r"^(no|not|without|zero|never|skipped|didn't have|did not have)\b")
+
+# Words that may surround a food name without making it a different dish;
+# anything else left over ("apple pie", "egg fried rice") is unresolved
+PREPARATION = {
+    'boiled', 'fried', 'grilled', 'baked', 'roasted', 'steamed', 'scrambled', 'poached', 'toasted',
+    'raw', 'fresh', 'plain', 'cooked', 'sliced', 'chopped', 'diced', 'mashed', 'homemade',
+    'small', 'medium', 'large', 'big', 'just', 'only', 'some',
+}
+QUANTITY = re.compile(
+    r'^(?P<qty>\d+(?:\.\d+)?(?:/\d+)?|' + '|'.join(sorted(map(re.escape, NUMBER_WORDS), key=len, reverse=True)) + r')?\s*'
+    r'(?P<unit>' + '|'.join(sorted(map(re.escape, UNIT_GRAMS), key=len, reverse=True)) + r')?\b\s*(?:of\s+)?(?P<food>.*)$'
+)
+
+_table = None
+_alias_index = None
+_lock = threading.Lock()
+
+
+def load_table():
+    global _table, _alias_index
+    if _table is not None:
+        return _table
+
+    with _lock:
+        if _table is None:
+            import pandas as pd
+            table = pd.read_csv(FOODS_PATH, keep_default_na=False)
+            aliases = {}
+            for position, row in enumerate(table.itertuples()):
+                for alias in [row.food] + [a for a in row.aliases.split(';') if a]:
+                    aliases[alias.strip().lower()] = position
+            _alias_index = aliases
+            _table = table
+    return _table
+
+
+def _parse_quantity(text):
+    if not text:
+        return 1.0
+    if text in NUMBER_WORDS:
+        return float(NUMBER_WORDS[text])
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        return float(numerator) / float(denominator) if float(denominator) else 1.0
+    return float(text)
+
+
+def _lookup(food_text):
+    # The alias has to be the whole food text, apart from preparation words
+    words = food_text.split()
+    position = _alias_index.get(' '.join(words))
+    if position is None:
+        position = _alias_index.get(' '.join(word for word in words if word not in PREPARATION))
+    return position
+
+
+def parse_meal(description):
+    table = load_table()
+    items = []
+    unresolved = []
+    for segment in SEGMENT_SPLIT.split(description.lower()):
+        segment = segment.strip(' .!')
+        if not segment or NEGATION.match(segment):
+            continue
+        parsed = QUANTITY.match(segment)
+        position = _lookup(parsed.group('food').strip())
+        if position is None:
+            unresolved.append(segment)
+            continue
+
+        quantity = _parse_quantity(parsed.group('qty'))
+        unit = UNIT_GRAMS.get(parsed.group('unit') or '')
+        if unit == 'cup':
+            grams = quantity * table.at[position, 'cup_grams']
+        elif unit == 'bowl':
+            grams = quantity * table.at[position, 'cup_grams'] * 1.5
+        elif unit is None:
+            grams = quantity * table.at[position, 'unit_grams']
+        else:
+            grams = quantity * unit
+        items.append((position, float(grams), segment))
+    return items, unresolved
+
+
+def compute_nutrition(items):
+    import numpy as np
+    import pandas as pd
+
+    table = load_table()
+    if not items:
+        return pd.DataFrame(columns=['food', 'category', 'grams'] + NUTRIENTS)
+
+    positions = np.fromiter((item[0] for item in items), dtype=np.int64, count=len(items))
+    grams = np.fromiter((item[1] for item in items), dtype=np.float64, count=len(items))
+    per_100g = table[NUTRIENTS].to_numpy(dtype=np.float64)[positions]
+    values = per_100g * (grams[:, None] / 100.0)
+
+    breakdown = pd.DataFrame(values, columns=NUTRIENTS)
+    breakdown.insert(0, 'grams', grams)
+    breakdown.insert(0, 'category', table['category'].to_numpy()[positions])
+    breakdown.insert(0, 'food', table['food'].to_numpy()[positions])
+    return breakdown
+
+
+def health_score(totals, categories):
+    kcal = max(totals['kcal'], 1.0)
+    protein_share = totals['protein'] * 4 / kcal
+    sugar_share = totals['sugar'] * 4 / kcal
+    fat_share = totals['fat'] * 9 / kcal
+
+    score = 5
+    score += 2 if protein_share >= 0.20 else 1 if protein_share >= 0.12 else 0
+    score += 2 if totals['fiber'] >= 8 else 1 if totals['fiber'] >= 4 else 0
+    score += 1 if categories & {'vegetable', 'fruit', 'legume'} else 0
+    score -= 2 if sugar_share > 0.25 else 1 if sugar_share > 0.15 else 0
+    score -= 1 if fat_share > 0.45 else 0
+    score -= 1 if categories & {'fast food', 'sweet'} else 0
+    score -= 1 if totals['kcal'] > 900 else 0
+    return int(min(10, max(1, score)))
+
+
+def assess(totals, categories, goal):
+    kcal = max(totals['kcal'], 1.0)
+    positives = []
+    if totals['protein'] >= 20:
+        positives.append(f"Good protein content ({totals['protein']:.0f} g)")
+    if totals['fiber'] >= 6:
+        positives.append(f"High in fiber ({totals['fiber']:.0f} g)")
+    if categories & {'vegetable', 'fruit'}:
+        positives.append("Includes fruit or vegetables")
+    if totals['sugar'] * 4 / kcal <= 0.10:
+        positives.append("Low in sugar")
+    if 250 <= totals['kcal'] <= 700:
+        positives.append("Moderate calorie load for a single meal")
+    positives = positives[:2] or ["Easy to track with known portions"]
+
+    if not categories & {'vegetable', 'fruit'}:
+        suggestion = "Add a portion of vegetables or fruit for fiber and micronutrients."
+    elif totals['protein'] < 15:
+        suggestion = "Add more protein, for example eggs, yogurt, tofu or chicken."
+    elif totals['sugar'] * 4 / kcal > 0.15:
+        suggestion = "Swap some sugary items for whole fruit or unsweetened options."
+    else:
+        suggestion = "Keep portions consistent and pair this meal with enough water."
+
+    if goal == 'Weight Loss':
+        fit = "Fits a weight-loss plan." if totals['kcal'] <= 600 else "On the heavy side for a weight-loss plan; consider a smaller portion."
+    elif goal == 'Muscle Gain':
+        fit = "Supports muscle gain." if totals['protein'] >= 30 else "Aim for 30 g+ protein per meal to support muscle gain."
+    else:
+        fit = f"Reasonable choice for {goal or 'general health'}."
+    return positives, suggestion, fit
+
+
+def analyze_locally(description, goal=None):
+    items, unresolved = parse_meal(description)
+    breakdown = compute_nutrition(items)
+    totals = {nutrient: float(breakdown[nutrient].sum()) for nutrient in NUTRIENTS}
+    categories = set(breakdown['category'])
+    positives, suggestion, fit = assess(totals, categories, goal)
+    return {
+        'items': breakdown.round(1).to_dict('records'),
+        'unresolved': unresolved,
+        'totals': {nutrient: round(value, 1) for nutrient, value in totals.items()},
+        'health_score': health_score(totals, categories) if items else None,
+        'positives': positives,
+        'suggestion': suggestion,
+        'goal_fit': fit,
+    }
+
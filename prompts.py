@@ -0,0 +1,144 @@
+SYSTEM_INSTRUCTION = """You are Vitalmina, a concise, professional health and fitness assistant covering exercise, nutrition, special diets such as keto, meal planning, weight management and supplements.
+Give evidence-based, practical advice personalized to the user's profile when one is given, and suggest consulting a professional for medical issues."""
+
+HISTORY_TOKEN_BUDGET = 800
+SUMMARY_TOKEN_BUDGET = 150
+SUMMARY_LINE_CHARS = 80
+
+
+def estimate_tokens(text):
+    # Gemini averages roughly four characters per token for English text; close
+    # enough for budgeting without a count_tokens round-trip.
+    return max(1, (len(text) + 3) // 4)
+
+
+def encode_profile(profile):
+    # Fields the profile does not carry are left out, so a cache-shared profile
+    # (cache.shared_profile) encodes as just its goal, activity and diet
+    if not profile:
+        return "none"
+    parts = []
+    if profile.get('gender'):
+        parts.append(profile['gender'])
+    for field, template in (('age', "{}y"), ('height', "{}cm"), ('weight', "{}kg"), ('bmi', "BMI {}")):
+        if profile.get(field) is not None:
+            parts.append(template.format(profile[field]))
+    parts.append(f"goal: {profile.get('goal') or 'General Health'}")
+    parts.append(f"activity: {profile.get('activity_level') or 'unknown'}")
+    diet = profile.get('dietary_preferences')
+    if diet:
+        parts.append(f"diet: {'/'.join(diet)}")
+    return "; ".join(parts)
+
+
+def _summarize(turns, budget):
+    lines = []
+    used = 0
+    for chat in reversed(turns):
+        if chat["role"] != "user":
+            continue
+        line = chat["content"].strip().replace("\n", " ")
+        if len(line) > SUMMARY_LINE_CHARS:
+            line = line[:SUMMARY_LINE_CHARS - 3] + "..."
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        lines.append(f"- {line}")
+        used += cost
+    return "\n".join(reversed(lines))
+
+
+def select_history(chat_history, budget=HISTORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET):
+    # Newest turns are kept verbatim until the budget runs out; everything older
+    # is folded into a short running summary of what the user asked earlier.
+    window = []
+    used = 0
+    for index in range(len(chat_history) - 1, -1, -1):
+        cost = estimate_tokens(chat_history[index]["content"])
+        if used + cost > budget:
+            return _summarize(chat_history[:index + 1], summary_budget), list(reversed(window))
+        window.append(chat_history[index])
+        used += cost
+    return "", list(reversed(window))
+
+
+def build_chat_contents(message, profile, chat_history=(), budget=HISTORY_TOKEN_BUDGET):
+    # For a cacheable standalone question the caller passes cache.shared_profile(),
+    # so only the keyed bucket fields are encoded
+    summary, window = select_history(list(chat_history), budget)
+    contents = []
+    if summary:
+        contents.append({"role": "user", "parts": [f"Earlier in this conversation I asked about:\n{summary}"]})
+        contents.append({"role": "model", "parts": ["Noted."]})
+    for chat in window:
+        contents.append({
+            "role": "user" if chat["role"] == "user" else "model",
+            "parts": [chat["content"]],
+        })
+    contents.append({"role": "user", "parts": [f"My profile: {encode_profile(profile)}\n\n{message}"]})
+    return contents
+
+
+def build_meal_prompt(meal_type, meal_description, estimated_calories, profile):
+    return (
+        f"Analyze this {meal_type or 'meal'}: {meal_description}\n"
+        f"Estimated calories: {estimated_calories}\n"
+        f"My profile: {encode_profile(profile)}\n"
+        "Give: 1) protein/carbs/fat breakdown, 2) health score 1-10, 3) two positives, "
+        f"4) one improvement, 5) how it fits my goal ({profile.get('goal') or 'General Health'}). Be concise."
+    )
+
+
+def build_structured_meal_prompt(meal_type, meal_description, estimated_calories, profile):
+    # Paired with MEAL_ANALYSIS_SCHEMA; the schema fixes the shape, so the prompt
+    # only has to say how to fill the fields.
+    return (
+        f"Analyze this {meal_type or 'meal'}: {meal_description}\n"
+        f"Estimated calories: {estimated_calories}\n"
+        f"My profile: {encode_profile(profile)}\n"
+        "Macros in grams, health_score 1-10, up to two positives, one suggestion, "
+        f"goal_fit for my goal ({profile.get('goal') or 'General Health'}). Keep each string under 20 words."
+    )
+
+
+def build_batch_prompt(meals, profile):
+    listing = "\n".join(
+        f"{index}. [{meal['meal_type']}] {meal['description']}" + (f" (est. {meal['calories']:.0f} kcal)" if meal['calories'] else "")
+        for index, meal in enumerate(meals, start=1)
+    )
+    return (
+        f"Analyze each of these meals for me.\n{listing}\n"
+        f"My profile: {encode_profile(profile)}\n"
+        "Return one object per meal with its index, macros in grams, health_score 1-10, up to two positives, "
+        f"one suggestion and goal_fit for my goal ({profile.get('goal') or 'General Health'}). "
+        "Keep each string under 20 words."
+    )
+
+
+def build_workout_day_prompt(bucket, day, focus):
+    # Paired with WORKOUT_DAY_SCHEMA. Only the coarse profile bucket goes in, so
+    # the answer can be cached and shared by everyone in that bucket.
+    return (
+        f"Design the {day} session of a weekly workout plan. Focus: {focus}.\n"
+        f"Trainee: goal {bucket['goal']}, {bucket['activity']} activity level, age {bucket['age_band']}, "
+        f"BMI {bucket['bmi_band']}, equipment: {bucket['equipment'].lower()}.\n"
+        "4-6 exercises with sets, reps and rest in seconds; duration_min for the whole session. "
+        "Keep warmup and cooldown under 15 words."
+    )
+
+
+def contents_tokens(contents):
+    if isinstance(contents, str):
+        return estimate_tokens(contents)
+    return sum(estimate_tokens(part) for item in contents for part in item["parts"])
+
+
+def usage_counts(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return {
+        'prompt': getattr(usage, 'prompt_token_count', 0) or 0,
+        'output': getattr(usage, 'candidates_token_count', 0) or 0,
+        'total': getattr(usage, 'total_token_count', 0) or 0,
+    }
@@ -0,0 +1,62 @@
+import html
+
+
+def escape_text(text):
+    return html.escape(text, quote=False).replace(chr(10), '<br>')
+
+
+USER_MESSAGE_OPEN = '<div class="chat-message user-message"><strong>You:</strong> '
+BOT_MESSAGE_OPEN = '<div class="chat-message bot-message"><strong></strong> '
+MESSAGE_CLOSE = '</div>'
+
+
+def render_chat_message(chat):
+    opening = USER_MESSAGE_OPEN if chat["role"] == "user" else BOT_MESSAGE_OPEN
+    return opening + escape_text(chat["content"]) + MESSAGE_CLOSE
+
+
+def message_fragment(chat):
+    # The rendered fragment is stored on the message itself, so each message is
+    # escaped once when it is recorded rather than on every later turn.
+    fragment = chat.get("html")
+    if fragment is None:
+        fragment = chat["html"] = render_chat_message(chat)
+    return fragment
+
+
+def render_chat_history(chat_history, limit=10):
+    return "".join(message_fragment(chat) for chat in chat_history[-limit:])
+
+
+def render_streaming_reply(previous_html, reply):
+    # Left unclosed on purpose: each partial update is then a strict extension of
+    # the previous one, which Gradio ships to the browser as an append-only diff.
+    return previous_html + BOT_MESSAGE_OPEN + reply.html
+
+
+def finished_reply(reply):
+    return {"role": "assistant", "content": reply.text, "html": BOT_MESSAGE_OPEN + reply.html + MESSAGE_CLOSE}
+
+
+class StreamingHTML:
+    # Escapes each chunk once as it arrives so a long streamed answer is not
+    # re-escaped from the start on every partial update.
+
+    def __init__(self):
+        self.text_parts = []
+        self._html = ""
+
+    def append(self, chunk):
+        if not chunk:
+            return self._html
+        self.text_parts.append(chunk)
+        self._html += escape_text(chunk)
+        return self._html
+
+    @property
+    def text(self):
+        return "".join(self.text_parts)
+
+    @property
+    def html(self):
+        return self._html
@@ -0,0 +1,368 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+
+import metrics
+from prompts import contents_tokens, usage_counts
+
+# HTTP statuses worth another attempt: quota, overload and transient server errors
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+# Output tokens reserved per call before the real count is known
+OUTPUT_ALLOWANCE = 400
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+class CircuitOpen(ModelUnavailable):
+    pass
+
+
+class RateLimited(ModelUnavailable):
+    pass
+
+
+class CallAbandoned(ModelUnavailable):
+    pass
+
+
+# Set to a threading.Event by a caller that may stop waiting on the call in
+# another thread (router.ModelRouter on a missed deadline). Once it is set the
+# guard makes no further attempts, so an abandoned call stops spending quota.
+abandoned_call = contextvars.ContextVar('abandoned_call', default=None)
+
+
+def status_code(error):
+    # google.api_core errors carry the HTTP status in .code
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    if isinstance(error, ModelUnavailable):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    return status_code(error) in RETRYABLE_CODES
+
+
+def is_unavailable(error):
+    return isinstance(error, ModelUnavailable) or is_retryable(error)
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    # "Full jitter": spreads retries from many callers over the whole interval
+    # instead of having them all come back at the same moment.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    # Reservation-based: a caller that cannot be served now is told how long to
+    # wait and the tokens are taken immediately (the bucket may go negative).
+    # Callers therefore queue in arrival order and are released at the refill
+    # rate, rather than retrying together whenever tokens become free.
+    # The refill rate leaves room for the burst (2% of the limit by default), so
+    # no window of `period` seconds ever admits more than `limit`.
+
+    def __init__(self, limit, period=60.0, burst=None):
+        self.limit = limit
+        self.period = period
+        self.capacity = burst if burst is not None else max(1.0, limit / 50)
+        self.rate = max(limit - self.capacity, 1.0) / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, max_wait=None):
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (amount - self.tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= amount
+            return wait
+
+    def available(self):
+        # share of the burst free right now; negative while callers are queued
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens / self.capacity
+
+    def refund(self, amount):
+        # negative amounts charge extra, e.g. when a reply was longer than reserved
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute, period=60.0, max_wait=30.0):
+        self.requests = TokenBucket(requests_per_minute, period)
+        self.tokens = TokenBucket(tokens_per_minute, period)
+        self.max_wait = max_wait
+
+    def reserve(self, tokens):
+        request_wait = self.requests.reserve(1, self.max_wait)
+        if request_wait is None:
+            raise RateLimited("request quota exhausted")
+        token_wait = self.tokens.reserve(tokens, self.max_wait)
+        if token_wait is None:
+            self.requests.refund(1)
+            raise RateLimited("token quota exhausted")
+        return max(request_wait, token_wait)
+
+    def settle(self, reserved, used):
+        self.tokens.refund(reserved - used)
+
+    def headroom(self):
+        return min(self.requests.available(), self.tokens.available())
+
+
+class CircuitBreaker:
+    # closed: calls flow. open: calls fail immediately until reset_timeout has
+    # passed. half_open: a single trial call decides whether to close again.
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state != self.state:
+            self.state = state
+            metrics.increment('circuit_transitions_total', state=state)
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._transition('half_open')
+                self._trial = False
+            if self.state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial = False
+            self._transition('closed')
+
+    def release(self):
+        # the trial call ended without telling us anything (caller went away)
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition('open')
+
+
+class Guard:
+    # Wraps one upstream call with the rate limiter, retries and circuit breaker.
+    # Only transient failures trip the breaker; a 400 is the caller's problem.
+
+    def __init__(self, limiter=None, breaker=None, retries=3, base_delay=0.5, max_delay=8.0):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _admit(self):
+        if self.breaker is not None and not self.breaker.allow():
+            metrics.increment('gemini_rejected_total', reason='circuit_open')
+            raise CircuitOpen("Gemini circuit breaker is open")
+
+    def _reserve(self, prompt):
+        if self.limiter is None:
+            return 0, 0.0
+        tokens = contents_tokens(prompt) + OUTPUT_ALLOWANCE
+        try:
+            wait = self.limiter.reserve(tokens)
+        except RateLimited:
+            metrics.increment('gemini_rejected_total', reason='rate_limited')
+            raise
+        if wait:
+            metrics.observe('rate_limit_wait_seconds', wait)
+        return tokens, wait
+
+    def settle(self, reserved, response):
+        usage = usage_counts(response)
+        if self.limiter is not None and usage and usage['total']:
+            self.limiter.settle(reserved, usage['total'])
+
+    def _succeeded(self):
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def _abandoned(self):
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def _check_abandoned(self, reserved):
+        abandoned = abandoned_call.get()
+        if abandoned is not None and abandoned.is_set():
+            if self.limiter is not None:
+                self.limiter.settle(reserved, 0)
+            metrics.increment('gemini_rejected_total', reason='abandoned')
+            raise CallAbandoned("the caller stopped waiting for this call")
+
+    def _retry_delay(self, error, attempt):
+        # Returns the backoff before the next attempt, or None to give up.
+        retryable = is_retryable(error)
+        if retryable and attempt < self.retries:
+            metrics.increment('gemini_retries_total', code=str(status_code(error) or type(error).__name__))
+            return backoff_delay(attempt, self.base_delay, self.max_delay)
+        if self.breaker is not None:
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                # the upstream answered, even if only to reject the request
+                self.breaker.record_success()
+        return None
+
+    # Every exit that does not record a success or a failure (rate limited,
+    # cancelled, abandoned, a non-retryable error after a stream started)
+    # releases the breaker's half-open trial, so it is never left waiting on it.
+
+    def run(self, call, prompt):
+        self._admit()
+        settled = False
+        try:
+            attempt = 0
+            while True:
+                reserved, wait = self._reserve(prompt)
+                time.sleep(wait)
+                self._check_abandoned(reserved)
+                try:
+                    response = call()
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        settled = True
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                self._succeeded()
+                settled = True
+                self.settle(reserved, response)
+                return response
+        finally:
+            if not settled:
+                self._abandoned()
+
+    async def run_async(self, call, prompt):
+        self._admit()
+        settled = False
+        try:
+            attempt = 0
+            while True:
+                reserved, wait = self._reserve(prompt)
+                await asyncio.sleep(wait)
+                try:
+                    response = await call()
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        settled = True
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self._succeeded()
+                settled = True
+                self.settle(reserved, response)
+                return response
+        finally:
+            if not settled:
+                self._abandoned()
+
+    # Streams are retried only until the first chunk has been produced; after
+    # that the caller has already shown part of the answer.
+
+    def stream(self, produce, prompt):
+        self._admit()
+        settled = False
+        try:
+            attempt = 0
+            while True:
+                reserved, wait = self._reserve(prompt)
+                time.sleep(wait)
+                self._check_abandoned(reserved)
+                started = False
+                try:
+                    for chunk in produce(reserved):
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    delay = None if started else self._retry_delay(e, attempt)
+                    if delay is None:
+                        settled = self._stream_failed(e, started)
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                self._succeeded()
+                settled = True
+                return
+        finally:
+            if not settled:
+                self._abandoned()
+
+    async def stream_async(self, produce, prompt):
+        self._admit()
+        settled = False
+        try:
+            attempt = 0
+            while True:
+                reserved, wait = self._reserve(prompt)
+                await asyncio.sleep(wait)
+                started = False
+                try:
+                    async for chunk in produce(reserved):
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    delay = None if started else self._retry_delay(e, attempt)
+                    if delay is None:
+                        settled = self._stream_failed(e, started)
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self._succeeded()
+                settled = True
+                return
+        finally:
+            if not settled:
+                self._abandoned()
+
+    def _stream_failed(self, error, started):
+        # Whether the breaker heard about this failure; before the first chunk
+        # _retry_delay has already recorded it.
+        if not started:
+            return self.breaker is not None
+        if is_retryable(error) and self.breaker is not None:
+            self.breaker.record_failure()
+            return True
+        return False
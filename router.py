@@ -0,0 +1,249 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import metrics
+from prompts import contents_tokens
+from resilience import abandoned_call
+
+# Tier order per task, best first. Heavy paths start on flash and only fall
+# back to lite when flash fails; chat starts on lite unless the prompt is long.
+TASK_TIERS = {
+    'quick_question': ['lite', 'flash'],
+    'chat': ['lite', 'flash'],
+    'meal': ['flash', 'lite'],
+    'meal_batch': ['flash', 'lite'],
+    'plan_day': ['flash', 'lite'],
+}
+
+# Tasks where either tier is good enough, so the faster one may go first
+LATENCY_ROUTED = {'quick_question', 'chat'}
+
+# Chat prompts above this many tokens (long history, detailed question) go to flash first
+LONG_PROMPT_TOKENS = 600
+
+# Swap tiers when the preferred one is this much slower than the alternative
+LATENCY_SWAP_RATIO = 1.5
+
+# Weight of the newest sample in the moving latency average
+EWMA_ALPHA = 0.2
+
+# A missed deadline counts as a sample this many times the deadline, so a tier
+# that keeps timing out soon loses its place
+DEADLINE_PENALTY = 2.0
+
+# While a preferred tier is swapped out for being slow, every Nth request still
+# goes to it first so its average can recover
+RECHECK_EVERY = 20
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class TierSaturated(Exception):
+    pass
+
+
+class ModelRouter:
+    # Chooses a model tier per request and falls through to the next tier when
+    # a call fails or misses its deadline. For streams the deadline applies to
+    # the first chunk; once text is flowing the tier is kept.
+    # A call that misses its deadline cannot be interrupted mid-request, so it is
+    # marked abandoned: the guard makes no further attempts for it, and it keeps
+    # one of its tier's in-flight slots until it returns. A tier whose slots are
+    # all taken is skipped, and the pool has a thread for every slot.
+
+    def __init__(self, tiers, deadlines, max_workers=None):
+        self.tiers = tiers
+        self.deadlines = deadlines
+        self.latency = {name: {} for name in tiers}
+        self._swaps = {}
+        self._slots = {name: threading.BoundedSemaphore(client.max_inflight) for name, client in tiers.items()}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or self.max_inflight, thread_name_prefix="router")
+
+    def plan(self, task, prompt):
+        order = [name for name in TASK_TIERS.get(task, list(self.tiers)) if name in self.tiers]
+        order += [name for name in self.tiers if name not in order]
+        if task in LATENCY_ROUTED and len(order) > 1:
+            if contents_tokens(prompt) > LONG_PROMPT_TOKENS:
+                order = [order[1], order[0]] + order[2:]
+            else:
+                preferred, alternative = self._ewma(order[0], task), self._ewma(order[1], task)
+                if preferred and alternative and preferred > alternative * LATENCY_SWAP_RATIO:
+                    swaps = self._swaps[task] = self._swaps.get(task, 0) + 1
+                    if swaps % RECHECK_EVERY:
+                        order = [order[1], order[0]] + order[2:]
+        # tiers without a model (no key, failed setup) are dropped
+        return [name for name in order if self.tiers[name].get_model() is not None] or order[:1]
+
+    def _ewma(self, tier, task):
+        return self.latency[tier].get(task)
+
+    def _update(self, tier, task, seconds):
+        previous = self.latency[tier].get(task)
+        self.latency[tier][task] = seconds if previous is None else previous + EWMA_ALPHA * (seconds - previous)
+
+    def _observe(self, tier, task, seconds):
+        self._update(tier, task, seconds)
+        metrics.observe('model_latency_seconds', seconds, model=tier, task=task)
+
+    def _fell_back(self, tier, task, error):
+        reason = 'deadline' if isinstance(error, DeadlineExceeded) else 'saturated' if isinstance(error, TierSaturated) else 'error'
+        if reason == 'deadline':
+            self._update(tier, task, self.deadlines[task] * DEADLINE_PENALTY)
+        metrics.increment('model_fallback_total', model=tier, task=task, reason=reason)
+        print(f"WARNING: {tier} tier failed for {task} ({reason}: {error}); trying the next tier")
+
+    def _within_deadline(self, name, task, deadline, call, *args, **kwargs):
+        # Runs call on the pool and waits up to deadline for it
+        if not self._slots[name].acquire(blocking=False):
+            raise TierSaturated(f"all {self.tiers[name].max_inflight} in-flight slots are taken")
+        abandoned = threading.Event()
+
+        def run():
+            token = abandoned_call.set(abandoned)
+            try:
+                return call(*args, **kwargs)
+            finally:
+                abandoned_call.reset(token)
+                self._slots[name].release()
+
+        try:
+            future = self._executor.submit(run)
+        except BaseException:
+            self._slots[name].release()
+            raise
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeout:
+            abandoned.set()
+            if future.cancel():
+                self._slots[name].release()
+            else:
+                metrics.increment('model_abandoned_total', model=name, task=task)
+            raise DeadlineExceeded(f"no answer within {deadline:g}s")
+
+    def _attempts(self, task, prompt):
+        order = self.plan(task, prompt)
+        metrics.increment('model_route_total', model=order[0], task=task)
+        for position, name in enumerate(order):
+            yield name, self.tiers[name], position == len(order) - 1
+
+    def generate(self, prompt, task='chat', **kwargs):
+        deadline = self.deadlines.get(task)
+        for name, client, last in self._attempts(task, prompt):
+            started = time.perf_counter()
+            try:
+                if deadline is None or last:
+                    response = client.generate(prompt, **kwargs)
+                else:
+                    response = self._within_deadline(name, task, deadline, client.generate, prompt, **kwargs)
+            except Exception as e:
+                if last:
+                    raise
+                self._fell_back(name, task, e)
+                continue
+            self._observe(name, task, time.perf_counter() - started)
+            return response
+
+    async def generate_async(self, prompt, task='chat', **kwargs):
+        deadline = self.deadlines.get(task)
+        for name, client, last in self._attempts(task, prompt):
+            started = time.perf_counter()
+            try:
+                try:
+                    response = await asyncio.wait_for(client.generate_async(prompt, **kwargs),
+                                                      None if last else deadline)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"no answer within {deadline:g}s")
+            except Exception as e:
+                if last:
+                    raise
+                self._fell_back(name, task, e)
+                continue
+            self._observe(name, task, time.perf_counter() - started)
+            return response
+
+    def stream(self, prompt, task='chat', **kwargs):
+        deadline = self.deadlines.get(task)
+        for name, client, last in self._attempts(task, prompt):
+            started = time.perf_counter()
+            chunks = iter(client.stream(prompt, **kwargs))
+            try:
+                if deadline is None or last:
+                    first = next(chunks, None)
+                else:
+                    first = self._within_deadline(name, task, deadline, next, chunks, None)
+            except Exception as e:
+                if last:
+                    raise
+                self._fell_back(name, task, e)
+                continue
+            self._observe(name, task, time.perf_counter() - started)
+            if first is not None:
+                yield first
+            yield from chunks
+            return
+
+    async def stream_async(self, prompt, task='chat', **kwargs):
+        deadline = self.deadlines.get(task)
+        for name, client, last in self._attempts(task, prompt):
+            started = time.perf_counter()
+            chunks = client.stream_async(prompt, **kwargs).__aiter__()
+            try:
+                try:
+                    first = await asyncio.wait_for(chunks.__anext__(), None if last else deadline)
+                except StopAsyncIteration:
+                    first = None
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"no first chunk within {deadline:g}s")
+            except Exception as e:
+                if last:
+                    raise
+                await _close(chunks)
+                self._fell_back(name, task, e)
+                continue
+            self._observe(name, task, time.perf_counter() - started)
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            return
+
+    # GeminiClient-compatible helpers, so callers can treat the router as "the model"
+
+    def get_model(self):
+        for client in self.tiers.values():
+            model = client.get_model()
+            if model is not None:
+                return model
+        return None
+
+    def set_model(self, model, health_check=None):
+        for client in self.tiers.values():
+            client.set_model(model, health_check)
+
+    def start_health_probe(self):
+        for client in self.tiers.values():
+            client.start_health_probe()
+
+    @property
+    def max_inflight(self):
+        return sum(client.max_inflight for client in self.tiers.values())
+
+    def status(self):
+        return {
+            name: {**client.status(), 'latency': dict(self.latency[name])}
+            for name, client in self.tiers.items()
+        }
+
+
+async def _close(chunks):
+    try:
+        await chunks.aclose()
+    except Exception:
+        pass
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import threading
+
+import metrics
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.task = None
+
+
+class _Broadcast:
+    # Chunks of one upstream stream, replayed to every consumer from the start.
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.waiters = 0
+        self.changed = threading.Condition()
+
+    def publish(self, chunk=None, error=None, finished=False):
+        with self.changed:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            self.error = error
+            self.finished = finished
+            self.changed.notify_all()
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: position < len(self.chunks) or self.finished)
+                pending = self.chunks[position:]
+                finished, error = self.finished, self.error
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class _AsyncBroadcast:
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.waiters = 0
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    async def publish(self, chunk=None, error=None, finished=False):
+        async with self.changed:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            self.error = error
+            self.finished = finished
+            self.changed.notify_all()
+
+    async def __aiter__(self):
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.chunks) or self.finished)
+                pending = self.chunks[position:]
+                finished, error = self.finished, self.error
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one upstream call: the first
+    # caller starts it and later callers wait for its result or error. A key is
+    # released as soon as its call finishes, so only overlapping calls coalesce.
+    # Streams run in their own thread or task, so a waiter disconnecting never
+    # stalls the others.
+
+    def __init__(self, name='gemini'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self._async_calls = {}
+        self._async_streams = {}
+
+    def _joined(self, kind, leader):
+        metrics.increment('singleflight_requests_total', client=self.name, kind=kind,
+                          role='leader' if leader else 'waiter')
+
+    def _finished(self, kind, waiters):
+        metrics.observe('singleflight_waiters', waiters, client=self.name, kind=kind)
+
+    def call(self, key, fn):
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = _Flight()
+            else:
+                flight.waiters += 1
+        self._joined('call', leader)
+
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                flight.done.set()
+                self._finished('call', flight.waiters)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stream(self, key, produce):
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast()
+            else:
+                broadcast.waiters += 1
+        self._joined('stream', leader)
+
+        if leader:
+            def run():
+                error = None
+                try:
+                    for chunk in produce():
+                        broadcast.publish(chunk)
+                except Exception as e:
+                    error = e
+                finally:
+                    with self._lock:
+                        del self._streams[key]
+                    broadcast.publish(error=error, finished=True)
+                    self._finished('stream', broadcast.waiters)
+
+            # the leader's context goes with it, so the producer still sees
+            # per-request state such as resilience.abandoned_call
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(run,), name=f"{self.name}-stream", daemon=True).start()
+        return iter(broadcast)
+
+    async def call_async(self, key, make_coroutine):
+        flight = self._async_calls.get(key)
+        leader = flight is None
+        if leader:
+            flight = self._async_calls[key] = _Flight()
+            flight.task = asyncio.ensure_future(make_coroutine())
+            flight.task.add_done_callback(lambda task: self._release_async(key, flight))
+        else:
+            flight.waiters += 1
+        self._joined('call', leader)
+        # shield: a cancelled waiter must not cancel the call the others share
+        return await asyncio.shield(flight.task)
+
+    async def stream_async(self, key, produce):
+        broadcast = self._async_streams.get(key)
+        leader = broadcast is None
+        if leader:
+            broadcast = self._async_streams[key] = _AsyncBroadcast()
+        else:
+            broadcast.waiters += 1
+        self._joined('stream', leader)
+
+        if leader:
+            async def run():
+                error = None
+                try:
+                    async for chunk in produce():
+                        await broadcast.publish(chunk)
+                except Exception as e:
+                    error = e
+                finally:
+                    del self._async_streams[key]
+                    await broadcast.publish(error=error, finished=True)
+                    self._finished('stream', broadcast.waiters)
+
+            broadcast.task = asyncio.ensure_future(run())
+        async for chunk in broadcast:
+            yield chunk
+
+    def _release_async(self, key, flight):
+        del self._async_calls[key]
+        self._finished('call', flight.waiters)
+        if not flight.task.cancelled():
+            flight.task.exception()  # mark retrieved when no caller is left to await it
+
+    def in_flight(self):
+        return {
+            'calls': len(self._calls) + len(self._async_calls),
+            'streams': len(self._streams) + len(self._async_streams),
+        }
@@ -0,0 +1,417 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import chain, islice
+
+from compact import pack, unpack
+
+DEFAULT_STATE = {
+    'profile': {},
+    'chat_history': [],
+    'fitness_plan': {},
+}
+CHAT_FIELD = 'chat_history'
+
+
+def new_state():
+    return copy.deepcopy(DEFAULT_STATE)
+
+
+class ChatRecord:
+    # One chat message as kept in memory. Long content and rendered HTML are
+    # compressed; a dict is rebuilt only when the session's state is read.
+    __slots__ = ('role', 'content', 'html')
+
+    def __init__(self, role, content, html=None):
+        self.role = role
+        self.content = pack(content)
+        self.html = pack(html)
+
+    @classmethod
+    def from_dict(cls, chat):
+        return cls(chat['role'], chat['content'], chat.get('html'))
+
+    def to_dict(self):
+        chat = {'role': self.role, 'content': unpack(self.content)}
+        if self.html is not None:
+            chat['html'] = unpack(self.html)
+        return chat
+
+
+class Session:
+    __slots__ = ('fields', 'chat', 'chat_seq', 'last_seen')
+
+    def __init__(self, fields, window, chat=(), chat_seq=0):
+        self.fields = fields
+        self.chat = deque(chat, maxlen=window)
+        # Sequence number of the next chat message, counting spilled ones
+        self.chat_seq = chat_seq
+        self.last_seen = 0.0
+
+    def state(self):
+        state = copy.deepcopy(self.fields)
+        state[CHAT_FIELD] = [record.to_dict() for record in self.chat]
+        return state
+
+
+class ChatArchive:
+    # Local SQLite spill area for the in-memory store: chat messages that fell
+    # out of a session's window, and whole sessions pushed out of memory by
+    # max_sessions. Both are read back only when asked for.
+
+    def __init__(self, path, max_items=200):
+        self.path = path
+        self.max_items = max_items
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content BLOB NOT NULL, "
+            "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS spilled_sessions ("
+            "session_id TEXT PRIMARY KEY, fields BLOB NOT NULL, chat_seq INTEGER NOT NULL, last_seen REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def extend(self, session_id, first_seq, records):
+        # Records keep their compressed content; the HTML is rebuilt if they are shown again
+        conn = self._connect()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR REPLACE INTO chat_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(session_id, first_seq + offset, record.role, record.content) for offset, record in enumerate(records)]
+        )
+        conn.execute(
+            "DELETE FROM chat_messages WHERE session_id = ? AND seq < ?",
+            (session_id, first_seq + len(records) - self.max_items)
+        )
+        conn.execute("COMMIT")
+
+    def load(self, session_id, before_seq, limit):
+        rows = self._connect().execute(
+            "SELECT role, content FROM chat_messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, before_seq, limit)
+        ).fetchall()
+        return [ChatRecord(role, unpack(content)) for role, content in reversed(rows)]
+
+    def spill(self, session_id, session):
+        self.extend(session_id, session.chat_seq - len(session.chat), list(session.chat))
+        self._connect().execute(
+            "INSERT OR REPLACE INTO spilled_sessions (session_id, fields, chat_seq, last_seen) VALUES (?, ?, ?, ?)",
+            (session_id, zlib.compress(json.dumps(session.fields).encode('utf-8')), session.chat_seq, time.time())
+        )
+
+    def has(self, session_id):
+        return self._connect().execute(
+            "SELECT 1 FROM spilled_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone() is not None
+
+    def restore(self, session_id, window):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT fields, chat_seq FROM spilled_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM spilled_sessions WHERE session_id = ?", (session_id,))
+        fields = json.loads(zlib.decompress(row[0]))
+        return Session(fields, window, self.load(session_id, row[1], window), row[1])
+
+    def clear(self, *session_ids):
+        conn = self._connect()
+        conn.executemany("DELETE FROM chat_messages WHERE session_id = ?", [(sid,) for sid in session_ids])
+        conn.executemany("DELETE FROM spilled_sessions WHERE session_id = ?", [(sid,) for sid in session_ids])
+
+    def evict_idle(self, idle_ttl):
+        conn = self._connect()
+        idle = [row[0] for row in conn.execute(
+            "SELECT session_id FROM spilled_sessions WHERE last_seen < ?", (time.time() - idle_ttl,)
+        )]
+        self.clear(*idle)
+        return len(idle)
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            'spilled_sessions': conn.execute("SELECT COUNT(*) FROM spilled_sessions").fetchone()[0],
+            'archived_messages': conn.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0],
+        }
+
+
+class MemoryStateStore:
+    # Per-session state for a single worker process. Sessions are kept in LRU
+    # order; once max_sessions is hit the least recently active one is spilled
+    # to the archive (or dropped without one) and restored when it comes back.
+    # Only the newest `window` chat messages of a session stay in memory, or
+    # max_items of them without an archive.
+    # Archive reads and writes never happen under the state lock, so a slow
+    # disk does not hold up requests for other sessions. They are serialized
+    # by their own lock instead, which also keeps a session from being restored
+    # while it is still being spilled.
+
+    def __init__(self, max_sessions=10000, idle_ttl=6 * 3600, max_items=200, window=40, archive=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_items = max_items
+        self.window = min(window, max_items) if archive else max_items
+        self.archive = archive
+        self.evictions = 0
+        self.spills = 0
+        self._sessions = OrderedDict()
+        # pushed out of memory, waiting to be written to the archive
+        self._spilling = OrderedDict()
+        self._lock = threading.Lock()
+        self._archive_lock = threading.Lock()
+
+    @contextmanager
+    def _session(self, session_id):
+        self._restore(session_id)
+        with self._lock:
+            yield self._touch(session_id)
+        self._flush_spills()
+
+    def _restore(self, session_id):
+        if not self.archive or session_id in self._sessions:
+            return
+        with self._archive_lock:
+            with self._lock:
+                if session_id in self._sessions or session_id in self._spilling:
+                    return
+            session = self.archive.restore(session_id, self.window)
+            if session is not None:
+                with self._lock:
+                    self._sessions.setdefault(session_id, session)
+
+    def _touch(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._spilling.pop(session_id, None)
+            if session is None:
+                state = new_state()
+                del state[CHAT_FIELD]
+                session = Session(state, self.window)
+            self._sessions[session_id] = session
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            oldest_id, oldest = self._sessions.popitem(last=False)
+            if self.archive:
+                self._spilling[oldest_id] = oldest
+            else:
+                self.evictions += 1
+        return session
+
+    def _flush_spills(self):
+        if not self._spilling:
+            return
+        with self._archive_lock:
+            while True:
+                with self._lock:
+                    if not self._spilling:
+                        return
+                    session_id, session = next(iter(self._spilling.items()))
+                if self._spill(session_id, session):
+                    self.spills += 1
+                else:
+                    self.evictions += 1
+                with self._lock:
+                    # a request may have taken it back into memory meanwhile
+                    if self._spilling.get(session_id) is session:
+                        del self._spilling[session_id]
+
+    def _spill(self, session_id, session):
+        try:
+            self.archive.spill(session_id, session)
+        except Exception as e:
+            print(f"ERROR: Spilling session to the archive failed: {str(e)}")
+            return False
+        return True
+
+    def exists(self, session_id):
+        # Unlike get(), never creates the session or moves it in the LRU order
+        with self._lock:
+            if session_id in self._sessions or session_id in self._spilling:
+                return True
+        return bool(self.archive) and self.archive.has(session_id)
+
+    def get(self, session_id):
+        with self._session(session_id) as session:
+            return session.state()
+
+    def set(self, session_id, field, value):
+        with self._session(session_id) as session:
+            session.fields[field] = copy.deepcopy(value)
+
+    def append(self, session_id, field, *items):
+        # Only the chat history is appended to; messages pushed out of the
+        # window go to the archive after the lock is released.
+        with self._session(session_id) as session:
+            records = [ChatRecord.from_dict(item) for item in items]
+            overflow = max(0, len(session.chat) + len(records) - self.window)
+            first_seq = session.chat_seq - len(session.chat)
+            spilled = list(islice(chain(session.chat, records), overflow))
+            session.chat.extend(records)
+            session.chat_seq += len(records)
+        if spilled and self.archive:
+            self.archive.extend(session_id, first_seq, spilled)
+
+    def history(self, session_id, limit=None):
+        # Full chat history up to max_items, reading spilled messages back from disk
+        limit = min(limit or self.max_items, self.max_items)
+        with self._session(session_id) as session:
+            recent = list(session.chat)[-limit:]
+            first_seq = session.chat_seq - len(session.chat)
+        older = self.archive.load(session_id, first_seq, limit - len(recent)) if self.archive and len(recent) < limit else []
+        return [record.to_dict() for record in older + recent]
+
+    def clear(self, session_id, field):
+        with self._session(session_id) as session:
+            if field == CHAT_FIELD:
+                session.chat.clear()
+            else:
+                session.fields[field] = copy.deepcopy(DEFAULT_STATE[field])
+        if field == CHAT_FIELD and self.archive:
+            self.archive.clear(session_id)
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            idle = [sid for sid, session in self._sessions.items() if session.last_seen < cutoff]
+            for session_id in idle:
+                del self._sessions[session_id]
+        self.evictions += len(idle)
+        if self.archive:
+            self.archive.clear(*idle)
+            self.evictions += self.archive.evict_idle(self.idle_ttl)
+        return len(idle)
+
+    def stats(self):
+        stats = {'backend': 'memory', 'sessions': len(self._sessions), 'evictions': self.evictions, 'spills': self.spills}
+        if self.archive:
+            stats.update(self.archive.stats())
+        return stats
+
+
+class SQLiteStateStore:
+    # Shared by every worker process pointing at the same file. Each mutation is
+    # a read-modify-write inside one IMMEDIATE transaction so concurrent workers
+    # cannot interleave updates to the same session.
+
+    def __init__(self, path, idle_ttl=6 * 3600, max_items=200):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.max_items = max_items
+        self.evictions = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions (last_seen)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn, session_id):
+        row = conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        state = new_state()
+        if row is not None:
+            state.update(json.loads(row[0]))
+        return state
+
+    def _mutate(self, session_id, mutate):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = self._load(conn, session_id)
+            mutate(state)
+            # Only the text is stored, as in the chat archive; message_fragment()
+            # renders the HTML again when a loaded message is shown
+            state[CHAT_FIELD] = [{'role': chat['role'], 'content': chat['content']} for chat in state[CHAT_FIELD]]
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, last_seen) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def exists(self, session_id):
+        return self._connect().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone() is not None
+
+    def get(self, session_id):
+        conn = self._connect()
+        state = self._load(conn, session_id)
+        conn.execute("UPDATE sessions SET last_seen = ? WHERE session_id = ?", (time.time(), session_id))
+        return state
+
+    def set(self, session_id, field, value):
+        def mutate(state):
+            state[field] = value
+        self._mutate(session_id, mutate)
+
+    def append(self, session_id, field, *items):
+        def mutate(state):
+            state[field].extend(items)
+            if len(state[field]) > self.max_items:
+                del state[field][:len(state[field]) - self.max_items]
+        self._mutate(session_id, mutate)
+
+    def history(self, session_id, limit=None):
+        return self.get(session_id)[CHAT_FIELD][-(limit or self.max_items):]
+
+    def clear(self, session_id, field):
+        def mutate(state):
+            state[field] = copy.deepcopy(DEFAULT_STATE[field])
+        self._mutate(session_id, mutate)
+
+    def evict_idle(self):
+        conn = self._connect()
+        deleted = conn.execute(
+            "DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.idle_ttl,)
+        ).rowcount
+        self.evictions += deleted
+        return deleted
+
+    def stats(self):
+        sessions = self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {'backend': 'sqlite', 'sessions': sessions, 'evictions': self.evictions}
+
+
+def start_idle_eviction(store, interval=300):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                store.evict_idle()
+            except Exception as e:
+                print(f"ERROR: Session eviction failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name="session-eviction", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import os
+import re
+
+ROUTE = "/static"
+
+# Fingerprinted names change whenever the content does, so browsers may keep them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MEDIA_TYPES = {'.css': 'text/css', '.html': 'text/html', '.js': 'text/javascript'}
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'\s+', ' ', text)
+    # spaces before ':' are kept: in selectors "a :hover" and "a:hover" differ
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    text = text.replace(';}', '}')
+    return text.strip()
+
+
+def minify_html(text):
+    text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
+    text = re.sub(r'>\s+<', '><', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class StaticAssets:
+    # Writes each asset once, under a content-hash name and with a gzip copy
+    # next to it, and answers requests for those names only.
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, name, content):
+        stem, ext = os.path.splitext(name)
+        data = content.encode()
+        fingerprinted = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        path = os.path.join(self.directory, fingerprinted)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9))
+        self.files[fingerprinted] = path
+        return f"{ROUTE}/{fingerprinted}"
+
+    def lookup(self, name, accept_encoding=""):
+        # (path, headers) for a known asset, preferring the gzip copy, or None
+        path = self.files.get(name)
+        if path is None:
+            return None
+        headers = {'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+        if 'gzip' in accept_encoding:
+            headers['Content-Encoding'] = 'gzip'
+            path += '.gz'
+        return path, headers
+
+    def media_type(self, name):
+        return MEDIA_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
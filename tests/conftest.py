@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# app.py opens its stores at import time; keep them out of the working tree
+_data_dir = tempfile.mkdtemp(prefix="vitalmina-tests-")
+os.environ.setdefault('VITALMINA_MEAL_DB', os.path.join(_data_dir, "meals.sqlite"))
+os.environ.setdefault('VITALMINA_FAKE_MODEL', "latency=0")
+os.environ.pop('VITALMINA_STATE_DB', None)
+os.environ.pop('VITALMINA_CHAT_ARCHIVE', None)
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app
+from state_store import MemoryStateStore, SQLiteStateStore
+
+PROFILE = {
+    'name': "Api Tester", 'age': 34, 'gender': "Female", 'height': 168, 'weight': 64,
+    'goal': "Weight Loss", 'activity_level': "Moderately Active",
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = MemoryStateStore(max_sessions=3)
+    monkeypatch.setattr(app, 'state_store', store)
+    server = FastAPI()
+    server.include_router(app.create_api())
+    return TestClient(server), store
+
+
+def test_unknown_session_is_rejected_without_creating_one(client):
+    client, store = client
+    token = client.post("/api/v1/profile", json=PROFILE).json()['session_id']
+    before = store.stats()
+
+    for number in range(5):
+        response = client.get("/api/v1/meals", headers={'X-Session-Id': f"bogus-{number}"})
+        assert response.status_code == 401
+
+    after = store.stats()
+    assert (after['sessions'], after['evictions']) == (before['sessions'], before['evictions'])
+    assert client.get("/api/v1/profile", headers={'X-Session-Id': token}).status_code == 200
+
+
+def test_client_cannot_choose_a_new_session_id(client):
+    client, store = client
+    response = client.post("/api/v1/profile", json=PROFILE, headers={'X-Session-Id': "chosen"})
+    assert response.status_code == 401
+    assert not store.exists(app.api_session_id("chosen"))
+
+
+def test_sqlite_store_exists_does_not_create(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.sqlite"))
+    assert not store.exists("nobody")
+    store.get("nobody")
+    assert not store.exists("nobody")
+    store.set("somebody", 'profile', {'name': "x"})
+    assert store.exists("somebody")
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+
+import app
+from state_store import MemoryStateStore
+
+PROFILE = ["Reload Tester", 34, "Female", 168, 64, "Weight Loss", "Moderately Active", ["No Restrictions"]]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(app, 'state_store', MemoryStateStore())
+
+
+def test_history_survives_a_new_session_hash():
+    first = SimpleNamespace(session_hash="before-reload")
+    _, _, user_id = app.save_profile(*PROFILE, first, None)
+    assert user_id
+    app.analyze_meal("Lunch", "1 apple, 2 boiled eggs", 0, 3, False, first)
+    assert app.meal_store.count(user_id) == 1
+
+    # a reload or restart brings a new session; the browser hands back the id it stored
+    second = SimpleNamespace(session_hash="after-reload")
+    _, _, same_id = app.save_profile(*PROFILE, second, user_id)
+    assert same_id == user_id
+    assert app.state_store.get("after-reload")['profile']['user_id'] == user_id
+    assert app.meal_store.count(same_id) == 1
+
+
+def test_a_browser_without_a_stored_id_gets_a_new_one():
+    _, _, first = app.save_profile(*PROFILE, SimpleNamespace(session_hash="browser-a"), None)
+    _, _, second = app.save_profile(*PROFILE, SimpleNamespace(session_hash="browser-b"), None)
+    assert first != second
+    # re-saving in the same session keeps the id even if the browser lost it
+    _, _, again = app.save_profile(*PROFILE, SimpleNamespace(session_hash="browser-a"), None)
+    assert again == first
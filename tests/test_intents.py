@@ -0,0 +1,40 @@
+import pytest
+
+import intents
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("How do I calculate my daily calorie needs?", 'calories'),
+    ("How many calories should I eat to lose weight?", 'calories'),
+    ("What is my BMR?", 'calories'),
+    ("What is my daily calorie target?", 'calories'),
+    ("What are my macros?", 'macros'),
+    ("How much protein do I need?", 'macros'),
+    ("What's my BMI?", 'bmi'),
+    ("Calculate my BMI", 'bmi'),
+    ("What is a healthy weight for me?", 'bmi'),
+    ("How much should I weigh?", 'bmi'),
+    ("How much water should I drink a day?", 'water'),
+    ("How many glasses of water should I drink per day?", 'water'),
+])
+def test_computable_questions(question, intent):
+    assert intents.classify(question) == intent
+
+
+@pytest.mark.parametrize("question", [
+    "Is BMI a good measure for athletes?",
+    "Does BMI apply to kids?",
+    "What foods help me keep a healthy weight?",
+    "My daily calories seem too high, should I eat less sugar?",
+    "My BMI is 32, which exercises are safe for my knees?",
+    "I want to lower my BMI, what diet should I follow?",
+    "How many calories should I eat before a workout?",
+    "How much protein should I eat after training?",
+    "How much water is in a cucumber?",
+    "Is my water intake affecting my sleep?",
+    "How much water should I drink during a marathon?",
+    "How many calories in an avocado?",
+    "How many calories does running burn?",
+])
+def test_open_questions_reach_the_model(question):
+    assert intents.classify(question) is None
@@ -0,0 +1,16 @@
+import app
+from cache import make_key
+from tracing import Trace
+
+
+def test_prewarm_covers_profiles_without_dietary_preferences(monkeypatch):
+    monkeypatch.setattr(app, 'response_cache', app.setup_cache())
+    app.prewarm_quick_questions()
+
+    profile = {'name': "Warm Tester", 'goal': "Muscle Gain", 'activity_level': "Very Active",
+               'dietary_preferences': [], 'user_id': "warm-tester"}
+    for index in app.GOAL_QUESTIONS['Muscle Gain']:
+        assert make_key(app.QUICK_QUESTIONS[index], profile) in app.response_cache
+    trace = Trace('chat_with_ai')
+    app.generate_chat_response(app.QUICK_QUESTIONS[3], profile, (), trace)
+    assert trace.attributes.get('cache') == 'hit'
@@ -0,0 +1,17 @@
+import contextvars
+
+from single_flight import SingleFlight
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def test_stream_producer_runs_in_the_leaders_context():
+    def produce():
+        yield request_id.get()
+
+    token = request_id.set("leader")
+    try:
+        chunks = list(SingleFlight('test').stream("key", produce))
+    finally:
+        request_id.reset(token)
+    assert chunks == ["leader"]
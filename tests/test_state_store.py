@@ -0,0 +1,19 @@
+import json
+
+from rendering import StreamingHTML, finished_reply, message_fragment, render_chat_history
+from state_store import SQLiteStateStore
+
+
+def test_sqlite_store_keeps_only_the_chat_text(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.sqlite"))
+    question = {'role': "user", 'content': "What should I eat?"}
+    message_fragment(question)
+    reply = StreamingHTML()
+    reply.append("Eat <more> vegetables\nand drink water")
+    answer = finished_reply(reply)
+    store.append("s1", 'chat_history', question, answer)
+
+    row = store._connect().execute("SELECT state FROM sessions WHERE session_id = 's1'").fetchone()
+    assert [set(chat) for chat in json.loads(row[0])['chat_history']] == [{'role', 'content'}] * 2
+    # the caller's messages keep their HTML, and a loaded history renders the same
+    assert render_chat_history(store.get("s1")['chat_history']) == question['html'] + answer['html']
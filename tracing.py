@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import metrics
+
+# File that receives one JSON line per traced request; "-" writes to stdout.
+# Unset disables trace logs; the phase metrics are recorded either way.
+TRACE_LOG = os.getenv('VITALMINA_TRACE_LOG')
+
+_write_lock = threading.Lock()
+
+
+class Trace:
+    # Timing of one handler call, split into phases. Repeated phases (one
+    # render per streamed chunk) add up, and each phase's total is observed as
+    # request_phase_seconds{handler,phase} when the call finishes.
+
+    def __init__(self, handler, session_id=None):
+        self.handler = handler
+        self.session_id = session_id
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.attributes = {}
+        self.finished = False
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def mark(self, name):
+        # a point in time rather than a span, e.g. the first streamed token
+        self.record(name, time.perf_counter() - self.started)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, outcome='ok', error=None):
+        if self.finished:
+            return
+        self.finished = True
+        seconds = time.perf_counter() - self.started
+        metrics.observe('request_seconds', seconds, handler=self.handler, outcome=outcome)
+        for name, value in self.phases.items():
+            metrics.observe('request_phase_seconds', value, handler=self.handler, phase=name)
+        if error is not None:
+            metrics.increment('request_errors_total', handler=self.handler, error=type(error).__name__)
+        if TRACE_LOG:
+            _write({
+                'trace_id': self.trace_id,
+                'handler': self.handler,
+                'session': self.session_id,
+                'outcome': outcome,
+                'error': f"{type(error).__name__}: {error}" if error is not None else None,
+                'seconds': round(seconds, 6),
+                'phases': {name: round(value, 6) for name, value in self.phases.items()},
+                **self.attributes,
+            })
+
+
+def _write(record):
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        if TRACE_LOG == '-':
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        else:
+            with open(TRACE_LOG, 'a') as f:
+                f.write(line)